@@ -17,13 +17,28 @@ This module supports SPEKTRA BSI (S-TEST)
 """
 
 import socket
+import selectors
+import errno
+import sys
+import struct
 import threading
 import time
 import configparser
+import json
+import os
+import re
+import bisect
+import queue
+import itertools
+import weakref
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
 from typing import Union
+import numpy as np
 from I2cInterface import I2cInterface
 from SPIInteface import SPIInterface
-from enum import Enum
+from enum import Enum, IntEnum
 
 
 class TMUMeasurementQuantity(Enum):
@@ -33,6 +48,15 @@ class TMUMeasurementQuantity(Enum):
     TMUMeasureDutyCycle = 3
 
 
+class BsiPriority(IntEnum):
+    """
+    priority of requests to the I/O worker thread (lower value first)
+    """
+    Interactive = 0  # operator actions (GUI buttons)
+    Control = 1  # default, scripts, configuration
+    Bulk = 2  # streaming / background acquisition
+
+
 class BsiProcessingError(Exception):
     """
     MODULE Exeption handler
@@ -40,6 +64,470 @@ class BsiProcessingError(Exception):
     pass
 
 
+class BsiConnectionError(BsiProcessingError):
+    """
+    connection to BSI lost (socket closed, no answer within timeout)
+    """
+    pass
+
+
+class BsiConfig:
+    """
+    Desired state of the instrument configuration\n
+    * power sources (mode, limits, voltage / current, sense)
+    * MIO configuration sets and active set
+    * bank levels and grounds
+    * I2C master addresses
+
+    settings are stored as {(setting, index, card_select): value},
+    use BsiInstrument.diff / BsiInstrument.apply to compare / send it
+    """
+    # settings in order of apply (dependent settings after the ones they depend on)
+    SETTINGS = ('pwr_sense', 'pwr_mode', 'pwr_i_min', 'pwr_i_max', 'pwr_v_min', 'pwr_v_max',
+                'pwr_voltage', 'pwr_current', 'mio_setup', 'mio_active', 'gnd',
+                'level_out_low', 'level_out_high', 'level_in_low', 'level_in_high',
+                'i2c_master_address')
+    # apply sends the stages one after the other, a setting of a power source is not sent if a setting
+    # of an earlier stage failed on that source (f.e. no voltage if the voltage mode failed),
+    # a set is not activated if loading it failed
+    STAGES = (('pwr_sense', 'pwr_mode', 'mio_setup'),
+              ('pwr_i_min', 'pwr_i_max', 'pwr_v_min', 'pwr_v_max', 'mio_active', 'gnd',
+               'level_out_low', 'level_out_high', 'level_in_low', 'level_in_high', 'i2c_master_address'),
+              ('pwr_voltage', 'pwr_current'))
+
+    def __init__(self, settings=None):
+        """
+        constructor
+        :param settings: (optional) dict {(setting, index, card_select): value} to start with
+        """
+        self.settings = dict()
+        if settings is not None:
+            self.settings.update(settings)
+
+    def set(self, setting, index, value, card_select=0):
+        """
+        sets one value of the desired state
+        :param setting: setting name (see SETTINGS)
+        :param index: source number, bank, config set number or channel (None for mio_active)
+        :param value: desired value
+        :param card_select: 1,2,..16 (single card) or 0 (all cards)
+        :return: self (for chaining)
+        """
+        if setting not in self.SETTINGS:
+            raise ValueError('unknown setting ' + str(setting))
+        self.settings[(setting, index, card_select)] = value
+        return self
+
+    def voltage_source(self, source_number, voltage, i_min, i_max, use_sense, card_select=0):
+        """
+        desired power source in voltage mode (see BsiInstrument.pwr_config_voltage_source)
+        :return: self (for chaining)
+        """
+        self.set('pwr_sense', source_number, bool(use_sense), card_select)
+        self.set('pwr_mode', source_number, 'voltage', card_select)
+        self.set('pwr_i_min', source_number, float(i_min), card_select)
+        self.set('pwr_i_max', source_number, float(i_max), card_select)
+        self.set('pwr_voltage', source_number, float(voltage), card_select)
+        return self
+
+    def current_source(self, source_number, current, v_min, v_max, use_sense, card_select=0):
+        """
+        desired power source in current mode (see BsiInstrument.pwr_config_current_source)
+        :return: self (for chaining)
+        """
+        self.set('pwr_sense', source_number, bool(use_sense), card_select)
+        self.set('pwr_mode', source_number, 'current', card_select)
+        self.set('pwr_v_min', source_number, float(v_min), card_select)
+        self.set('pwr_v_max', source_number, float(v_max), card_select)
+        self.set('pwr_current', source_number, float(current), card_select)
+        return self
+
+    def mio_setup(self, config_number, config_list, activate=True, card_select=0):
+        """
+        desired MIO configuration set (see BsiInstrument.mio_load_config)
+        :param config_number: configuration set number as int 1..20
+        :param config_list: configuration set list (16 values)
+        :param activate: True = configuration set is the active one
+        :param card_select: 1,2,..16 (single card) or 0 (all cards) to activate the set on
+        :return: self (for chaining)
+        """
+        self.set('mio_setup', config_number, tuple(config_list[:16]), 0)  # loaded on all cards
+        if activate:
+            self.set('mio_active', None, config_number, card_select)
+        return self
+
+    def bank_levels(self, bank, out_low, out_high, in_low, in_high, card_select=0):
+        """
+        desired output levels and input thresholds of an IO bank
+        :return: self (for chaining)
+        """
+        self.set('level_out_low', bank, float(out_low), card_select)
+        self.set('level_out_high', bank, float(out_high), card_select)
+        self.set('level_in_low', bank, float(in_low), card_select)
+        self.set('level_in_high', bank, float(in_high), card_select)
+        return self
+
+    def i2c_master_address(self, i2c_address, channel_select=0, card_select=0):
+        """
+        desired I2C master address (see BsiInstrument.i2c_set_master_address)
+        :return: self (for chaining)
+        """
+        self.set('i2c_master_address', channel_select, i2c_address, card_select)
+        return self
+
+
+class BsiMioCapture:
+    """
+    Result of BsiInstrument.mio_capture\n
+    * timestamps: time of each sample in sec since start of capture (numpy float64 array)
+    * states: MIO input state of each sample (numpy uint16 array, bit0=MIO1 ... bit15=MIO16)
+    """
+
+    def __init__(self, timestamps, states):
+        """
+        constructor
+        :param timestamps: numpy array of timestamps in sec
+        :param states: numpy array of MIO states as uint16
+        """
+        self.timestamps = timestamps
+        self.states = states
+
+    def __len__(self):
+        return len(self.states)
+
+    def pin(self, mio_number):
+        """
+        levels of one MIO pin
+        :param mio_number: MIO number 1...16 as int
+        :return: numpy array of levels (1=High, 0=Low)
+        """
+        return (self.states >> (mio_number - 1)) & 1
+
+    def edges(self, mio_number):
+        """
+        level changes of one MIO pin
+        :param mio_number: MIO number 1...16 as int
+        :return: list of (timestamp in sec, new level) tuples, 1=rising 0=falling edge
+        """
+        levels = self.pin(mio_number)
+        indices = np.flatnonzero(np.diff(levels)) + 1
+        return [(float(self.timestamps[ind]), int(levels[ind])) for ind in indices]
+
+
+class BsiInrushCapture:
+    """
+    Result of BsiInstrument.pwr_capture_inrush\n
+    * timestamps: time of each sample in sec since switching on (numpy float64 array)
+    * currents: source current of each sample in mA (numpy float64 array)
+    * peak, peak_time: maximum current in mA and its time in sec
+    * steady_state: mean current of the last 10% of the samples in mA
+    * settling_time: time in sec after which the current stays inside the settle band
+    """
+
+    def __init__(self, timestamps, currents, settle_band=0.05, min_band=0.01):
+        """
+        constructor
+        :param timestamps: numpy array of timestamps in sec
+        :param currents: numpy array of currents in mA
+        :param settle_band: relative band around steady state current (0.05 = +-5%)
+        :param min_band: minimum band in mA (for steady state currents near 0mA)
+        """
+        self.timestamps = timestamps
+        self.currents = currents
+        self.peak = None
+        self.peak_time = None
+        self.steady_state = None
+        self.settling_time = None
+        if len(currents) > 0:
+            ind = int(np.argmax(np.abs(currents)))
+            self.peak = float(currents[ind])
+            self.peak_time = float(timestamps[ind])
+            self.steady_state = float(np.mean(currents[-max(1, len(currents) // 10):]))
+            band = max(abs(self.steady_state) * settle_band, min_band)
+            outside = np.flatnonzero(np.abs(currents - self.steady_state) > band)
+            if len(outside) == 0:
+                self.settling_time = float(timestamps[0])
+            elif outside[-1] + 1 < len(timestamps):
+                self.settling_time = float(timestamps[outside[-1] + 1])
+
+    def __len__(self):
+        return len(self.currents)
+
+
+class BsiCommandStats:
+    """
+    counters and latency histograms of one command mnemonic (see BsiInstrument.stats)\n
+    * send: time to hand the frame(s) to the socket (shared by the commands sent together)
+    * wait: time from sending until the answer is received (network + instrument + commands before)
+    * parse: time to convert the answer (_parse_answer)
+    """
+    # upper bin limits in sec of the latency histograms, the last bin counts all above
+    bin_edges = (20e-6, 50e-6, 100e-6, 200e-6, 500e-6, 1e-3, 2e-3, 5e-3, 10e-3, 20e-3, 50e-3,
+                 100e-3, 200e-3, 500e-3, 1.0, 2.0, 5.0)
+    phases = ('send', 'wait', 'parse')
+
+    def __init__(self, mnemonic):
+        """
+        constructor
+        :param mnemonic: command mnemonic f.e. 'MEAS_V_*'
+        """
+        self.mnemonic = mnemonic
+        self.count = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.histograms = {phase: [0] * (len(self.bin_edges) + 1) for phase in self.phases}
+        self.totals = {phase: 0.0 for phase in self.phases}
+        self.maxima = {phase: 0.0 for phase in self.phases}
+
+    def add_time(self, phase, duration):
+        """
+        adds one duration to the histogram of a phase
+        :param phase: 'send', 'wait' or 'parse'
+        :param duration: time in sec as float
+        :return: None
+        """
+        self.histograms[phase][bisect.bisect_left(self.bin_edges, duration)] += 1
+        self.totals[phase] += duration
+        if duration > self.maxima[phase]:
+            self.maxima[phase] = duration
+
+    def as_dict(self):
+        """
+        returns statistics as dict (copy)
+        :return: dict with count, errors, bytes_sent, bytes_received and per phase
+        dict with count, total, mean, max (sec) and histogram (list, bins see bin_edges)
+        """
+        res = {'count': self.count, 'errors': self.errors,
+               'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received}
+        for phase in self.phases:
+            count = sum(self.histograms[phase])
+            res[phase] = {'count': count, 'total': self.totals[phase],
+                          'mean': self.totals[phase] / count if count > 0 else None,
+                          'max': self.maxima[phase], 'histogram': list(self.histograms[phase])}
+        return res
+
+
+class BsiProfile:
+    """
+    round trips, commands, bytes and waiting time caused by a block of code (see BsiInstrument.profile)
+    with nested breakdown per BsiInstrument method and command mnemonic, f.e.\n
+    i2c_read_frame -> i2c_set_master_address -> SYS_I2CExt_CFG_SetMasterAdr\n
+    numbers of a node include all nodes below
+    """
+
+    def __init__(self, name):
+        """
+        constructor
+        :param name: name of block / method / command mnemonic
+        """
+        self.name = name
+        self.round_trips = 0  # number of times the caller waited for answers
+        self.commands = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.wait_time = 0.0  # time waited for answers in sec
+        self.time = None  # duration of the whole block in sec (top node only)
+        self.children = dict()  # name -> BsiProfile
+
+    def add(self, path, round_trips=0, commands=0, bytes_sent=0, bytes_received=0, wait_time=0.0):
+        """
+        adds numbers to this node and all nodes of path below
+        :param path: list of names (methods, mnemonic)
+        :return: None
+        """
+        node = self
+        nodes = [node]
+        for name in path:
+            if name not in node.children:
+                node.children[name] = BsiProfile(name)
+            node = node.children[name]
+            nodes.append(node)
+        for node in nodes:
+            node.round_trips += round_trips
+            node.commands += commands
+            node.bytes_sent += bytes_sent
+            node.bytes_received += bytes_received
+            node.wait_time += wait_time
+
+    def as_dict(self):
+        """
+        returns profile as nested dict
+        :return: dict (children as dict name -> dict)
+        """
+        return {'name': self.name, 'round_trips': self.round_trips, 'commands': self.commands,
+                'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received,
+                'wait_time': self.wait_time, 'time': self.time,
+                'children': {name: child.as_dict() for name, child in self.children.items()}}
+
+    def report(self, indent=0):
+        """
+        returns profile as text, one line per node, nodes with most waiting time first
+        :param indent: (optional) indent of this node
+        :return: string
+        """
+        text = '{:<{width}} {:>6} rt {:>6} cmd {:>8} B sent {:>8} B rec {:>9.3f} ms'.format(
+            ' ' * indent + self.name, self.round_trips, self.commands, self.bytes_sent, self.bytes_received,
+            self.wait_time * 1000.0, width=50)
+        if self.time is not None:
+            text += ' (block {:.3f} ms)'.format(self.time * 1000.0)
+        for child in sorted(self.children.values(), key=lambda node: -node.wait_time):
+            text += '\n' + child.report(indent + 2)
+        return text
+
+    def __str__(self):
+        return self.report()
+
+
+class BsiTraceRecorder:
+    """
+    records frames sent to and data received from the BSI to a binary trace file\n
+    file: b'BSITRACE' + version (1 byte), then per record: direction (1 byte, see Sent / Received),
+    time since start in sec (float64), length (uint32), data (little endian)
+    """
+    magic = b'BSITRACE'
+    version = 1
+    record_header = struct.Struct('<BdI')
+    Sent = 0
+    Received = 1
+
+    def __init__(self, trace_file):
+        """
+        constructor, creates trace file
+        :param trace_file: path of trace file
+        """
+        self.file = open(trace_file, 'wb')
+        self.file.write(self.magic + bytes([self.version]))
+        self.start = time.perf_counter()
+
+    def record(self, direction, data):
+        """
+        writes one record
+        :param direction: BsiTraceRecorder.Sent or BsiTraceRecorder.Received
+        :param data: bytes
+        :return: None
+        """
+        self.file.write(self.record_header.pack(direction, time.perf_counter() - self.start, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        """
+        closes trace file
+        :return: None
+        """
+        self.file.close()
+
+    @classmethod
+    def read(cls, trace_file):
+        """
+        reads trace file
+        :param trace_file: path of trace file
+        :return: list of (direction, time in sec, data as bytes)
+        """
+        with open(trace_file, 'rb') as file:
+            content = file.read()
+        if content[:len(cls.magic)] != cls.magic or content[len(cls.magic)] != cls.version:
+            raise BsiProcessingError('no BSI trace file (version ' + str(cls.version) + '): ' + str(trace_file))
+        records = list()
+        pos = len(cls.magic) + 1
+        while pos < len(content):
+            direction, timestamp, length = cls.record_header.unpack_from(content, pos)
+            pos += cls.record_header.size
+            records.append((direction, timestamp, content[pos:pos + length]))
+            pos += length
+        return records
+
+
+class BsiReplaySocket:
+    """
+    socket replacement that plays back a trace recorded with BsiTraceRecorder (see BsiInstrument.open_replay)\n
+    data received is returned in the recorded order, but not before the frames sent before it in the
+    recording were sent (else timeout like a real socket)
+    """
+
+    def __init__(self, trace_file, realtime=False, verify=False):
+        """
+        constructor, reads trace file
+        :param trace_file: path of trace file
+        :param realtime: (optional) True = data is returned with the recorded delay after the frames sent before
+        :param verify: (optional) True = frames sent must be equal to the recording (else BsiProcessingError)
+        """
+        records = BsiTraceRecorder.read(trace_file)
+        self.realtime = realtime
+        self.verify = verify
+        self.timeout = None
+        self.sent = list()  # (time, data)
+        self.received = list()  # (time, data, number of frames sent before in the recording)
+        for direction, timestamp, data in records:
+            if direction == BsiTraceRecorder.Sent:
+                self.sent.append((timestamp, data))
+            else:
+                self.received.append((timestamp, data, len(self.sent)))
+        self.nr_sent = 0
+        self.nr_received = 0
+        self.offset = 0.0  # replay time - recorded time of the last frame sent
+
+    def sendall(self, data):
+        """
+        like socket.sendall, compares with recording if verify is set
+        """
+        if self.nr_sent < len(self.sent):
+            timestamp, recorded = self.sent[self.nr_sent]
+            if self.verify and data != recorded:
+                raise BsiProcessingError('replay: sent ' + repr(data) + ', recorded ' + repr(recorded))
+            self.offset = time.perf_counter() - timestamp
+        self.nr_sent += 1
+
+    def send(self, data):
+        """
+        like socket.send
+        """
+        self.sendall(data)
+        return len(data)
+
+    def recv(self, buffersize):
+        """
+        like socket.recv, returns next recorded data
+        """
+        if self.nr_received >= len(self.received):
+            return b''  # end of trace = connection closed
+        timestamp, data, nr_sent_before = self.received[self.nr_received]
+        if self.nr_sent < nr_sent_before:
+            # recording received this after a frame not sent yet
+            if self.timeout == 0.0:
+                raise BlockingIOError('replay: no data')
+            raise socket.timeout('timed out')
+        if self.realtime:
+            delay = timestamp + self.offset - time.perf_counter()
+            if delay > 0:
+                if self.timeout == 0.0:
+                    raise BlockingIOError('replay: no data')
+                time.sleep(delay)
+        self.nr_received += 1
+        if len(data) > buffersize:
+            self.received.insert(self.nr_received, (timestamp, data[buffersize:], nr_sent_before))
+            data = data[:buffersize]
+        return data
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setsockopt(self, *args):
+        pass  # nothing to set
+
+    def connect(self, address):
+        pass  # always connected
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+
 class BsiInstrument:
     """
     Class for BSI handling\n
@@ -59,15 +547,73 @@ class BsiInstrument:
     bsi_card_serials = list()
     bsi_nr_cards = 0
     bsi_cmd_counter = 0
+    bsi_rx_buffer = bytearray()
+    bsi_pending = deque()
+    bsi_pipeline_depth = 32
     bsi_i2c_adresses = list()
     bsi_i2c_write_framelen = list()
     bsi_i2c_read_framelen = list()
+    bsi_i2c_chunk_size = 0
+    bsi_i2c_chunks_in_flight = 2
+    bsi_i2c_throughput = 5000.0
+    bsi_i2c_throughput_weight = 0.1
+    bsi_i2c_throughput_min_bytes = 1024
+    bsi_transfer_safety = 4.0
+    bsi_meas_range = None
+    bsi_meas_range_memory = dict()
+    bsi_meas_settings = dict()
+    bsi_meas_steps = dict()
+    bsi_config_state = dict()
+    bsi_mio_configs = dict()
+    bsi_calibration_cache_file = os.path.join(os.path.expanduser('~'), '.bsi_calibration.json')
+    bsi_calibrated = False
+    # (address, port) -> (bsi id, card serials), shared by all instances for warm starts
+    bsi_identity_cache = dict()
+    bsi_auto_reconnect = True
+    bsi_retries = 2
+    bsi_recovering = False
+    bsi_requests = None
+    bsi_worker = None
+    bsi_stats_enabled = True
+    bsi_trace = None
+    bsi_manager = None
+    bsi_stats = dict()
+    bsi_mnemonics = dict()
+    # decoders for answer elements, see _decoder (shared by all instances)
+    bsi_decoders = {int: int, float: float, bool: 'O'.__eq__, 'andbool': 'O'.__eq__,  # 'O'=True
+                    bytearray: bytearray.fromhex}
+    bsi_hex_decoders = dict()  # nr of hex nibbles -> decoder
+    bsi_hex_dtypes = {4: np.dtype('>u2'), 8: np.dtype('>u4'), 16: np.dtype('>u8')}  # nibbles -> numpy type
+    # command counters 000..999 as bytes, (command, params) -> frame template and parameter lists
+    # (see _frame_template, _create_param_list_string, shared by all instances)
+    bsi_counters = tuple(bytes('{:03d}'.format(counter), 'utf-8') for counter in range(1000))
+    bsi_frame_templates = dict()
+    bsi_param_lists = dict()
+    bsi_template_max_params = 256  # longer parameters (data frames) are not kept
+    bsi_template_cache_size = 4096  # max number of templates / lists kept (cleared if exceeded)
+    # commands that may be sent again after a connection error (besides *_Get*, *_Set*, *_Read)
+    bsi_idempotent_commands = ('SYS_IDN', 'MEAS_', 'DIG_CFG_', 'PWR_CFG_VoltageMode', 'PWR_CFG_CurrentMode',
+                               'PWR_CFG_IMax', 'PWR_CFG_IMin', 'PWR_CFG_VMax', 'PWR_CFG_VMin')
+    bsi_bus_commands = ('DIG_I2C', 'DIG_SPI', 'SYS_I2CExt_')  # transfers are never repeated, only _CFG_ commands
 
     def __init__(self):
         """
         constructor
         """
-        self.lock = threading.Lock()
+        # (priority, sequence, future, function, args) for the I/O worker thread
+        self.bsi_requests = queue.PriorityQueue()
+        self.bsi_request_sequence = itertools.count()  # keeps order of requests with same priority
+        self.bsi_priority = threading.local()  # default priority per thread, see priority()
+        self.bsi_worker = None  # I/O worker thread, owns the socket (started with the first request)
+        self.bsi_worker_lock = threading.Lock()  # protects start / stop of the worker thread
+        self.bsi_stats_enabled = True  # count commands, bytes and latencies, see stats()
+        self.bsi_stats = dict()  # mnemonic -> BsiCommandStats
+        self.bsi_stats_answers = dict()  # answer counter -> mnemonic (for parse time)
+        self.bsi_stats_lock = threading.Lock()
+        self.bsi_mnemonics = dict()  # command -> mnemonic (cache)
+        self.bsi_profiling = threading.local()  # active BsiProfile list per thread, see profile()
+        self.bsi_trace = None  # BsiTraceRecorder if recording, see start_trace()
+        self.bsi_manager = None  # BsiInstrumentManager driving the connection instead of the I/O worker thread
         self.connected = False
         self.last_address = "127.0.0.0"
         self.last_port = 17501
@@ -77,9 +623,33 @@ class BsiInstrument:
         self.bsi_card_serials = list()
         self.bsi_nr_cards = 0
         self.bsi_cmd_counter = 0
+        self.bsi_rx_buffer = bytearray()  # received bytes not yet returned as answer
+        # per command sent, answer not read yet (in order): [counter as bytes, mnemonic, frame length, send time]
+        self.bsi_pending = deque()
+        self.bsi_pipeline_depth = 32  # max number of commands sent before answers are read
         self.bsi_i2c_adresses = list()
         self.bsi_i2c_write_framelen = list()
         self.bsi_i2c_read_framelen = list()
+        # opt-in: larger I2C reads are split in chunks of this size (0 = never split), only for devices
+        # continuing with the next bytes on the next read (f.e. memories with address auto increment)
+        self.bsi_i2c_chunk_size = 0
+        self.bsi_i2c_chunks_in_flight = 2  # chunks sent before the answer of the first one is read
+        self.bsi_i2c_throughput = 5000.0  # measured I2C read throughput in byte/sec (for timeouts)
+        self.bsi_i2c_throughput_weight = 0.1  # weight of a new measurement in the moving average
+        self.bsi_i2c_throughput_min_bytes = 1024  # smaller reads are dominated by the round trip, not measured
+        self.bsi_transfer_safety = 4.0  # timeout of large transfers = bsi_timeout + safety * expected time
+        self.bsi_meas_range = None  # None = unknown, instrument range is read or set first
+        self.bsi_meas_range_memory = dict()  # (cmd, params) -> last fitting measuring range
+        # last ADC acquisition settings sent to the instrument (None = unknown)
+        self.bsi_meas_settings = {'sample_count': None, 'sample_frequency': None, 'wait_time': None}
+        self.bsi_meas_steps = dict()  # measurement step name -> tuned ADC acquisition settings
+        self.bsi_config_state = dict()  # last configuration sent, see BsiConfig (per card, 0=all cards)
+        self.bsi_mio_configs = dict()  # card -> (config set number, config list) active on the card
+        self.bsi_calibration_cache_file = os.path.join(os.path.expanduser('~'), '.bsi_calibration.json')
+        self.bsi_calibrated = False  # True = self calibration was done since the connection was opened
+        self.bsi_auto_reconnect = True  # reconnect automatically after a connection error
+        self.bsi_retries = 2  # max number of repetitions of an idempotent command after reconnect
+        self.bsi_recovering = False  # True while reconnecting after a connection error
 
     def __del__(self):
         """
@@ -88,7 +658,10 @@ class BsiInstrument:
         """
         # self.bsi_socket.shutdown(socket.SHUT_RDWR)
         # print('Closing BSI...')
-        if self.connected:
+        if self.bsi_worker is not None:
+            self._stop_worker()  # the worker holds only a weak reference, it ends with the stop request
+        # a managed instrument has no socket of its own (see BsiInstrumentManager)
+        if self.connected and self.bsi_manager is None and self.bsi_socket is not None:
             self.bsi_socket.close()
             self.bsi_socket = None
             self.connected = False
@@ -107,18 +680,30 @@ class BsiInstrument:
             self.bsi_socket.settimeout(self.bsi_timeout)  # 10.0)
             self.bsi_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
-    def open_bsi(self, address, port=17501):
+    def open_bsi(self, address, port=17501, use_cache=False):
         """
         opens bsi_instrument communication, reads id and card serialnumbers
         :param address: IP address as string f.e. '192.168.1.3'
         :param port: port number optioanla as int
+        :param use_cache: (optional) True = warm start, if this address was opened before (by any instance)
+        id is taken from cache and only card serialnumbers are read to check the card topology
         :return: True if connected and ready, else false
         """
+        if not self._on_io_thread():
+            return self._call(self.open_bsi, address, port, use_cache)
+        if use_cache and (address, port) in self.bsi_identity_cache:
+            self.last_port = port
+            self.last_address = address
+            self._reset_state()
+            if self._fast_open():
+                return True
+            self._close_socket()
         self._opensocket()
         print('Connecting to BSI ' + str(address) + ' ...', end='')
         self.last_port = port
         self.last_address = address
         self.connected = False
+        self._reset_state()
         try:
             self.bsi_socket.connect((address, port))
             self.connected = True
@@ -127,28 +712,154 @@ class BsiInstrument:
         if self.connected:
             # self.flush_receive()
             print('OK')
+            if not self._read_identity():
+                return False
+            self.bsi_identity_cache[(address, port)] = (self.bsi_id, list(self.bsi_card_serials))
+        return self.connected
+
+    def _read_identity(self):
+        """
+        reads id and card serialnumbers after connect
+        :return: True if BSI answered
+        """
+        try:
             self.bsi_id = self.get_id()
             print(self.bsi_id[0], end='')
             self.read_card_serials()
-            print(', ' + str(self.bsi_nr_cards) + ' cards'
-                  + ' (SN ' + str(self.bsi_card_serials) + ')')
-        return self.connected
+        except BsiConnectionError as ex:
+            print('NOT CONNECTED, ' + str(ex))
+            self.connected = False
+            return False
+        print(', ' + str(self.bsi_nr_cards) + ' cards'
+              + ' (SN ' + str(self.bsi_card_serials) + ')')
+        return True
 
-    def flush_receive(self):
+    def open_replay(self, trace_file, realtime=False, verify=False):
+        """
+        opens a recorded trace (see start_trace) instead of a BSI, the commands must be sent in the same
+        order as in the recording (same script), reads id and card serialnumbers like open_bsi
+        captures limited by time (f.e. mio_capture) send the same commands only with realtime=True
+        :param trace_file: path of trace file
+        :param realtime: (optional) True = answers are delayed like in the recording
+        :param verify: (optional) True = frames sent are compared with the recording (BsiProcessingError if not equal)
+        :return: True if ready
+        """
+        if not self._on_io_thread():
+            return self._call(self.open_replay, trace_file, realtime, verify)
+        self._close_socket()
+        self._reset_state()
+        self.bsi_socket = BsiReplaySocket(trace_file, realtime, verify)
+        self.bsi_socket.settimeout(self.bsi_timeout)
+        print('Replay ' + str(trace_file) + ' ...', end='')
+        self.connected = True
+        return self._read_identity()
+
+    def start_trace(self, trace_file):
+        """
+        starts recording of all frames sent and received to a binary trace file (see BsiTraceRecorder),
+        start before open_bsi to be able to replay the recording with open_replay
+        :param trace_file: path of trace file
+        :return: None
+        """
+        if not self._on_io_thread():
+            return self._call(self.start_trace, trace_file)
+        self.stop_trace()
+        self.bsi_trace = BsiTraceRecorder(trace_file)
+
+    def stop_trace(self):
+        """
+        stops recording, closes trace file
+        :return: None
+        """
+        if not self._on_io_thread():
+            return self._call(self.stop_trace)
+        if self.bsi_trace is not None:
+            self.bsi_trace.close()
+            self.bsi_trace = None
+
+    def _reset_state(self):
+        """
+        forgets everything known about the instrument state (measuring range, configuration...)
+        :return: None
+        """
+        self.bsi_meas_range = None
+        self.bsi_meas_settings = {'sample_count': None, 'sample_frequency': None, 'wait_time': None}
+        self.bsi_config_state = dict()
+        self.bsi_mio_configs = dict()
+        self.bsi_calibrated = False  # BSI may have been power cycled
+        self.bsi_rx_buffer = bytearray()
+        self.bsi_pending.clear()
+
+    def _fast_open(self):
+        """
+        connects to last address and checks link and card topology with one command,
+        id is taken from bsi_identity_cache, the known instrument state is reset
+        (the BSI may have been power cycled meanwhile)
+        :return: True if connected and card serialnumbers are the cached ones
+        """
+        bsi_id, serials = self.bsi_identity_cache[(self.last_address, self.last_port)]
+        self._opensocket()
+        self.bsi_rx_buffer = bytearray()
+        self.bsi_pending.clear()
+        try:
+            self.bsi_socket.connect((self.last_address, self.last_port))
+        except Exception as ex:
+            print('NOT CONNECTED, ' + str(ex))
+            return False
+        self.connected = True
+        try:
+            card_serials = self.read_card_serials()
+        except BsiConnectionError:
+            card_serials = None
+        if card_serials != serials:
+            self.connected = False
+            return False
+        self.bsi_id = bsi_id
+        self._reset_state()
+        return True
+
+    def _close_socket(self):
         """
-        flushes socket receive buffer
+        closes socket (if open), ignores errors
         :return: None
         """
-        while 1:
+        if self.bsi_socket is not None:
             try:
-                self.bsi_socket.settimeout(0.1)
-                self.bsi_socket.recv(1024)
-            except Exception as ex:
-                print(str(ex))
-                break
-        self.bsi_socket.settimeout(self.bsi_timeout)
+                self.bsi_socket.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass  # not connected
+            self.bsi_socket.close()
+            self.bsi_socket = None
+        self.connected = False
+
+    def flush_receive(self):
+        """
+        flushes socket receive buffer without waiting (non blocking),
+        answers of commands sent before that arrive later are discarded by _receive (command counter)
+        :return: None
+        """
+        if not self._on_io_thread():
+            return self._call(self.flush_receive)
+        self.bsi_rx_buffer = bytearray()
+        self.bsi_pending.clear()
+        timeout = self.bsi_socket.gettimeout()
+        self.bsi_socket.settimeout(0.0)
+        try:
+            while self.bsi_socket.recv(4096):
+                pass
+        except OSError:
+            pass  # nothing more received
+        finally:
+            self.bsi_socket.settimeout(timeout)
 
     def disconnect(self):
+        """
+        closes connection, the I/O worker thread ends when all queued requests are done
+        :return: True if connection was open
+        """
+        if not self._on_io_thread():
+            return self._call(self.disconnect)
+        self._stop_worker()
         try:
             assert self.connected
             print("Close connection")
@@ -161,29 +872,63 @@ class BsiInstrument:
             print(str(ex))
             return False
 
-    def reconnect(self):
+    def reconnect(self, fast=False):
         """
         reconnect, close socket, open socket, open bsi (use only if communication problems exist)
+        :param fast: (optional) True = only reopen socket and check card serialnumbers (one round trip),
+        known instrument state (measuring range, configuration...) is forgotten and sent again when needed,
+        falls back to full open if the cards changed
         :return: True if bsi is ready after reconnect
         """
+        if not self._on_io_thread():
+            return self._call(self.reconnect, fast)
+        if fast and (self.last_address, self.last_port) in self.bsi_identity_cache:
+            self._close_socket()
+            if self._fast_open():
+                return True
         print("Reconnect BSI")
-        if self.connected:
-            try:
-                self.bsi_socket.shutdown(socket.SHUT_RDWR)
-                self.bsi_socket.close()
-                self.bsi_socket = None
-            except Exception as ex:
-                print(str(ex))
-                pass
-        self.connected = False
+        self._close_socket()
         return self.open_bsi(self.last_address, self.last_port)
 
+    def _recover(self):
+        """
+        reconnects after a connection error (if bsi_auto_reconnect is set),
+        fast if the cards did not change (see reconnect)
+        :return: True if reconnected
+        """
+        if not self.bsi_auto_reconnect or self.bsi_recovering \
+                or (self.last_address, self.last_port) not in self.bsi_identity_cache:
+            return False  # never opened
+        self.bsi_recovering = True
+        try:
+            return self.reconnect(fast=True)
+        finally:
+            self.bsi_recovering = False
+
+    def _is_idempotent(self, command):
+        """
+        checks if a command can be sent again after a connection error without changing the result
+        (queries, setting of values and configurations), relais, I2C / SPI transfers... are not
+        (a bus read can change the device too, f.e. FIFO or clear on read registers)
+        :param command: command as string f. e. 'SYS_IDN'
+        :return: True if command can be repeated
+        """
+        if command.startswith(self.bsi_bus_commands) and '_CFG_' not in command:
+            return False
+        if '_Get' in command or '_Set' in command or command.endswith('_Read'):
+            return True
+        return command.startswith(self.bsi_idempotent_commands)
+
     def set_timeout(self, timeout):
         """
         sets socket timeout in sec
         :param timeout: timeout as float 1sec = 1.0
         :return: None
         """
+        if self.bsi_manager is not None:
+            raise BsiProcessingError('not possible with BsiInstrumentManager, see BsiInstrumentManager.timeout')
+        if not self._on_io_thread():
+            return self._call(self.set_timeout, timeout)
         self.bsi_socket.settimeout(timeout)
 
     def get_timeout(self):
@@ -191,8 +936,35 @@ class BsiInstrument:
         reads socket timeout in sec
         :return: timeout in sec as float 1sec = 1.0
         """
+        if self.bsi_manager is not None:
+            return self.bsi_manager.timeout
         return self.bsi_socket.gettimeout()
 
+    @contextmanager
+    def _transfer_timeout(self, nr_bytes):
+        """
+        context manager, extends socket timeout for a large transfer, the timeout is derived from the
+        measured throughput (bsi_i2c_throughput), the old timeout is restored also on errors,
+        a managed instrument (see BsiInstrumentManager) keeps the timeout of the manager
+        :param nr_bytes: number of bytes transferred per answer
+        :return: None
+        """
+        if self.bsi_manager is not None:
+            if self.bsi_transfer_safety * nr_bytes / self.bsi_i2c_throughput > self.bsi_manager.timeout:
+                raise BsiProcessingError('transfer of {} byte exceeds timeout of BsiInstrumentManager'.format(nr_bytes))
+            yield
+            return
+        timeout = self.get_timeout()
+        transfer_timeout = self.bsi_timeout + self.bsi_transfer_safety * nr_bytes / self.bsi_i2c_throughput
+        if timeout is None or transfer_timeout <= timeout:
+            yield
+            return
+        self.set_timeout(transfer_timeout)
+        try:
+            yield
+        finally:
+            self.set_timeout(timeout)
+
     def get_connected(self):
         """
         returns connected status
@@ -221,67 +993,701 @@ class BsiInstrument:
         """
         return self.bsi_card_serials
 
-    def _send(self, command, params=''):
+    def _mnemonic(self, command):
         """
-        builds and sends command, increments command counter
+        returns command mnemonic for statistics, numbers of sources, banks, configurations,
+        channels and the pins of measurements are replaced by '*' (f.e. 'MEAS_V_*', 'PWR_On*', 'DIG_I2C*_Read')
+        :param command: command as string
+        :return: mnemonic as string
+        """
+        mnemonic = self.bsi_mnemonics.get(command)
+        if mnemonic is None:
+            if command.startswith(('MEAS_V_', 'MEAS_I_')):
+                mnemonic = command[:7] + '*'
+            else:
+                mnemonic = re.sub(r'(?<=DIG_I2C|DIG_SPI)\d+|\d+$', '*', command)
+            self.bsi_mnemonics[command] = mnemonic
+        return mnemonic
+
+    def _command_stats(self, mnemonic):
+        """
+        returns statistics of a mnemonic, creates it if not existing (call with bsi_stats_lock)
+        :param mnemonic: mnemonic as string
+        :return: BsiCommandStats
+        """
+        stats = self.bsi_stats.get(mnemonic)
+        if stats is None:
+            stats = BsiCommandStats(mnemonic)
+            self.bsi_stats[mnemonic] = stats
+        return stats
+
+    def stats(self):
+        """
+        returns snapshot of the command statistics (since creation or reset_stats)
+        :return: dict mnemonic -> dict (see BsiCommandStats.as_dict), histogram bins see BsiCommandStats.bin_edges
+        """
+        with self.bsi_stats_lock:
+            return {mnemonic: stats.as_dict() for mnemonic, stats in self.bsi_stats.items()}
+
+    def reset_stats(self):
+        """
+        clears the command statistics
+        :return: None
+        """
+        with self.bsi_stats_lock:
+            self.bsi_stats = dict()
+            self.bsi_stats_answers = dict()
+
+    @contextmanager
+    def profile(self, name):
+        """
+        context manager, counts round trips, commands, bytes and waiting time of the calling thread,
+        f.e. with bsi.profile("configure BMA280") as p: ...  print(p)
+        profiles can be nested, commands are counted in all active profiles
+        :param name: name of the block
+        :return: BsiProfile
+        """
+        profile = BsiProfile(name)
+        active = getattr(self.bsi_profiling, 'active', None)
+        if active is None:
+            active = list()
+            self.bsi_profiling.active = active
+        active.append(profile)
+        start = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.time = time.perf_counter() - start
+            active.remove(profile)
+
+    def _profiling(self):
+        """
+        checks if a profile is active in the calling thread
+        :return: True if profiling
+        """
+        return len(getattr(self.bsi_profiling, 'active', ())) > 0
+
+    def _profile_path(self):
+        """
+        returns the public BsiInstrument methods in the call stack of the caller (outermost first)
+        :return: list of method names
+        """
+        path = list()
+        frame = sys._getframe(2)
+        while frame is not None:
+            name = frame.f_code.co_name
+            if not name.startswith('_') and frame.f_locals.get('self') is self:
+                path.append(name)
+            frame = frame.f_back
+        path.reverse()
+        return path
+
+    def _profile_add(self, commands, round_trips, wait_time):
+        """
+        adds commands to all active profiles of the calling thread
+        :param commands: list of (command, params, length of answer)
+        :param round_trips: number of times waited for answers
+        :param wait_time: time waited in sec
+        :return: None
+        """
+        path = self._profile_path()
+        wait_path = path
+        if len(commands) == 1:
+            wait_path = path + [self._mnemonic(commands[0][0])]
+        for profile in self.bsi_profiling.active:
+            for command, params, answer_len in commands:
+                frame_len = len(command) + 5 + (len(params) + 1 if params != '' else 0)  # ,NNN \n
+                profile.add(path + [self._mnemonic(command)], commands=1, bytes_sent=frame_len,
+                            bytes_received=answer_len)
+            profile.add(wait_path, round_trips=round_trips, wait_time=wait_time)
+
+    def _build_frame(self, command, params=''):
+        """
+        builds command frame, increments command counter
+        frames of the same command and parameters are built from a template (see _frame_template),
+        only the counter is inserted
         :param command: command as string f. e. 'SYS_IDN'
         :param params:  (optional) as  string ( seperated by ',' if necessary)
-        :return: number of bytes sent as int
+        :return: frame as bytes
         """
         self.bsi_cmd_counter += 1
         if self.bsi_cmd_counter >= 1000:
             self.bsi_cmd_counter = 1
-        cmd = command + ',' + "{:03d}".format(self.bsi_cmd_counter)
-        if params != '':
-            cmd += ',' + params
-        cmd += '\n'
+        counter = self.bsi_counters[self.bsi_cmd_counter]
+        head, tail, mnemonic = self._frame_template(command, params)
+        frame = head + counter + tail
+        self.bsi_pending.append([counter, mnemonic, len(frame), None])
+        return frame
+
+    def _frame_template(self, command, params=''):
+        """
+        returns frame parts before and after the command counter, templates of short
+        parameter lists are kept (shared by all instances), long ones (f.e. data frames) are built each time
+        :param command: command as string
+        :param params: parameters as string
+        :return: (head as bytes, tail as bytes, mnemonic)
+        """
+        template = self.bsi_frame_templates.get((command, params))
+        if template is None:
+            head = bytes(command + ',', 'utf-8')
+            tail = bytes(',' + params + '\n', 'utf-8') if params != '' else b'\n'
+            template = (head, tail, self._mnemonic(command))
+            if len(params) <= self.bsi_template_max_params:
+                if len(self.bsi_frame_templates) >= self.bsi_template_cache_size:
+                    self.bsi_frame_templates.clear()
+                self.bsi_frame_templates[(command, params)] = template
+        return template
+
+    def _send(self, command, params=''):
+        """
+        builds and sends command, increments command counter
+        :param command: command as string f. e. 'SYS_IDN'
+        :param params:  (optional) as  string ( seperated by ',' if necessary)
+        :return: number of bytes sent as int
+        """
+        return self._send_frames(self._build_frame(command, params))
+
+    def _send_frames(self, frames):
+        """
+        sends one or more command frames
+        raises BsiConnectionError if sending fails
+        :param frames: frames as bytes (see _build_frame)
+        :return: number of bytes sent as int
+        """
+        start = time.perf_counter()
         try:
-            bytes_sent = self.bsi_socket.send(bytes(cmd, 'utf-8'))
+            self.bsi_socket.sendall(frames)
         except Exception as ex:
-            bytes_sent = 0
-            print(str(ex))
-        return bytes_sent
+            raise BsiConnectionError(str(ex))
+        end = time.perf_counter()
+        if self.bsi_trace is not None:
+            self.bsi_trace.record(BsiTraceRecorder.Sent, frames)
+        # commands of these frames are the last ones built and not sent yet
+        sent = list()
+        for entry in reversed(self.bsi_pending):
+            if entry[3] is not None:
+                break
+            entry[3] = end
+            sent.append(entry)
+        if self.bsi_stats_enabled and len(sent) > 0:
+            with self.bsi_stats_lock:
+                for entry in sent:
+                    stats = self._command_stats(entry[1])
+                    stats.count += 1
+                    stats.bytes_sent += entry[2]
+                    stats.add_time('send', (end - start) / len(sent))
+        return len(frames)
+
+    def _receive(self, buffersize=4096):
+        """
+        reads the answer of the oldest command sent (loops until \n is received)
+        and encodes with utf-8, answers with an other command counter (f.e. late answers
+        of a command timed out before) are discarded, so they are never returned to the wrong caller
+        further answers received with the same data (pipelined commands)
+        stay in the receive buffer for the next call
+        raises BsiConnectionError on timeout or closed connection
+        :return: complete answer as string
+        """
+        expected = None
+        if len(self.bsi_pending) > 0:
+            expected = self.bsi_pending.popleft()
+        while True:
+            frame = self._receive_frame(buffersize)
+            fields = frame.split(b',', 2)
+            # answer: status,counter,values...
+            if expected is None or len(fields) < 2 or not fields[1].isdigit() or fields[1] == expected[0]:
+                break
+        if self.bsi_stats_enabled and expected is not None and expected[3] is not None:
+            with self.bsi_stats_lock:
+                stats = self._command_stats(expected[1])
+                stats.bytes_received += len(frame)
+                stats.add_time('wait', time.perf_counter() - expected[3])
+                if frame.startswith(b'E'):
+                    stats.errors += 1
+                self.bsi_stats_answers[expected[0]] = expected[1]
+        return str(frame, encoding="utf-8")
+
+    def _receive_frame(self, buffersize=4096):
+        """
+        reads one frame (up to and including \n) from receive buffer or socket with timeout
+        raises BsiConnectionError on timeout or closed connection
+        :return: frame as bytes
+        """
+        try:
+            end = self.bsi_rx_buffer.find(b'\n')
+            while end < 0:
+                start = len(self.bsi_rx_buffer)
+                data = self.bsi_socket.recv(buffersize)
+                if not data:
+                    raise ConnectionError('connection closed by BSI')
+                if self.bsi_trace is not None:
+                    self.bsi_trace.record(BsiTraceRecorder.Received, data)
+                self.bsi_rx_buffer += data
+                end = self.bsi_rx_buffer.find(b'\n', start)
+        except Exception as ex:
+            raise BsiConnectionError(str(ex))
+        frame = bytes(self.bsi_rx_buffer[:end + 1])
+        del self.bsi_rx_buffer[:end + 1]
+        return frame
 
-    def _receive(self, buffersize=1024):
+    def _on_io_thread(self):
         """
-        reads from bsi_instrument with timeout
-        and encodes with utf-8 (if more than 1024 characters received loops)
-        until \n as last character received
-        :return: complete answer as string, '' on timeout
+        checks if called from the I/O worker thread
+        :return: True if called from I/O worker thread
         """
+        worker = self.bsi_worker
+        return worker is not None and worker.ident == threading.get_ident()
+
+    @contextmanager
+    def priority(self, priority):
+        """
+        context manager, sets default priority of requests of the calling thread
+        f.e. with bsi.priority(BsiPriority.Interactive): bsi.pwr_set_onoff(1, 1)
+        :param priority: BsiPriority
+        :return: None
+        """
+        old_priority = self._current_priority()
+        self.bsi_priority.value = priority
         try:
-            data = str(self.bsi_socket.recv(buffersize), encoding="utf-8")
-            # recv(.., flags = socket.MSG_DONTWAIT)
-            # has no meaning in windows / doesn't excists there
-            # starting with small buffers (e.g. 32) for short ACKs won't
-            # makes it faster -> just a tiny bit, but then program spends more time in sleep.
-            #  check for end of message character -> otherwise there might be further data
-            for ind in range(100):
-                if data[-1:] == "\n":
-                    break
-                time.sleep(0.01)
-                data += str(self.bsi_socket.recv(buffersize), encoding="utf-8")
+            yield
+        finally:
+            self.bsi_priority.value = old_priority
+
+    def _current_priority(self):
+        """
+        returns default priority of the calling thread
+        :return: BsiPriority (Control if not set)
+        """
+        return getattr(self.bsi_priority, 'value', BsiPriority.Control)
+
+    def submit(self, command, params='', priority=None):
+        """
+        queues command for the I/O worker thread and returns without waiting for the answer,
+        can be called from any thread, commands queued meanwhile are sent pipelined
+        :param command: command as string f. e. 'SYS_IDN'
+        :param params: (optional) as  string ( seperated by ',' if necessary)
+        :param priority: (optional) BsiPriority, default see priority()
+        :return: concurrent.futures.Future, result is the complete answer as string
+        (BsiProcessingError if the BSI answers with error, BsiConnectionError see _query)
+        """
+        return self._submit(None, (command, params), priority)
+
+    def _submit(self, function, args, priority=None):
+        """
+        queues request for the I/O worker thread, starts worker if not running
+        :param function: function called in worker thread, None = query (args = (command, params))
+        :param args: tuple of arguments
+        :param priority: (optional) BsiPriority, default see priority()
+        :return: concurrent.futures.Future
+        """
+        if self.bsi_manager is not None:
+            if function is not None:
+                raise BsiProcessingError('not possible with BsiInstrumentManager, only single queries')
+            return self.bsi_manager.submit(self, *args)
+        if priority is None:
+            priority = self._current_priority()
+        future = Future()
+        with self.bsi_worker_lock:
+            self.bsi_requests.put((priority, next(self.bsi_request_sequence), future, function, args))
+            if self.bsi_worker is None:
+                self.bsi_worker = threading.Thread(target=BsiInstrument._io_worker, name='BsiIO', daemon=True,
+                                                   args=(weakref.ref(self), self.bsi_requests))
+                self.bsi_worker.start()
+        return future
+
+    def _stop_worker(self):
+        """
+        queues stop request, the I/O worker thread ends after all other requests
+        :return: None
+        """
+        with self.bsi_worker_lock:
+            self.bsi_requests.put((len(BsiPriority), next(self.bsi_request_sequence), None, None, None))
+
+    def _call(self, function, *args, priority=None):
+        """
+        calls function in the I/O worker thread (directly if already there) and waits for the result
+        :param function: function to call
+        :param args: arguments
+        :param priority: (optional) BsiPriority, default see priority()
+        :return: return value of function
+        """
+        if self._on_io_thread():
+            return function(*args)
+        return self._submit(function, args, priority).result()
+
+    @staticmethod
+    def _io_worker(instance_ref, requests):
+        """
+        I/O worker thread, the only thread using the socket:
+        queued queries are sent pipelined (up to bsi_pipeline_depth), functions are called in order
+        of priority, the instance is referenced only while a request is handled, so an unused
+        BsiInstrument is garbage collected (its destructor stops the worker)
+        :param instance_ref: weakref.ref of BsiInstrument
+        :param requests: queue of requests (bsi_requests)
+        :return: None
+        """
+        pending = None
+        while True:
+            if pending is None:
+                request = requests.get()
+            else:
+                request = pending
+            instance = instance_ref()
+            if instance is None:
+                return  # garbage collected
+            stop, pending = instance._handle_request(request)
+            del instance, request  # no reference while waiting for the next request
+            if stop:
+                return
+
+    def _handle_request(self, request):
+        """
+        handles one request in the I/O worker thread, queries queued meanwhile are sent with it
+        :param request: (priority, sequence, future, function, args) see _submit
+        :return: tuple (True if worker has to stop, next request already taken out of the queue or None)
+        """
+        priority, sequence, future, function, args = request
+        if future is None:  # stop request (see disconnect)
+            with self.bsi_worker_lock:
+                if self.bsi_requests.empty():
+                    self.bsi_worker = None
+                    return True, None
+                self.bsi_requests.put(request)  # handle requests queued after the stop request first
+            return False, None
+        if function is not None:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args))
+                except Exception as ex:
+                    future.set_exception(ex)
+            return False, None
+        pending = None
+        batch = [(future, args)]
+        while len(batch) < self.bsi_pipeline_depth:
+            try:
+                request = self.bsi_requests.get_nowait()
+            except queue.Empty:
+                break
+            if request[2] is None or request[3] is not None:
+                pending = request
+                break
+            batch.append((request[2], request[4]))
+        self._run_queries(batch)
+        return False, pending
+
+    def _take_urgent(self, priority, max_nr):
+        """
+        takes queued queries with higher priority out of the queue
+        (f.e. to send them between the commands of a stream)
+        :param priority: BsiPriority, only requests with higher priority (lower value) are taken
+        :param max_nr: max number of queries
+        :return: list of (future, (command, params))
+        """
+        urgent = list()
+        while len(urgent) < max_nr:
+            try:
+                request = self.bsi_requests.get_nowait()
+            except queue.Empty:
+                break
+            if request[0] >= priority or request[2] is None or request[3] is not None:
+                self.bsi_requests.put(request)  # same sequence number, order is kept
+                break
+            if request[2].set_running_or_notify_cancel():
+                urgent.append((request[2], request[4]))
+        return urgent
+
+    def _run_queries(self, batch):
+        """
+        sends queued queries pipelined and sets the answers as future results
+        :param batch: list of (future, (command, params))
+        :return: None
+        """
+        batch = [request for request in batch if request[0].set_running_or_notify_cancel()]
+        if len(batch) == 0:
+            return
+        try:
+            answers = self._roundtrips([args for future, args in batch])
         except Exception as ex:
-            data = ''
-            print(str(ex))
-        return data
+            for future, args in batch:
+                future.set_exception(ex)
+            return
+        for (future, args), data in zip(batch, answers):
+            if data.startswith("E"):
+                future.set_exception(BsiProcessingError(data))
+            else:
+                future.set_result(data)
 
     def _query(self, command, params=''):
         """
-        sends command and reads answer
+        sends command and reads answer (in the I/O worker thread, see submit)
+        after a connection error the BSI is reconnected, idempotent commands are repeated
+        (see _is_idempotent), for other commands BsiConnectionError is raised
         :param command: command as string f. e. 'SYS_IDN'
         :param params: (optional) as  string ( seperated by ',' if necessary)
         :return: complete answer as string,
         """
         # print (command)
-        with self.lock:  # TODO: make this method thread safe AND efficient
-            bytes_sent = self._send(command, params)
-            data = None
-            if bytes_sent != 0:
+        if not self._on_io_thread():
+            if self._profiling():
+                start = time.perf_counter()
+                data = ''
+                try:
+                    data = self.submit(command, params).result()
+                except BsiProcessingError as ex:
+                    data = str(ex)
+                    raise
+                finally:
+                    self._profile_add([(command, params, len(data))], 1, time.perf_counter() - start)
+                return data
+            return self.submit(command, params).result()
+        data = self._roundtrips([(command, params)])[0]
+        if data.startswith("E"):
+            raise BsiProcessingError(data)
+        return data
+
+    def _retry_after(self, ex, commands, attempt):
+        """
+        handles a connection error: reconnects and returns if the commands can be sent again,
+        else raises BsiConnectionError
+        :param ex: BsiConnectionError caught
+        :param commands: list of commands (strings) to be sent again
+        :param attempt: number of repetitions done so far
+        :return: None
+        """
+        if not self._recover():
+            raise ex
+        for command in commands:
+            if not self._is_idempotent(command):
+                raise BsiConnectionError(command + ' not repeated after reconnect,'
+                                         + ' state of BSI unknown (' + str(ex) + ')')
+        if attempt >= self.bsi_retries:
+            raise ex
+        print('Repeat after reconnect (' + str(ex) + ')')
+
+    def _roundtrips(self, commands):
+        """
+        sends commands in blocks of bsi_pipeline_depth and reads the answers (I/O worker thread only)
+        after a connection error the block of commands is repeated if all are idempotent
+        :param commands: list of (command, params) tuples
+        :return: list of answers as string in order of commands (error answers included)
+        """
+        answers = list()
+        for first in range(0, len(commands), self.bsi_pipeline_depth):
+            block = commands[first:first + self.bsi_pipeline_depth]
+            attempt = 0
+            while True:
+                frames = b''.join([self._build_frame(command, params) for command, params in block])
+                try:
+                    self._send_frames(frames)
+                    block_answers = [self._receive() for ind in range(len(block))]
+                    break
+                except BsiConnectionError as ex:
+                    self._retry_after(ex, [command for command, params in block], attempt)
+                    attempt += 1
+            answers += block_answers
+        return answers
+
+    def _query_pipelined(self, commands, raise_error=True):
+        """
+        sends several commands without waiting for the single answers and reads the answers
+        afterwards, the BSI works off the commands in order (saves one round trip per command)
+        at most bsi_pipeline_depth commands are sent before their answers are read
+        after a connection error the block of commands is repeated if all are idempotent
+        :param commands: list of (command, params) tuples
+        :param raise_error: (optional) False = error answers are returned instead of raising BsiProcessingError
+        :return: list of answers as string in order of commands
+        """
+        start = time.perf_counter()
+        answers = self._call(self._roundtrips, commands)
+        if self._profiling():
+            self._profile_add([(command, params, len(data)) for (command, params), data in zip(commands, answers)],
+                              -(-len(commands) // self.bsi_pipeline_depth), time.perf_counter() - start)
+        # raise after all answers are read, so the stream stays in order
+        for data in answers:
+            if raise_error and data.startswith("E"):
+                raise BsiProcessingError(data)
+        return answers
+
+    def _query_stream(self, command, params, handle, duration, nr_samples, depth=None, prefix=(), prefix_handle=None):
+        """
+        sends the same command again and again with up to depth commands in flight
+        until duration is over or nr_samples answers are received (f.e. for captures)
+        the stream has BsiPriority.Bulk, queued queries with higher priority are sent in between
+        :param command: command as string
+        :param params: parameter string
+        :param handle: function called for each answer as handle(timestamp, answer),
+        timestamp in sec (time.monotonic) when the answer was received
+        :param duration: capture time in sec as float (counted from the answer of the last prefix command)
+        :param nr_samples: max number of answers
+        :param depth: (optional) number of commands in flight, default bsi_pipeline_depth
+        :param prefix: (optional) list of (command, params) tuples sent in front of the first
+        commands (f.e. to switch something on at the start of a capture), an error answer of a prefix command
+        stops the stream (only the commands in flight are read)
+        :param prefix_handle: (optional) function called for each answer of a prefix command as
+        prefix_handle(timestamp, answer)
+        :return: number of answers handled, list of answers of prefix commands
+        """
+        if not self._on_io_thread():
+            if not self._profiling():
+                return self._call(self._query_stream, command, params, handle, duration, nr_samples, depth, prefix,
+                                  prefix_handle, priority=BsiPriority.Bulk)
+            received = list()
+
+            def counting_handle(timestamp, answer):
+                received.append(len(answer))
+                handle(timestamp, answer)
+            start = time.perf_counter()
+            nr_handled, prefix_answers = self._call(self._query_stream, command, params, counting_handle,
+                                                    duration, nr_samples, depth, prefix, prefix_handle,
+                                                    priority=BsiPriority.Bulk)
+            commands = [(cmd, cmd_params, len(answer)) for (cmd, cmd_params), answer in zip(prefix, prefix_answers)]
+            commands += [(command, params, answer_len) for answer_len in received]
+            if len(commands) > 0:
+                self._profile_add(commands, 1, time.perf_counter() - start)
+            return nr_handled, prefix_answers
+        if depth is None:
+            depth = self.bsi_pipeline_depth
+        stop_sending = False
+        nr_handled = 0
+        prefix_answers = list()
+        sent = 0
+        in_flight = deque()  # per command in flight: None = stream command, future = query sent in between
+        nr_stream = 0  # stream commands in flight
+        end = time.monotonic() + duration
+        frames = b''.join([self._build_frame(cmd, cmd_params) for cmd, cmd_params in prefix])
+        try:
+            while True:
+                if not stop_sending:
+                    for future, (cmd, cmd_params) in self._take_urgent(BsiPriority.Bulk, depth):
+                        frames += self._build_frame(cmd, cmd_params)
+                        in_flight.append(future)
+                    nr_send = min(depth - nr_stream, nr_samples - sent)
+                    if nr_send > 0:
+                        frames += b''.join([self._build_frame(command, params) for ind in range(nr_send)])
+                        in_flight.extend([None] * nr_send)
+                        sent += nr_send
+                        nr_stream += nr_send
+                    if len(frames) > 0:
+                        self._send_frames(frames)
+                        frames = b''
+                if len(prefix_answers) < len(prefix):
+                    data = self._receive()
+                    timestamp = time.monotonic()
+                    prefix_answers.append(data)
+                    if prefix_handle is not None:
+                        prefix_handle(timestamp, data)
+                    if data.startswith("E"):
+                        stop_sending = True  # read answers in flight
+                    elif len(prefix_answers) == len(prefix):
+                        end = timestamp + duration
+                    continue
+                if len(in_flight) == 0:
+                    break
                 data = self._receive()
+                timestamp = time.monotonic()
+                future = in_flight.popleft()
+                if future is not None:
+                    if data.startswith("E"):
+                        future.set_exception(BsiProcessingError(data))
+                    else:
+                        future.set_result(data)
+                    continue
+                nr_stream -= 1
                 if data.startswith("E"):
-                    raise BsiProcessingError(data)
-        return data
+                    stop_sending = True  # read answers in flight
+                    continue
+                handle(timestamp, data)
+                nr_handled += 1
+                if timestamp >= end:
+                    stop_sending = True  # read answers in flight
+        except BsiConnectionError as ex:
+            # answers in flight are lost, return what was received so far
+            print(str(ex))
+            for future in in_flight:
+                if future is not None:
+                    future.set_exception(ex)
+            self._recover()
+        return nr_handled, prefix_answers
+
+    def _query_sequence(self, commands, depth):
+        """
+        sends commands with up to depth commands in flight and reads the answers (I/O worker thread only),
+        queued queries with higher priority than BsiPriority.Bulk are sent in between
+        (f.e. chunks of large transfers), after an error answer the remaining commands are not sent
+        raises BsiConnectionError (commands are not repeated)
+        :param commands: list of (command, params) tuples
+        :param depth: max number of commands in flight
+        :return: list of answers as string in order of commands (shorter after an error answer)
+        """
+        answers = list()
+        in_flight = deque()  # per command in flight: None = own command, future = query sent in between
+        nr_own = 0  # own commands in flight
+        sent = 0
+        stop_sending = False
+        try:
+            while True:
+                frames = b''
+                for future, (cmd, cmd_params) in self._take_urgent(BsiPriority.Bulk, depth):
+                    frames += self._build_frame(cmd, cmd_params)
+                    in_flight.append(future)
+                if not stop_sending:
+                    nr_send = min(depth - nr_own, len(commands) - sent)
+                    for cmd, cmd_params in commands[sent:sent + nr_send]:
+                        frames += self._build_frame(cmd, cmd_params)
+                    in_flight.extend([None] * nr_send)
+                    sent += nr_send
+                    nr_own += nr_send
+                if len(frames) > 0:
+                    self._send_frames(frames)
+                if len(in_flight) == 0:
+                    break
+                data = self._receive()
+                future = in_flight.popleft()
+                if future is None:
+                    nr_own -= 1
+                    answers.append(data)
+                    if data.startswith("E"):
+                        stop_sending = True  # read answers in flight
+                elif data.startswith("E"):
+                    future.set_exception(BsiProcessingError(data))
+                else:
+                    future.set_result(data)
+        except BsiConnectionError as ex:
+            for future in in_flight:
+                if future is not None:
+                    future.set_exception(ex)
+            self._recover()
+            raise
+        return answers
+
+    def _sweep_settled(self, commands, settle_ms):
+        """
+        helper for pwr_sweep_voltage (I/O worker thread), sends (set voltage, measure current) pairs
+        with settle time counting from the answer of the set command, the next voltage is set together
+        with the measurement of the last point (one round trip per point)
+        :param commands: list of (command, params) tuples, set voltage and measure current alternating
+        :param settle_ms: wait time in ms between setting voltage and measuring current
+        :return: list of answers (less than commands after a connection error)
+        """
+        answers = list()
+        try:
+            self._send_frames(self._build_frame(*commands[0]))
+            answers.append(self._receive())
+            settled = time.monotonic() + settle_ms / 1000.0
+            for ind in range(1, len(commands), 2):
+                time.sleep(max(0.0, settled - time.monotonic()))
+                # measure point, set next voltage
+                frames = b''.join([self._build_frame(cmd, params) for cmd, params in commands[ind:ind + 2]])
+                self._send_frames(frames)
+                answers.append(self._receive())
+                if ind + 1 < len(commands):
+                    answers.append(self._receive())
+                    settled = time.monotonic() + settle_ms / 1000.0
+        except BsiConnectionError as ex:
+            # points not measured stay NaN
+            print(str(ex))
+            self._recover()
+        return answers
 
     # def llv_read_reg(self, address):
     #     par=f"1,RD,{address}"
@@ -307,33 +1713,61 @@ class BsiInstrument:
         """
         if convert_to_type is None:
             return data_string
-        if data_string != '':
-            if convert_to_type == int:
-                return int(data_string)  # convert to int
-            if convert_to_type == float:
-                return float(data_string)  # convert to float
-            if convert_to_type == hex:
-                if separate_hex_nibbles > 0:
-                    if len(data_string) == separate_hex_nibbles:
-                        return int(data_string, 16)  # convert to hex
-                    else:
-                        b_list = list()
-                        # l = len(data_string)
-                        nr_bytes = int(len(data_string) / separate_hex_nibbles)
-                        for elem in range(nr_bytes):
-                            hex_str = '0x' + str(data_string[separate_hex_nibbles
-                                                             * elem: (separate_hex_nibbles * elem)
-                                                                     + separate_hex_nibbles])
-                            b_list.append(int(hex_str, 16))
-                        return b_list
-                else:
-                    return int(data_string, 16)  # convert to hex
-            if (convert_to_type == bool) or (convert_to_type == 'andbool'):
-                if data_string == 'O':
-                    return True
-                return False
-        else:
+        if data_string == '':
             return default
+        return BsiInstrument._decoder(convert_to_type, separate_hex_nibbles)(data_string)
+
+    @staticmethod
+    def _decoder(convert_to_type, separate_hex_nibbles=2):
+        """
+        returns the decoder function for one answer element (see _convert_string),
+        decoders are created once per conversion type and nr of hex nibbles
+        :param convert_to_type: type(f.e. int, float, hex, bool,'andbool')
+        :param separate_hex_nibbles: nr of hex nibble to convert to int (only used for hex)
+        :return: function(data_string) -> converted value (None for unknown types)
+        """
+        if convert_to_type is not hex:
+            return BsiInstrument.bsi_decoders.get(convert_to_type, BsiInstrument._decode_unknown)
+        decoder = BsiInstrument.bsi_hex_decoders.get(separate_hex_nibbles)
+        if decoder is None:
+            if separate_hex_nibbles > 0:
+                # buffer -> list of int
+                to_list = np.ndarray.tolist if separate_hex_nibbles in BsiInstrument.bsi_hex_dtypes else list
+
+                def decoder(data_string):
+                    if len(data_string) == separate_hex_nibbles:
+                        return int(data_string, 16)
+                    return to_list(BsiInstrument._decode_hex_buffer(data_string, separate_hex_nibbles))
+            else:
+                def decoder(data_string):
+                    return int(data_string, 16)
+            BsiInstrument.bsi_hex_decoders[separate_hex_nibbles] = decoder
+        return decoder
+
+    @staticmethod
+    def _decode_unknown(data_string):
+        """
+        decoder for unknown conversion types
+        :return: None
+        """
+        return None
+
+    @staticmethod
+    def _decode_hex_buffer(data_string, separate_hex_nibbles=2):
+        """
+        decodes hex string to buffer of unsigned values (big endian, incomplete values at the end are ignored)
+        :param data_string: hex string f.e. '0A0B0C'
+        :param separate_hex_nibbles: nr of hex nibbles per value
+        :return: bytearray (2 nibbles), numpy array (4, 8, 16 nibbles), else list of int
+        """
+        length = len(data_string) - len(data_string) % separate_hex_nibbles
+        if separate_hex_nibbles == 2:
+            return bytearray.fromhex(data_string[:length])
+        dtype = BsiInstrument.bsi_hex_dtypes.get(separate_hex_nibbles)
+        if dtype is not None:
+            return np.frombuffer(bytes.fromhex(data_string[:length]), dtype)
+        return [int(data_string[pos:pos + separate_hex_nibbles], 16)
+                for pos in range(0, length, separate_hex_nibbles)]
 
     def _parse_answer(self, answer, remove_first_elements=0, convert_to_type=None,
                       card_select=0, separate_hex_nibbles=2):
@@ -341,7 +1775,7 @@ class BsiInstrument:
         splits answer from BSI to int list, separator is ',', removes '/n',
         removes first elements, converts answer to list of (float, int, hex, bool
         (BSI 'O'=TRUE, 'E'=FALSE), 'andbool' (AND calculation over all Bool
-        of existing BSI cards)
+        of existing BSI cards), bytearray (hex frame as buffer, f.e. I2C data)
         if conversion type is None no conversion is done and list of strings will be returned
         :param answer: string to convert
         :param remove_first_elements: number of leading list elements to remove
@@ -351,28 +1785,47 @@ class BsiInstrument:
         :return:  converted value (single or list depends on card_select and conversion type)
         (type depends on conversion type)
         """
+        if not self.bsi_stats_enabled or answer is None:
+            return self._convert_answer(answer, remove_first_elements, convert_to_type, card_select,
+                                        separate_hex_nibbles)
+        start = time.perf_counter()
+        res = self._convert_answer(answer, remove_first_elements, convert_to_type, card_select, separate_hex_nibbles)
+        duration = time.perf_counter() - start
+        # counter is the second element (answer is not split, may be large)
+        begin = answer.find(',') + 1
+        end = answer.find(',', begin)
+        if begin > 0:
+            with self.bsi_stats_lock:
+                mnemonic = self.bsi_stats_answers.get(bytes(answer[begin:end if end >= 0 else len(answer)], 'utf-8'))
+                if mnemonic is not None:
+                    self._command_stats(mnemonic).add_time('parse', duration)
+        return res
+
+    def _convert_answer(self, answer, remove_first_elements=0, convert_to_type=None,
+                        card_select=0, separate_hex_nibbles=2):
+        """
+        helper function for _parse_answer (parameters see there)
+        """
         if answer is None:
             return None
-        return_list = answer.strip('\n')
-        return_list = return_list.split(',')
-        if return_list[-1] == '\n':
-            return_list = return_list[:-1]  # strip newline at end of answer
+        answer = answer.strip('\n')
+        if card_select > 0:
+            # split only up to the selected card
+            index = remove_first_elements + card_select - 1
+            return self._convert_string(answer.split(',', index + 1)[index], convert_to_type,
+                                        '', separate_hex_nibbles)
+        return_list = answer.split(',')
         if remove_first_elements > 0:
             return_list = return_list[remove_first_elements:]
-        if card_select > 0:
-            res = self._convert_string(return_list[card_select - 1], convert_to_type,
-                                       '', separate_hex_nibbles)
-            return res
-        for ind in range(len(return_list)):
-            return_list[ind] = self._convert_string(return_list[ind], convert_to_type,
-                                                    '', separate_hex_nibbles)
+        if convert_to_type is None:
+            return return_list
         # card_select is 0 (allcards and bool has to be build over all EXISTING cards)
         if convert_to_type == 'andbool':
-            for ind in range(self.bsi_nr_cards):
-                if not return_list[ind]:
-                    return False
-            return True
-        return return_list
+            return return_list[:self.bsi_nr_cards].count('O') == self.bsi_nr_cards
+        if convert_to_type is bool:
+            return [elem == 'O' if elem != '' else '' for elem in return_list]
+        decoder = self._decoder(convert_to_type, separate_hex_nibbles)
+        return [decoder(elem) if elem != '' else '' for elem in return_list]
 
     # def _check_oklist(self,li,card_select):
     #     if(card_select==0):
@@ -388,6 +1841,7 @@ class BsiInstrument:
     def _create_param_list_string(value, default, card_select, create_hex=False):
         """
         creates pameter list for BSI (AL,HL,...) dependent on card_select
+        lists of short values are created once and kept (shared by all instances)
 
         :param value: option_name for list elements to create
         :param default:  is option_name for not selected/not existing cards
@@ -395,34 +1849,31 @@ class BsiInstrument:
         :param create_hex: True=convert to hex (for example 15->0F 1023->03FF...)
         :return: string (for use as parameter list in bsi command)
         """
-        str_var: str = ''
+        key = (type(value), value, default, card_select, create_hex)
+        try:
+            str_var = BsiInstrument.bsi_param_lists.get(key)
+        except TypeError:  # not hashable
+            key = None
+            str_var = None
+        if str_var is not None:
+            return str_var
+        if not create_hex:
+            item = str(value)
+        else:
+            item = hex(value)[2:]  # cut 0x
+            # be sure to have equal number of nibbles
+            if (len(item) % 2) == 1:
+                item = '0' + item
         if card_select == 0:
-            for crd_nr in range(16):
-                if not create_hex:
-                    str_var += str(value) + ','
-                else:
-                    str_hex = hex(value)
-                    str_hex = str_hex[2:]  # cut 0x
-                    # be sure to have equal number of nibbles
-                    if (len(str_hex) % 2) == 1:
-                        str_hex = '0' + str_hex
-                    str_var += str_hex + ','
+            str_var = ','.join([item] * 16)
         else:
-            for crd_nr in range(16):
-                if crd_nr == card_select - 1:
-                    if not create_hex:
-                        str_var += str(value) + ','
-                    else:
-                        str_hex = hex(value)
-                        str_hex = str_hex[2:]  # cut 0x
-                        # be sure to have equal number of nibbles
-                        if (len(str_hex) % 2) == 1:
-                            str_hex = '0' + str_hex
-                        str_var += str_hex + ','  # format(value, '#04x')[2:]
-                else:
-                    str_var += str(default)
-                    str_var += ','
-        str_var = str_var[:-1]
+            items = [str(default)] * 16
+            items[card_select - 1] = item
+            str_var = ','.join(items)
+        if key is not None and len(item) <= BsiInstrument.bsi_template_max_params:
+            if len(BsiInstrument.bsi_param_lists) >= BsiInstrument.bsi_template_cache_size:
+                BsiInstrument.bsi_param_lists.clear()
+            BsiInstrument.bsi_param_lists[key] = str_var
         return str_var
 
     def send_cmd_parse_answer(self, cmd, card_select, parsetype='andbool', parseparam=1):
@@ -499,6 +1950,8 @@ class BsiInstrument:
         """
         res = self._query('MEAS_CFG_GetRange')
         res = self._parse_answer(res, 2, int, 1)
+        if res in (0, 1):
+            self.bsi_meas_range = res
         return res
 
     def set_meas_range(self, meas_range):
@@ -509,6 +1962,10 @@ class BsiInstrument:
         """
         res = self._query('MEAS_CFG_SetRange', str(meas_range))
         res = self._parse_answer(res, 2, 'andbool', 1)
+        if res:
+            self.bsi_meas_range = meas_range
+        else:
+            self.bsi_meas_range = None  # state of instrument unknown
         return res
 
     def set_sample_count(self, samples_per_average=1000):
@@ -520,6 +1977,7 @@ class BsiInstrument:
         """
         res = self._query('MEAS_CFG_SetSampleCnt', str(samples_per_average))
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self.bsi_meas_settings['sample_count'] = samples_per_average if res else None
         return res
 
     def set_sample_frequency(self, sample_freq=1000):
@@ -531,17 +1989,86 @@ class BsiInstrument:
         """
         res = self._query('MEAS_CFG_SetSampleFreq', str(sample_freq))
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self.bsi_meas_settings['sample_frequency'] = sample_freq if res else None
         return res
 
     def set_wait_time(self, wait_time=10):
         """
         sets wait time in ms after multiplexer set for analog measurement
         !!! all cards !!!
-        :param wait_time: wait time in ms (int)
-        :return: True=success
+        :param wait_time: wait time in ms (int)
+        :return: True=success
+        """
+        res = self._query('MEAS_CFG_SetWaitTime', str(wait_time))
+        res = self._parse_answer(res, 2, 'andbool', 1)
+        self.bsi_meas_settings['wait_time'] = wait_time if res else None
+        return res
+
+    def tune_sample_count(self, high_pin, low_pin, target_std, step=None, card_select=1,
+                          sample_counts=(10, 20, 50, 100, 200, 500, 1000), repeats=10):
+        """
+        characterises noise of a voltage measurement against the sample count and
+        sets the smallest sample count whose standard deviation meets target_std
+        (sample frequency and wait time stay as they are)
+        !!! all cards !!!
+        :param high_pin: pinname like 'MIO01'
+        (see BSI Command documention: Pin names vary by function!!!)
+        :param low_pin: pinname like 'MIO01'
+        :param target_std: maximum standard deviation of measured voltage in V as float
+        :param step: (optional) name of measurement step to store the result for (see apply_meas_step)
+        :param card_select: 1,2,..16 card used for noise calculation
+        :param sample_counts: sample counts to characterise, smallest first
+        :param repeats: number of measures per sample count
+        :return: chosen sample count as int (largest count if target is not reached, None if it
+        could not be set), dict of sample count -> standard deviation in V
+        """
+        cmd = 'MEAS_V_' + high_pin + '_' + low_pin
+        self.get_voltage_autorange(high_pin, low_pin, card_select)  # selects fitting range
+        noise = dict()
+        chosen = None
+        for sample_count in sorted(sample_counts):
+            if not self.set_sample_count(sample_count):
+                break
+            answers = self._query_pipelined([(cmd, '')] * repeats)
+            values = [self._parse_answer(answer, 2, float, card_select) for answer in answers]
+            values = [elem for elem in values if elem not in ('', None)]
+            if len(values) < 2:
+                break
+            noise[sample_count] = float(np.std(values, ddof=1))
+            chosen = sample_count
+            if noise[sample_count] <= target_std:
+                break
+        if chosen is not None and self.bsi_meas_settings['sample_count'] != chosen:
+            # stopped after trying a larger sample count, measure with the chosen one
+            if not self.set_sample_count(chosen):
+                return None, noise
+        if chosen is not None and step is not None:
+            self.bsi_meas_steps[step] = {'sample_count': chosen,
+                                         'sample_frequency': self.bsi_meas_settings['sample_frequency'],
+                                         'wait_time': self.bsi_meas_settings['wait_time'],
+                                         'std': noise[chosen]}
+        return chosen, noise
+
+    def apply_meas_step(self, step):
+        """
+        sets the ADC acquisition settings stored for a measurement step (see tune_sample_count)
+        only settings which differ from the last sent settings are sent
+        !!! all cards !!!
+        :param step: name of measurement step
+        :return: True=success, False if step is not known or setting failed
         """
-        res = self._query('MEAS_CFG_SetWaitTime', str(wait_time))
-        res = self._parse_answer(res, 2, 'andbool', 1)
+        if step not in self.bsi_meas_steps:
+            return False
+        settings = self.bsi_meas_steps[step]
+        res = True
+        if settings['wait_time'] is not None \
+                and settings['wait_time'] != self.bsi_meas_settings['wait_time']:
+            res = res and self.set_wait_time(settings['wait_time'])
+        if settings['sample_frequency'] is not None \
+                and settings['sample_frequency'] != self.bsi_meas_settings['sample_frequency']:
+            res = res and self.set_sample_frequency(settings['sample_frequency'])
+        if settings['sample_count'] != self.bsi_meas_settings['sample_count']:
+            res = res and self.set_sample_count(settings['sample_count'])
         return res
 
     def get_voltage(self, high_pin, low_pin, card_select=0):
@@ -560,9 +2087,11 @@ class BsiInstrument:
 
     def get_voltage_autorange(self, high_pin, low_pin, card_select=0):
         """
-        sets measrange to 1 (high range)
-        measure voltage between 2 pins
-        measures again in measrange 0 if result is <= 8V
+        measure voltage between 2 pins in the best fitting measuring range
+        (0=-2...8V if result is <= 8V, else 1=-2....25V)
+        the fitting range of each pin pair is remembered, so repeated measurements
+        of the same pins switch range and measure only once, a second measure is
+        done only if the result is outside the valid band of the used range
         :param high_pin: pinname like 'MIO01'
         (see BSI Command documention: Pin names vary by function!!!)
         :param low_pin: pinname like 'MIO01'
@@ -570,16 +2099,7 @@ class BsiInstrument:
         :param card_select: 1,2,..16 (single card) or 0 (all cards=default)
         :return: voltage as list of float (depends on card_select)
         """
-        res = self.set_meas_range(1)
-        if res is not None:
-            res = self._query('MEAS_V_' + high_pin + '_' + low_pin)
-            res = self._parse_answer(res, 2, float, card_select)
-            if res is not None:
-                if res <= 8.0:
-                    self.set_meas_range(0)
-                    res = self._query('MEAS_V_' + high_pin + '_' + low_pin)
-                    res = self._parse_answer(res, 2, float, card_select)
-        return res
+        return self._measure_autorange('MEAS_V_' + high_pin + '_' + low_pin, '', card_select)
 
     def get_voltage_autorange_by_cmd(self, cmd, params, card_select=0):
         """
@@ -592,17 +2112,109 @@ class BsiInstrument:
         :param card_select:  1,2,..16 (single card) or 0 (all cards=default)
         :return: voltage as list of float (depends on card_select)
         """
-        res = self.set_meas_range(1)
-        if res is not None:
+        return self._measure_autorange(cmd, params, card_select)
+
+    @staticmethod
+    def _fitting_meas_range(value):
+        """
+        helper function for autorange, returns the measuring range whose valid band
+        contains the value with 10% headroom to its limits (0=-2...8V for values -1.8...7.2V,
+        else 1=-2....25V), values close to a limit may be clipped or drift out of the band
+        :param value: measured value as float or list of float ('' for not existing cards)
+        :return: measuring range as int, None if there is no value
+        """
+        if not isinstance(value, list):
+            value = [value]
+        value = [elem for elem in value if elem != '' and elem is not None]
+        if len(value) == 0:
+            return None
+        if -2.0 * 0.9 <= min(value) and max(value) <= 8.0 * 0.9:
+            return 0
+        return 1
+
+    def _measure_autorange(self, cmd, params, card_select):
+        """
+        measures with the range predicted from earlier results of the same command,
+        measures again only if the result does not fit to the used range
+        :param cmd: measuring command as string f.e. 'MEAS_V_MIO01_MIO02'
+        :param params: parameter string
+        :param card_select: 1,2,..16 (single card) or 0 (all cards)
+        :return: voltage as list of float (depends on card_select), None if measuring range could not be set
+        """
+        key = (cmd, params)
+        meas_range = self.bsi_meas_range_memory.get(key, 1)  # unknown pins start in high range
+        res = None
+        for attempt in range(2):
+            if self.bsi_meas_range != meas_range:
+                if not self.set_meas_range(meas_range):
+                    return None
             res = self._query(cmd, params)
             res = self._parse_answer(res, 2, float, card_select)
-            if res is not None:
-                if res <= 8.0:
-                    self.set_meas_range(0)
-                    res = self._query(cmd, params)
-                    res = self._parse_answer(res, 2, float, card_select)
+            fitting_range = self._fitting_meas_range(res)
+            if fitting_range is None:
+                break
+            self.bsi_meas_range_memory[key] = fitting_range
+            if fitting_range == meas_range:
+                break
+            meas_range = fitting_range
         return res
 
+    def clear_meas_range_memory(self):
+        """
+        forgets the remembered measuring ranges of autorange measurements
+        (use this if the DUT or the wiring changed)
+        :return: None
+        """
+        self.bsi_meas_range_memory = dict()
+
+    def scan_voltages(self, pairs, cards=None):
+        """
+        measures voltages of many pin pairs on all cards at once
+        pin pairs are grouped by their remembered measuring range (see get_voltage_autorange),
+        the measurements of a group are sent pipelined, each command measures all cards
+        pairs whose result does not fit to the used range are measured again in the fitting range
+        :param pairs: list of (high_pin, low_pin) tuples, pinnames like 'MIO01'
+        (see BSI Command documention: Pin names vary by function!!!)
+        :param cards: list of card numbers 1,2,..16 (columns of result),
+        None = all existing cards (default)
+        :return: voltages as numpy array (rows=pairs, columns=cards), NaN if card has no value,
+        None if measuring range could not be set
+        """
+        if cards is None:
+            cards = list(range(1, self.bsi_nr_cards + 1))
+        result = np.full((len(pairs), len(cards)), np.nan)
+        commands = ['MEAS_V_' + high_pin + '_' + low_pin for high_pin, low_pin in pairs]
+        pending = list(range(len(pairs)))
+        for attempt in range(2):
+            groups = {0: [], 1: []}
+            for ind in pending:
+                groups[self.bsi_meas_range_memory.get((commands[ind], ''), 1)].append(ind)
+            pending = []
+            # start with the range the instrument is in, saves one range switch
+            for meas_range in sorted(groups, key=lambda elem: elem != self.bsi_meas_range):
+                indices = groups[meas_range]
+                if len(indices) == 0:
+                    continue
+                if self.bsi_meas_range != meas_range:
+                    if not self.set_meas_range(meas_range):
+                        return None
+                answers = self._query_pipelined([(commands[ind], '') for ind in indices])
+                for ind, answer in zip(indices, answers):
+                    res = self._parse_answer(answer, 2, float, 0)
+                    if res is None:
+                        continue
+                    row = [res[card - 1] for card in cards]
+                    result[ind] = [np.nan if elem == '' else elem for elem in row]
+                    fitting_range = self._fitting_meas_range(row)
+                    if fitting_range is None:
+                        continue
+                    self.bsi_meas_range_memory[(commands[ind], '')] = fitting_range
+                    if fitting_range != meas_range:
+                        pending.append(ind)
+            if len(pending) == 0:
+                break
+        return result
+
     # ************************************************************************
     # CONFIGURATION
     # ************************************************************************
@@ -650,6 +2262,7 @@ class BsiInstrument:
         str_var = str_var[:-1]
         res = self._query(cmd, str_var)
         res = self._parse_answer(res, 2, bool, 1)
+        self._config_track('mio_setup', config_number, 0, tuple(config_list[:16]), res)
         return res
 
     def mio_activate_config(self, config_number, card_select=0):
@@ -665,6 +2278,7 @@ class BsiInstrument:
         ad_list = self._create_param_list_string('1', '0', card_select, False)
         res = self._query(cmd, ad_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('mio_active', None, card_select, config_number, res)
         return res
 
     def mio_set_high_level_out(self, bank, voltage, card_select=0):
@@ -679,6 +2293,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(voltage), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('level_out_high', bank, card_select, float(voltage), res)
         return res
 
     def mio_set_low_level_out(self, bank, voltage, card_select=0):
@@ -693,6 +2308,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(voltage), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('level_out_low', bank, card_select, float(voltage), res)
         return res
 
     def mio_set_high_level_in(self, bank, voltage, card_select=0):
@@ -709,6 +2325,7 @@ class BsiInstrument:
         #print("1")
         #print(res)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('level_in_high', bank, card_select, float(voltage), res)
         return res
 
     def mio_set_low_level_in(self, bank, voltage, card_select=0):
@@ -723,6 +2340,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(voltage), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('level_in_low', bank, card_select, float(voltage), res)
         return res
 
     def mio_get_high_level_out(self, bank, card_select=0):
@@ -797,6 +2415,7 @@ class BsiInstrument:
         ad_list = self._create_param_list_string('1', '0', card_select, False)
         res = self._query(cmd, ad_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('gnd', bank, card_select, gnd_bank_nr, res)
         return res
 
     def mio_get_gnd(self, bank, card_select=0):
@@ -827,6 +2446,203 @@ class BsiInstrument:
         res = self._parse_answer(res, 2, int, card_select)
         return res
 
+    # ************************************************************************
+    # CONFIGURATION STATE
+    # ************************************************************************
+
+    def _config_cards(self, setting, card_select):
+        """
+        helper function for configuration state, list of cards a setting applies to
+        :param setting: setting name (see BsiConfig.SETTINGS)
+        :param card_select: 1,2,..16 (single card) or 0 (all cards)
+        :return: list of card numbers ([0] for settings which are the same for all cards)
+        """
+        if setting == 'mio_setup':
+            return [0]
+        if card_select > 0:
+            return [card_select]
+        return list(range(1, (self.bsi_nr_cards or 16) + 1))
+
+    def _config_track(self, setting, index, card_select, value, success):
+        """
+        helper function for configuration state, stores a value sent to the instrument
+        :param setting: setting name (see BsiConfig.SETTINGS)
+        :param index: source number, bank, config set number or channel
+        :param card_select: 1,2,..16 (single card) or 0 (all cards)
+        :param value: value sent
+        :param success: answer of instrument (value is unknown if False)
+        :return: None
+        """
+        for card in self._config_cards(setting, card_select):
+            if success:
+                self.bsi_config_state[(setting, index, card)] = value
+            else:
+                self.bsi_config_state.pop((setting, index, card), None)
+            if setting == 'mio_active':
+                # remember configuration active on the card (used by mio_write_outputs)
+                config = self.bsi_config_state.get(('mio_setup', value, 0))
+                if success and config is not None:
+                    self.bsi_mio_configs[card] = (value, list(config))
+                else:
+                    self.bsi_mio_configs.pop(card, None)
+
+    def snapshot(self):
+        """
+        returns the configuration state known from the last sent settings
+        (settings not sent since open_bsi are unknown and not part of the snapshot)
+        :return: BsiConfig (per card entries)
+        """
+        return BsiConfig(self.bsi_config_state)
+
+    def diff(self, desired):
+        """
+        compares desired configuration with the last sent configuration
+        :param desired: BsiConfig
+        :return: dict {(setting, index, card): (current value or None, desired value)}
+        for all settings which have to be sent
+        """
+        changes = dict()
+        for (setting, index, card_select), value in desired.settings.items():
+            for card in self._config_cards(setting, card_select):
+                current = self.bsi_config_state.get((setting, index, card))
+                if current != value:
+                    changes[(setting, index, card)] = (current, value)
+        return changes
+
+    @staticmethod
+    def _create_param_list_per_card(values, default, create_hex=False):
+        """
+        creates parameter list for BSI with different values per card
+
+        :param values: dict {card number: value}
+        :param default: option_name for not selected/not existing cards
+        :param create_hex: True=convert to hex (for example 15->0F 1023->03FF...)
+        :return: string (for use as parameter list in bsi command)
+        """
+        str_list = [str(default)] * 16
+        for card, value in values.items():
+            if create_hex:
+                value = format(value, 'x')
+                if (len(value) % 2) == 1:
+                    value = '0' + value
+            str_list[card - 1] = str(value)
+        return ','.join(str_list)
+
+    def _config_commands(self, setting, index, values):
+        """
+        helper function for apply, builds commands to send a setting
+        :param setting: setting name (see BsiConfig.SETTINGS)
+        :param index: source number, bank, config set number or channel
+        :param values: dict {card number: value} (card number 0 for mio_setup)
+        :return: list of (command, params, cards) tuples
+        """
+        float_cmds = {'pwr_i_min': 'PWR_CFG_IMin', 'pwr_i_max': 'PWR_CFG_IMax',
+                      'pwr_v_min': 'PWR_CFG_VMin', 'pwr_v_max': 'PWR_CFG_VMax',
+                      'pwr_voltage': 'PWR_CFG_SetV', 'pwr_current': 'PWR_CFG_SetI',
+                      'level_out_low': 'DIG_CFG_SetLowLevelOutBank',
+                      'level_out_high': 'DIG_CFG_SetHighLevelOutBank',
+                      'level_in_low': 'DIG_CFG_SetLowLevelInBank',
+                      'level_in_high': 'DIG_CFG_SetHighLevelInBank'}
+        if setting in float_cmds:
+            return [(float_cmds[setting] + str(index), self._create_param_list_per_card(values, ''),
+                     list(values))]
+        if setting == 'i2c_master_address':
+            if index == 0:
+                cmd = 'SYS_I2CExt_CFG_SetMasterAdr'
+            else:
+                cmd = 'DIG_I2C' + str(index) + '_CFG_SetMasterAdr'
+            return [(cmd, self._create_param_list_per_card(values, '', True), list(values))]
+        if setting == 'mio_setup':
+            str_var = '1,0,0,0,0,0,0,' + self._create_param_list_per_card(
+                {ind + 1: elem for ind, elem in enumerate(values[0])}, '0', True)
+            return [('DIG_CFG_LoadMIOSetup' + str(index), str_var, [0])]
+        # value is part of command name, one command per value
+        commands = list()
+        for value in set(values.values()):
+            cards = [card for card in values if values[card] == value]
+            if setting == 'pwr_sense':
+                cmd = 'PWR_CFG_Sense_Force_' + ('On' if value else 'Off') + str(index)
+            elif setting == 'pwr_mode':
+                cmd = 'PWR_CFG_' + ('VoltageMode' if value == 'voltage' else 'CurrentMode') + str(index)
+            elif setting == 'gnd':
+                if value == 0:
+                    cmd = 'DIG_CFG_Bank' + str(index) + '_Agnd'
+                else:
+                    cmd = 'DIG_CFG_Bank' + str(index) + '_Gnds' + str(value)
+            else:  # mio_active
+                cmd = 'DIG_CFG_ActivateMIOSetup' + str(value)
+            commands.append((cmd, self._create_param_list_per_card({card: 1 for card in cards}, '0'),
+                             cards))
+        return commands
+
+    @staticmethod
+    def _config_blocked(setting, index, card, value, failed):
+        """
+        helper function for apply, checks if a setting depends on a setting which failed (see BsiConfig.STAGES)
+        :param setting: setting name
+        :param index: source number, bank, config set number or channel
+        :param card: card number
+        :param value: desired value
+        :param failed: set of (setting, index, card) not acknowledged
+        :return: True if the setting must not be sent
+        """
+        if setting == 'mio_active':
+            return ('mio_setup', value, 0) in failed
+        if setting.startswith('pwr_'):
+            return any(name.startswith('pwr_') and failed_index == index and failed_card in (card, 0)
+                       for name, failed_index, failed_card in failed)
+        return False
+
+    def apply(self, desired):
+        """
+        sends only the settings of desired configuration which differ from the last sent
+        configuration, the commands of a stage are sent as one pipelined batch (see BsiConfig.STAGES),
+        settings depending on a failed one are not sent (their state is unknown afterwards)
+        raises BsiProcessingError if the BSI answered with error (after all answers are tracked)
+        :param desired: BsiConfig
+        :return: True if all settings were acknowledged (also True if nothing had to be sent)
+        """
+        changes = self.diff(desired)
+        if len(changes) == 0:
+            return True
+        grouped = dict()
+        for (setting, index, card), (current, value) in changes.items():
+            grouped.setdefault((setting, index), dict())[card] = value
+        failed = set()
+        error = None
+        for stage in BsiConfig.STAGES:
+            commands = list()
+            for setting, index in sorted(grouped, key=lambda elem: BsiConfig.SETTINGS.index(elem[0])):
+                if setting not in stage:
+                    continue
+                values = dict()
+                for card, value in grouped[(setting, index)].items():
+                    if self._config_blocked(setting, index, card, value, failed):
+                        self._config_track(setting, index, card, value, False)
+                        failed.add((setting, index, card))
+                    else:
+                        values[card] = value
+                if len(values) > 0:
+                    for cmd, params, cards in self._config_commands(setting, index, values):
+                        commands.append((cmd, params, setting, index, cards))
+            if len(commands) == 0:
+                continue
+            answers = self._query_pipelined([(cmd, params) for cmd, params, _, _, _ in commands], False)
+            for answer, (cmd, params, setting, index, cards) in zip(answers, commands):
+                res = None
+                if answer.startswith("E"):
+                    error = error or answer
+                else:
+                    res = self._parse_answer(answer, 2, bool, 0)
+                for card in cards:
+                    ok = res is not None and res[max(card, 1) - 1] is True
+                    self._config_track(setting, index, card, grouped[(setting, index)][card], ok)
+                    if not ok:
+                        failed.add((setting, index, card))
+        if error is not None:
+            raise BsiProcessingError(error)
+        return len(failed) == 0
+
     # ************************************************************************
     # Digital I/O
     # ************************************************************************
@@ -843,39 +2659,91 @@ class BsiInstrument:
         res = self._parse_answer(res, 2, hex, card_select, 4)
         return res
 
-    def mio_set_output_high(self, mio_number, card_select):
+    def mio_set_output_high(self, mio_number, card_select, config_number=None):
         """
         set MIO pin HIGH (must pe configured as output)
         :param mio_number: MIO number 1...16 as int
         :param card_select: 1,2,..16 (single card)
+        :param config_number: (optional) config set number used if the active set of the card is unknown,
+        None = the active set must be known (else BsiProcessingError, see mio_write_outputs)
         :return: True if success
         """
-        conf = self.mio_get_config(card_select)
-        if (conf[mio_number - 1] & 0x40) == 0x40:
-            conf[mio_number - 1] |= 0x01
-            self.mio_load_config(card_select, conf)
-            self.mio_activate_config(card_select, card_select)
-        else:
-            print('Err: MIO' + str(mio_number) + ' is not Output')
-            return False
-        return True
+        mask = 1 << (mio_number - 1)
+        return self.mio_write_outputs(mask, mask, card_select, config_number)
 
-    def mio_set_output_low(self, mio_number, card_select):
+    def mio_set_output_low(self, mio_number, card_select, config_number=None):
         """
         set MIO pin LOW (must pe configured as output)
         :param mio_number: MIO number 1...16 as int
         :param card_select: 1,2,..16 (single card)
+        :param config_number: (optional) config set number used if the active set of the card is unknown,
+        None = the active set must be known (else BsiProcessingError, see mio_write_outputs)
         :return: True if success
         """
-        conf = self.mio_get_config(card_select)
-        if (conf[mio_number - 1] & 0x40) == 0x40:
-            conf[mio_number - 1] &= 0xFFFE
-            self.mio_load_config(card_select, conf)
-            self.mio_activate_config(card_select, card_select)
-        else:
-            print('Err: MIO' + str(mio_number) + ' is not Output')
-            return False
-        return True
+        return self.mio_write_outputs(1 << (mio_number - 1), 0, card_select, config_number)
+
+    def mio_write_outputs(self, mask, values, card_select, config_number=None):
+        """
+        sets several MIO output pins with one load and activate per MIO configuration set
+        the active configuration of a card is taken from cache (read from BSI if unknown,
+        the set number is unknown then and must be given), cards sharing a set get the same outputs
+        :param mask: MIO pins to set as int16 (bit0=MIO1 ... bit15=MIO16)
+        :param values: output levels as int16 (bit0=MIO1 ... bit15=MIO16), 1=HIGH 0=LOW
+        :param card_select: 1,2,..16 (single card) or 0 (all cards)
+        :param config_number: (optional) config set number 1...20 overwritten on cards with unknown active set,
+        None = such cards raise BsiProcessingError
+        :return: True if success
+        """
+        groups = dict()  # config set number -> (new config, cards)
+        for card in self._config_cards('mio_active', card_select):
+            if card not in self.bsi_mio_configs:
+                if config_number is None:
+                    raise BsiProcessingError('active MIO configuration set of card ' + str(card) + ' unknown'
+                                             ' (apply a mio_active configuration or give config_number)')
+                conf = self.mio_get_config(card)
+                if type(conf) is not list or len(conf) < 16:
+                    print('Err: no MIO configuration of card ' + str(card))
+                    return False
+                self.bsi_mio_configs[card] = (config_number, conf[:16])
+            set_number, conf = self.bsi_mio_configs[card]
+            conf = list(conf)
+            for ind in range(16):
+                if mask & (1 << ind):
+                    if (conf[ind] & 0x40) != 0x40:
+                        print('Err: MIO' + str(ind + 1) + ' is not Output')
+                        return False
+                    if values & (1 << ind):
+                        conf[ind] |= 0x01
+                    else:
+                        conf[ind] &= ~0x01
+            if conf != self.bsi_mio_configs[card][1]:
+                conf = tuple(conf)
+                if groups.setdefault(set_number, (conf, list()))[0] != conf:
+                    print('Err: cards sharing MIO configuration set ' + str(set_number) + ' need different outputs')
+                    return False
+                groups[set_number][1].append(card)
+        commands = list()
+        for set_number, (conf, cards) in groups.items():
+            str_var = '1,0,0,0,0,0,0,' + self._create_param_list_per_card(
+                {ind + 1: elem for ind, elem in enumerate(conf)}, '0', True)
+            commands.append(('DIG_CFG_LoadMIOSetup' + str(set_number), str_var))
+            commands.append(('DIG_CFG_ActivateMIOSetup' + str(set_number),
+                             self._create_param_list_per_card({card: 1 for card in cards}, '0')))
+        answers = self._query_pipelined(commands)
+        success = True
+        for ind, (set_number, (conf, cards)) in enumerate(groups.items()):
+            loaded = self._parse_answer(answers[2 * ind], 2, bool, 1)
+            activated = self._parse_answer(answers[2 * ind + 1], 2, bool, 0)
+            self._config_track('mio_setup', set_number, 0, conf, loaded)
+            for card in self._config_cards('mio_active', 0):
+                if card in cards:
+                    ok = loaded is True and activated is not None and activated[card - 1] is True
+                    self._config_track('mio_active', None, card, set_number, ok)
+                    success = success and ok
+                elif self.bsi_config_state.get(('mio_active', None, card)) == set_number:
+                    # set was changed, but is not activated again on this card
+                    self.bsi_config_state.pop(('mio_active', None, card))
+        return success
 
     def mio_get_input(self, mio_number, card_select):
         """
@@ -898,6 +2766,34 @@ class BsiInstrument:
                         res[ind] = 1
         return res
 
+    def mio_capture(self, duration, card_select=1, max_samples=100000, depth=None):
+        """
+        logic analyzer: reads MIO input states of all MIO pins as fast as possible
+        (requests are pipelined, each sample gets the time its answer was received)
+        :param duration: capture time in sec as float
+        :param card_select: 1,2,..16 (single card)
+        :param max_samples: max number of samples (capture stops if buffer is full)
+        :param depth: (optional) number of requests in flight, default bsi_pipeline_depth
+        :return: BsiMioCapture
+        """
+        timestamps = np.zeros(max_samples)
+        states = np.zeros(max_samples, dtype=np.uint16)
+        ad_list = self._create_param_list_string('1', '0', card_select, False)
+        start = time.monotonic()
+        nr_samples = 0
+
+        def handle(timestamp, answer):
+            nonlocal nr_samples
+            # answer: status, counter, state card1, state card2 ...
+            state = answer.split(',', card_select + 2)[card_select + 1]
+            if state.strip() != '':
+                timestamps[nr_samples] = timestamp - start
+                states[nr_samples] = int(state, 16)
+                nr_samples += 1
+
+        self._query_stream('DIG_GetMIOState', ad_list, handle, duration, max_samples, depth)
+        return BsiMioCapture(timestamps[:nr_samples], states[:nr_samples])
+
     def mio_set_high_z(self, on=True, card_select=0):
         """
         set all MIOs to High-Z state or return to usual operation, if on = False
@@ -984,6 +2880,7 @@ class BsiInstrument:
         cmd = 'PWR_CFG_SetV' + str(source_number)
         res = self._query(cmd, FL)
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self._config_track('pwr_voltage', source_number, card_select, float(voltage), res)
         return res
 
     def pwr_get_supply_voltage_force(self, source_number, card_select):
@@ -1032,6 +2929,7 @@ class BsiInstrument:
         cmd = 'PWR_CFG_VoltageMode' + str(source_number)
         res = self._query(cmd, AL)
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self._config_track('pwr_mode', source_number, card_select, 'voltage', res)
         return res
 
     def pwr_set_supply_onoff(self, source_number, onoff, card_select):
@@ -1071,6 +2969,7 @@ class BsiInstrument:
         cmd = 'PWR_CFG_IMax' + str(source_number)
         res = self._query(cmd, FL)
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self._config_track('pwr_i_max', source_number, card_select, float(current_mA), res)
         return res
 
     def pwr_set_supply_current_limit_min(self, source_number, current_mA, card_select):
@@ -1089,6 +2988,7 @@ class BsiInstrument:
         cmd = 'PWR_CFG_IMin' + str(source_number)
         res = self._query(cmd, FL)
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self._config_track('pwr_i_min', source_number, card_select, float(current_mA), res)
         return res
 
     def pwr_config_voltage_source(self, source_number, card_select, voltage, i_min, i_max, use_sense):
@@ -1117,12 +3017,14 @@ class BsiInstrument:
         cmd += str(source_number)
         res = self._query(cmd, ad_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_sense', source_number, card_select, bool(use_sense), res)
         if not res:
             return False
         # set voltage mode
         cmd = 'PWR_CFG_VoltageMode' + str(source_number)
         res = self._query(cmd, ad_list)
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self._config_track('pwr_mode', source_number, card_select, 'voltage', res)
         if not res:
             return False
         # set I min in mA
@@ -1130,6 +3032,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(i_min), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_i_min', source_number, card_select, float(i_min), res)
         if not res:
             return False
         # set I max in mA
@@ -1137,6 +3040,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(i_max), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_i_max', source_number, card_select, float(i_max), res)
         if not res:
             return False
         # set voltage
@@ -1144,6 +3048,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(voltage), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_voltage', source_number, card_select, float(voltage), res)
         if not res:
             return False
         return res
@@ -1174,12 +3079,14 @@ class BsiInstrument:
         cmd += str(source_number)
         res = self._query(cmd, ad_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_sense', source_number, card_select, bool(use_sense), res)
         if not res:
             return False
         # set voltage mode
         cmd = 'PWR_CFG_CurrentMode' + str(source_number)
         res = self._query(cmd, ad_list)
         res = self._parse_answer(res, 2, 'andbool', 1)
+        self._config_track('pwr_mode', source_number, card_select, 'current', res)
         if not res:
             return False
         # set V min in Volt
@@ -1187,6 +3094,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(v_min), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_v_min', source_number, card_select, float(v_min), res)
         if not res:
             return False
         # set V max in Volt
@@ -1194,6 +3102,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(v_max), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_v_max', source_number, card_select, float(v_max), res)
         if not res:
             return False
         # set current
@@ -1201,6 +3110,7 @@ class BsiInstrument:
         f_list = self._create_param_list_string(str(current), '', card_select, False)
         res = self._query(cmd, f_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('pwr_current', source_number, card_select, float(current), res)
         if not res:
             return False
         return res
@@ -1241,6 +3151,114 @@ class BsiInstrument:
         res = self._parse_answer(res, 2, float, card_select)
         return res
 
+    def pwr_capture_inrush(self, source_number, window, card_select=1, max_samples=10000, depth=None,
+                           settle_band=0.05, relay_settle_ms=10):
+        """
+        closes power relais, waits until its contacts settled, switches supply on and measures source current
+        as fast as possible (requests are pipelined and sent directly behind the switch on command),
+        the power relais is opened again if closing it or switching on failed
+
+        :param source_number: 1...4 as int
+        :param window: capture time in sec after switching on as float
+        :param card_select: 1,2,..16 (single card)
+        :param max_samples: max number of samples (capture stops if buffer is full)
+        :param depth: (optional) number of requests in flight, default bsi_pipeline_depth
+        :param settle_band: relative band around steady state current for settling time (0.05 = +-5%)
+        :param relay_settle_ms: (optional) wait time in ms after closing the power relais
+        :return: BsiInrushCapture, timestamps since the answer of the switch on command
+        (None if closing relais or switch on failed)
+        """
+        timestamps = np.zeros(max_samples)
+        currents = np.zeros(max_samples)
+        ad_list = self._create_param_list_string('1', '0', card_select, False)
+        nr_samples = 0
+        start = None
+
+        def switched_on(timestamp, answer):
+            nonlocal start
+            start = timestamp
+
+        def handle(timestamp, answer):
+            nonlocal nr_samples
+            # answer: status, counter, current card1, current card2 ...
+            current = answer.split(',', card_select + 2)[card_select + 1]
+            if current.strip() != '':
+                timestamps[nr_samples] = timestamp - start
+                currents[nr_samples] = float(current)
+                nr_samples += 1
+
+        try:
+            closed = self.pwr_sequence([(source_number, 'close', relay_settle_ms)], card_select)
+        except BsiProcessingError as ex:
+            print(str(ex))
+            closed = False
+        if not closed:
+            print('Err: closing power relais failed')
+            self.pwr_sequence([(source_number, 'open', 0)], card_select)
+            return None
+        nr_handled, prefix_answers = self._query_stream('MEAS_I_' + str(source_number), ad_list, handle, window,
+                                                        max_samples, depth,
+                                                        [('PWR_On' + str(source_number), ad_list)], switched_on)
+        ok = [not answer.startswith('E') and self._parse_answer(answer, 2, 'andbool', card_select) is True
+              for answer in prefix_answers]
+        if ok != [True]:
+            print('Err: switch on failed ' + str(prefix_answers))
+            # do not leave supply on (f.e. on some cards) or the relais closed, open it also if switch off fails
+            for step in ((source_number, 'off', relay_settle_ms), (source_number, 'open', 0)):
+                try:
+                    self.pwr_sequence([step], card_select)
+                except BsiProcessingError as ex:
+                    print(str(ex))
+            return None
+        return BsiInrushCapture(timestamps[:nr_samples], currents[:nr_samples], settle_band)
+
+    def pwr_sweep_voltage(self, source_number, values, settle_ms=0, cards=None):
+        """
+        sweeps supply voltage and measures source current at each point (IV curve)
+        set and measure commands are pipelined, with settle_ms > 0 the current is measured settle_ms
+        after the answer of the set command (the next voltage is set with the measurement)
+
+        :param source_number: 1...4 as int (must be configured in voltage mode)
+        :param values: list of voltages as float
+        :param settle_ms: wait time in ms between setting voltage and measuring current
+        :param cards: list of card numbers 1,2,..16 (columns of result),
+        None = all existing cards (default)
+        :return: voltages as numpy array, currents in mA as numpy array
+        (rows=voltages, columns=cards, NaN if not measured)
+        """
+        if cards is None:
+            cards = list(range(1, self.bsi_nr_cards + 1))
+        voltages = np.array(values, dtype=float)
+        currents = np.full((len(voltages), len(cards)), np.nan)
+        ad_list = self._create_param_list_per_card({card: 1 for card in cards}, '0')
+        commands = list()
+        for voltage in voltages:
+            commands.append(('PWR_CFG_SetV' + str(source_number),
+                             self._create_param_list_per_card({card: voltage for card in cards}, '')))
+            commands.append(('MEAS_I_' + str(source_number), ad_list))
+        if settle_ms <= 0:
+            answers = self._query_pipelined(commands)
+        else:
+            answers = self._call(self._sweep_settled, commands, settle_ms)
+            for data in answers:
+                if data.startswith("E"):
+                    raise BsiProcessingError(data)
+        for ind in range(len(answers) // 2):
+            set_ok = self._parse_answer(answers[2 * ind], 2, bool, 0)
+            res = self._parse_answer(answers[2 * ind + 1], 2, float, 0)
+            if set_ok is None or res is None or len(res) < 16:
+                break
+            currents[ind] = [res[card - 1] if set_ok[card - 1] is True and res[card - 1] != '' else np.nan
+                             for card in cards]
+        if len(answers) > 0:
+            # last set voltage is the one which stays active (unknown after a connection error)
+            last = (len(answers) - 1) // 2
+            set_ok = self._parse_answer(answers[2 * last], 2, bool, 0)
+            for card in cards:
+                self._config_track('pwr_voltage', source_number, card, float(voltages[last]),
+                                   len(answers) == len(commands) and set_ok is not None and set_ok[card - 1] is True)
+        return voltages, currents
+
     def pwr_set_onoff(self, source_number, card_select, onoff):
         """
         switches supply on or off
@@ -1269,6 +3287,34 @@ class BsiInstrument:
             self.pwr_set_openrelais(source_number, card_select)
         return res
 
+    def pwr_sequence(self, steps, card_select=0):
+        """
+        executes a power sequence, steps without delay in between are sent as one
+        pipelined batch, answers of all cards are checked
+        example: [(3, 'close', 0), (3, 'on', 10), (4, 'close', 0), (4, 'on', 0)]
+
+        :param steps: list of (source_number 1...4, action, delay in ms after the step) tuples,
+        action: 'on' (PWR_On), 'off' (PWR_Off), 'close' (close relais), 'open' (open relais)
+        :param card_select: 1,2,..16 (single card) or 0 (all cards)
+        :return: True if all steps are successful on all selected cards
+        """
+        action_cmds = {'on': 'PWR_On', 'off': 'PWR_Off', 'close': 'PWR_CFG_RelClose', 'open': 'PWR_CFG_RelOpen'}
+        ad_list = self._create_param_list_string('1', '0', card_select, False)
+        success = True
+        batch = list()
+        for ind, (source_number, action, delay_ms) in enumerate(steps):
+            if action not in action_cmds:
+                raise ValueError('unknown power action ' + str(action))
+            batch.append((action_cmds[action] + str(source_number), ad_list))
+            if delay_ms > 0 or ind == len(steps) - 1:
+                answers = self._query_pipelined(batch)
+                for answer in answers:
+                    success = success and self._parse_answer(answer, 2, 'andbool', card_select) is True
+                batch = list()
+                if delay_ms > 0:
+                    time.sleep(delay_ms / 1000.0)
+        return success
+
     # ************************************************************************
     # SPI Interface 1...4
     # ************************************************************************
@@ -1404,6 +3450,7 @@ class BsiInstrument:
             cmd = 'DIG_I2C' + str(channel_select) + '_CFG_SetMasterAdr'
         res = self._query(cmd, hex_list)
         res = self._parse_answer(res, 2, 'andbool', card_select)
+        self._config_track('i2c_master_address', channel_select, card_select, i2c_address, res)
         return res
 
     def i2c_get_master_address(self, card_select=0, channel_select=0):
@@ -1505,9 +3552,13 @@ class BsiInstrument:
         """
         helper function create 4 digit hex string from list of bytes
 
-        :param data_byte_list: list of byte data
+        :param data_byte_list: list of byte data, bytes, bytearray or memoryview
         :return: hex string
         """
+        try:
+            return bytes(data_byte_list).hex()
+        except (TypeError, ValueError):
+            pass  # characters or values > 255
         str_var = ''
         for elem in data_byte_list:
             if type(elem) == str:
@@ -1520,7 +3571,7 @@ class BsiInstrument:
         writes a raw frame to SYS_I2C to all cards (card_select=0) or single card (card_select=1..n)
 
         :param i2c_address: i2c_address 1...127 as int
-        :param data_list: list of bytes to write
+        :param data_list: list of bytes to write (or bytes, bytearray, memoryview)
         :param card_select: 1,2,..16 (single card) or 0 (all cards)
          :param channel_select: 0=I2C_SYS, 1..4=I2C on MIO
         :return: True if success (Acknowleged by I2C device) list of bool if card_select=0
@@ -1541,65 +3592,157 @@ class BsiInstrument:
             res = self._parse_answer(res, 2, 'andbool', card_select)
         return res
 
-    def i2c_read_frame(self, i2c_address, read_framelen, card_select=0, channel_select=0):
+    def i2c_read_frame(self, i2c_address, read_framelen, card_select=0, channel_select=0, as_buffer=False,
+                       chunk_size=None):
         """
         reads raw frame SYS_I2C from all cards (card_select=0) or single card (card_select=1..n)
+        frames larger than chunk_size are read in chunks (see _i2c_read_chunks)
 
         :param i2c_address: i2c_address 1...127 as int
         :param read_framelen: nr of bytes to read as int
         :param card_select: 1,2,..16 (single card) or 0 (all cards)
         :param channel_select: 0=I2C_SYS, 1..4=I2C on MIO
+        :param as_buffer: (optional) True = return bytearray (decoded without intermediate list)
+        :param chunk_size: (optional) max bytes per I2C read, default bsi_i2c_chunk_size (0 = one read)
         :return: list of read bytes (list of list if card_select=0), '' if no ACK
+        (bytearray / list of bytearray if as_buffer)
         """
         success = True
         success &= self.i2c_set_master_address(i2c_address, card_select, channel_select)
-        success &= self.i2c_set_read_framelen(read_framelen, card_select, channel_select)
         # create address list
         ad_list = self._create_param_list_string(1, 0, card_select, False)
         if channel_select == 0:
             cmd = 'SYS_I2CExt_Read'
         else:
             cmd = 'DIG_I2C' + str(channel_select) + '_Read'
-        timeout = self.bsi_socket.gettimeout()
-        if read_framelen > 4096:
-            self.bsi_socket.settimeout(30)
-        res = self._query(cmd, ad_list)
-        res = self._parse_answer(res, 2, hex, card_select)
-        if read_framelen > 4096:
-            self.bsi_socket.settimeout(timeout)
+        if chunk_size is None:
+            chunk_size = self.bsi_i2c_chunk_size
+        if 0 < chunk_size < read_framelen:
+            return self._i2c_read_chunks((cmd, ad_list), cmd, ad_list, read_framelen, chunk_size, card_select,
+                                         channel_select, as_buffer)
+        success &= self.i2c_set_read_framelen(read_framelen, card_select, channel_select)
+        with self._transfer_timeout(read_framelen):
+            start = time.perf_counter()
+            res = self._query(cmd, ad_list)
+            self._update_throughput(read_framelen, time.perf_counter() - start)
+        res = self._parse_answer(res, 2, bytearray if as_buffer else hex, card_select)
         return res
 
-    def i2c_write_read_frame(self, i2cadr, write_data_list, read_framelen, card_select=0, channel_select=0):
+    def i2c_write_read_frame(self, i2cadr, write_data_list, read_framelen, card_select=0, channel_select=0,
+                             as_buffer=False, chunk_size=None):
         """
         sends a raw frame and reads raw frame SYS_I2C (f.e memory: write address, read data)
+        frames larger than chunk_size are read in chunks, the frame is sent with the first chunk
+        (see _i2c_read_chunks)
 
         :param i2cadr: i2c_address 1...127 as int
-        :param write_data_list: list of bytes to send
+        :param write_data_list: list of bytes to send (or bytes, bytearray, memoryview)
         :param read_framelen: nr of bytes to read as int
         :param card_select: 1,2,..16 (single card) or 0 (all cards)
         :param channel_select: 0=I2C_SYS, 1..4=I2C on MIO
+        :param as_buffer: (optional) True = return bytearray (decoded without intermediate list)
+        :param chunk_size: (optional) max bytes per I2C read, default bsi_i2c_chunk_size (0 = one read)
         :return: list read bytes (list of list if card_select=0), '' if no ACK
+        (bytearray / list of bytearray if as_buffer)
         """
         success = True
         hex_str = self._list_to_hex_string(write_data_list)
         success &= self.i2c_set_master_address(i2cadr, card_select, channel_select)
-        success &= self.i2c_set_read_framelen(read_framelen, card_select, channel_select)
         success &= self.i2c_set_write_framelen(len(write_data_list), card_select, channel_select)
         # create hex list
         hex_list = self._create_param_list_string(hex_str, '', card_select, False)
         if channel_select == 0:
-            cmd = 'SYS_I2CExt_WriteRead'
+            cmd = 'SYS_I2CExt_'
         else:
-            cmd = 'DIG_I2C' + str(channel_select) + '_WriteRead'
-        timeout = self.bsi_socket.gettimeout()
-        if read_framelen > 4096:
-            self.bsi_socket.settimeout(30)
-        res = self._query(cmd, hex_list)
-        res = self._parse_answer(res, 2, hex, card_select)
-        if read_framelen > 4096:
-            self.bsi_socket.settimeout(timeout)
+            cmd = 'DIG_I2C' + str(channel_select) + '_'
+        if chunk_size is None:
+            chunk_size = self.bsi_i2c_chunk_size
+        if 0 < chunk_size < read_framelen:
+            ad_list = self._create_param_list_string(1, 0, card_select, False)
+            return self._i2c_read_chunks((cmd + 'WriteRead', hex_list), cmd + 'Read', ad_list, read_framelen,
+                                         chunk_size, card_select, channel_select, as_buffer)
+        success &= self.i2c_set_read_framelen(read_framelen, card_select, channel_select)
+        with self._transfer_timeout(read_framelen):
+            start = time.perf_counter()
+            res = self._query(cmd + 'WriteRead', hex_list)
+            self._update_throughput(read_framelen, time.perf_counter() - start)
+        res = self._parse_answer(res, 2, bytearray if as_buffer else hex, card_select)
+        return res
+
+    def _i2c_read_chunks(self, first_command, cmd, ad_list, read_framelen, chunk_size, card_select,
+                         channel_select, as_buffer):
+        """
+        reads a large frame in chunks and reassembles them to one frame, bsi_i2c_chunks_in_flight chunks
+        are sent pipelined, queries of other threads are sent in between (see _query_sequence),
+        so they are not stalled by the whole transfer
+        !!! each chunk is an I2C read of its own, the device has to continue with the following bytes
+        (f.e. memory with address auto increment, FIFO), do not use the channel in other threads meanwhile !!!
+
+        :param first_command: (command, params) reading the first chunk (f.e. WriteRead with memory address)
+        :param cmd: read command of the following chunks
+        :param ad_list: parameter list of cmd
+        :param read_framelen: nr of bytes to read as int
+        :param chunk_size: max bytes per chunk
+        :param card_select: 1,2,..16 (single card) or 0 (all cards)
+        :param channel_select: 0=I2C_SYS, 1..4=I2C on MIO
+        :param as_buffer: True = return bytearray
+        :return: list of read bytes (list of list if card_select=0), '' if no ACK
+        (bytearray / list of bytearray if as_buffer)
+        """
+        if channel_select == 0:
+            framelen_cmd = 'SYS_I2CExt_CFG_SetReadFrameLength'
+        else:
+            framelen_cmd = 'DIG_I2C' + str(channel_select) + '_CFG_SetReadFrameLength'
+        commands = list()
+        reads = list()  # index of the read commands
+        framelen = None
+        for pos in range(0, read_framelen, chunk_size):
+            length = min(chunk_size, read_framelen - pos)
+            if length != framelen:
+                commands.append((framelen_cmd, self._create_param_list_string(length, '', card_select, True)))
+                framelen = length
+            reads.append(len(commands))
+            commands.append(first_command if pos == 0 else (cmd, ad_list))
+        start = time.perf_counter()
+        with self._transfer_timeout(chunk_size):
+            answers = self._call(self._query_sequence, commands, self.bsi_i2c_chunks_in_flight,
+                                 priority=BsiPriority.Bulk)
+        duration = time.perf_counter() - start
+        if self._profiling():
+            self._profile_add([(command, params, len(data)) for (command, params), data in zip(commands, answers)],
+                              1, duration)
+        for data in answers:
+            if data.startswith("E"):
+                raise BsiProcessingError(data)
+        # reassemble
+        chunks = [self._parse_answer(answers[ind], 2, bytearray, card_select) for ind in reads]
+        if card_select > 0:
+            chunks = [[chunk] for chunk in chunks]
+        res = list()
+        for card_chunks in zip(*chunks):
+            if '' in card_chunks:
+                res.append('')
+            elif as_buffer:
+                res.append(bytearray().join(card_chunks))
+            else:
+                res.append(list(bytearray().join(card_chunks)))
+        self._update_throughput(read_framelen, duration)
+        if card_select > 0:
+            return res[0]
         return res
 
+    def _update_throughput(self, nr_bytes, duration):
+        """
+        updates measured I2C read throughput (bsi_i2c_throughput, used for the timeouts of large transfers)
+        after a read of at least bsi_i2c_throughput_min_bytes
+        :param nr_bytes: number of bytes read
+        :param duration: time of the read in sec
+        :return: None
+        """
+        if nr_bytes >= self.bsi_i2c_throughput_min_bytes and duration > 0:
+            # exponential moving average, a single slow or fast transfer changes the timeouts only a little
+            self.bsi_i2c_throughput += self.bsi_i2c_throughput_weight * (nr_bytes / duration - self.bsi_i2c_throughput)
+
     def i2c_address_search(self, card_select, start_address=1, end_address=127, data=[0], channel_select=0):
         """
         reads raw frame SYS_I2C from all cards (card_select=0) or single card (card_select=1..n)
@@ -1684,6 +3827,81 @@ class BsiInstrument:
         self.set_timeout(old_timeout)
         return return_list  # li[0]=Offset values li[1]=Ref values
 
+    def bsi_calibrate(self, force=False, max_age=8 * 3600.0, temperature=None, max_temperature_delta=5.0,
+                      timeout=20.0):
+        """
+        runs self calibration only if the cached calibration of the cards is stale
+        the results are cached in bsi_calibration_cache_file keyed by card serial number,
+        a calibration is stale if it is older than max_age or was done at a temperature differing
+        more than max_temperature_delta, the BSI is calibrated at least once after each open_bsi / reconnect
+        (a power cycled BSI has the same serial numbers, but lost its calibration)
+
+        :param force: True = calibrate even if cache is valid
+        :param max_age: max age of calibration in sec (default 8h)
+        :param temperature: (optional) current temperature in degC, None = no temperature policy
+        :param max_temperature_delta: max temperature difference in K to cached calibration
+        :param timeout: (optional) timeout in sec before answer is expected (default 20sec)
+        :return: list of list float li[0]=list Offset values
+         li[1]= list Ref values for each card (see bsi_start_self_calibration)
+        """
+        cache = dict()
+        try:
+            with open(self.bsi_calibration_cache_file, 'r') as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            pass  # no or broken cache, calibrate
+        if not isinstance(cache, dict):
+            cache = dict()
+        serials = self.bsi_card_serials
+        now = time.time()
+        valid = not force and self.bsi_calibrated and len(serials) > 0
+        for serial in serials:
+            entry = self._calibration_entry(cache, serial)
+            if not valid or entry is None:
+                valid = False
+                break
+            if now - entry['time'] > max_age:
+                valid = False
+            if temperature is not None:
+                if entry['temperature'] is None \
+                        or abs(temperature - entry['temperature']) > max_temperature_delta:
+                    valid = False
+        if valid:
+            empty = [''] * (16 - len(serials))  # same list len as answer of BSI
+            return [[cache[serial]['offset'] for serial in serials] + empty,
+                    [cache[serial]['ref'] for serial in serials] + empty]
+        res = self.bsi_start_self_calibration(timeout)
+        self.bsi_calibrated = None not in res
+        if len(serials) > 0 and None not in res:
+            for ind, serial in enumerate(serials):
+                cache[serial] = {'time': now, 'temperature': temperature,
+                                 'offset': res[0][ind], 'ref': res[1][ind]}
+            try:
+                with open(self.bsi_calibration_cache_file, 'w') as file:
+                    json.dump(cache, file, indent=1)
+            except OSError as ex:
+                print(str(ex))
+        return res
+
+    @staticmethod
+    def _calibration_entry(cache, serial):
+        """
+        helper function for bsi_calibrate, returns the cached calibration of a card
+        :param cache: dict serial -> entry (content of bsi_calibration_cache_file)
+        :param serial: card serial number as string
+        :return: dict with time, temperature, offset and ref, None if missing or malformed (= stale)
+        """
+        entry = cache.get(serial)
+        if not isinstance(entry, dict):
+            return None
+        numbers = (int, float)
+        for key in ('time', 'offset', 'ref'):
+            if not isinstance(entry.get(key), numbers):
+                return None
+        if entry.get('temperature') is not None and not isinstance(entry['temperature'], numbers):
+            return None
+        return entry
+
     def bsi_set_calibration_params(self, first_wait_ms, wait_ms, nr_samples):
         """
         sets parameters for calibration
@@ -1714,6 +3932,434 @@ class BsiInstrument:
 # end of class BSI_Instrument
 
 
+class BsiManagedFuture(Future):
+    """
+    future of a command sent by BsiInstrumentManager, waiting for the result inside a callback
+    of an other managed future resolves the pending completions meanwhile (instead of a deadlock)
+    """
+
+    def __init__(self, manager):
+        """
+        constructor
+        :param manager: BsiInstrumentManager
+        """
+        super().__init__()
+        self.manager = manager
+
+    def result(self, timeout=None):
+        self.manager._resolve_until_done(self, timeout)
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        self.manager._resolve_until_done(self, timeout)
+        return super().exception(timeout)
+
+
+class BsiManagedConnection:
+    """
+    state of one instrument connection driven by BsiInstrumentManager
+    """
+
+    def __init__(self, instrument, bsi_socket):
+        """
+        constructor
+        :param instrument: BsiInstrument
+        :param bsi_socket: non blocking socket (connecting)
+        """
+        self.instrument = instrument
+        self.socket = bsi_socket
+        self.connecting = True
+        self.closed = False
+        self.queued = deque()  # (command, params, future) submitted, not sent yet
+        self.pending = deque()  # per command sent: [counter as bytes, mnemonic, future, send time]
+        self.tx_buffer = bytearray()  # frames not sent yet
+        self.rx_buffer = bytearray()  # received bytes not yet returned as answer
+        self.events = selectors.EVENT_WRITE  # registered selector events
+
+
+class BsiInstrumentManager:
+    """
+    drives the connections to many BSI instruments in one thread (selectors based event loop)
+    instead of one I/O worker thread per instrument, f.e. for a controller of many racks\n
+    rack1 = manager.add('192.168.1.33')\n
+    future = manager.submit(rack1, 'MEAS_V_MIO01_Low1_Sense', '')\n
+    print(rack1.get_id(), future.result())\n
+    commands of one instrument are sent pipelined (up to bsi_pipeline_depth in flight),
+    methods of a managed BsiInstrument using single queries (_query) are sent through the manager,
+    methods sending pipelined blocks, streams or changing the socket raise BsiProcessingError
+    futures are resolved in a separate thread, so their callbacks may wait for other managed commands
+    after a connection error the instrument is not reconnected (remove it and add it again)
+    """
+
+    def __init__(self, timeout=5.0, pipeline_depth=32):
+        """
+        constructor, starts event loop thread
+        :param timeout: (optional) max time in sec waiting for an answer (or the connection)
+        :param pipeline_depth: (optional) max number of commands in flight per instrument
+        """
+        self.timeout = timeout
+        self.pipeline_depth = pipeline_depth
+        self.connections = dict()  # BsiInstrument -> BsiManagedConnection
+        # protects connections and their queues (reentrant: future callbacks may submit)
+        self.lock = threading.RLock()
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_receiver, self.wakeup_sender = socket.socketpair()  # wakes up event loop
+        self.wakeup_receiver.setblocking(False)
+        self.wakeup_sender.setblocking(False)
+        self.selector.register(self.wakeup_receiver, selectors.EVENT_READ, None)
+        self.completions = queue.SimpleQueue()  # (future, answer, exception) to resolve, None = stop
+        self.running = True
+        self.thread = threading.Thread(target=self._event_loop, name='BsiManager', daemon=True)
+        self.thread.start()
+        self.completion_thread = threading.Thread(target=self._completion_loop, name='BsiManagerCallbacks',
+                                                  daemon=True)
+        self.completion_thread.start()
+
+    def add(self, address, port=17501):
+        """
+        connects to an instrument (without waiting), id and card serialnumbers are read first
+        :param address: IP address as string f.e. '192.168.1.3'
+        :param port: (optional) port number as int
+        :return: BsiInstrument (only single queries, see class description)
+        """
+        instrument = BsiInstrument()
+        instrument.last_address = address
+        instrument.last_port = port
+        instrument.bsi_manager = self
+        bsi_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
+        bsi_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        bsi_socket.setblocking(False)
+        connection = BsiManagedConnection(instrument, bsi_socket)
+        with self.lock:
+            self.connections[instrument] = connection
+            error = bsi_socket.connect_ex((address, port))
+            if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                self._close(connection, BsiConnectionError('connect ' + address + ': ' + os.strerror(error)))
+                return instrument
+            self.selector.register(bsi_socket, connection.events, connection)
+            connection.pending.append([None, 'connect', None, time.monotonic()])  # timeout of connect
+        self.submit(instrument, 'SYS_IDN').add_done_callback(
+            lambda future: self._set_id(instrument, future))
+        self.submit(instrument, 'SYS_GetBSISnr').add_done_callback(
+            lambda future: self._set_card_serials(instrument, future))
+        return instrument
+
+    def remove(self, instrument):
+        """
+        closes connection of instrument, commands not answered yet fail with BsiConnectionError
+        :param instrument: BsiInstrument (see add)
+        :return: None
+        """
+        with self.lock:
+            connection = self.connections.pop(instrument, None)
+            if connection is not None:
+                self._close(connection, BsiConnectionError('connection closed'))
+        instrument.bsi_manager = None
+
+    def instruments(self):
+        """
+        returns all instruments added
+        :return: list of BsiInstrument
+        """
+        with self.lock:
+            return list(self.connections)
+
+    def submit(self, instrument, command, params=''):
+        """
+        queues command for instrument and returns without waiting for the answer, can be called from any thread
+        :param instrument: BsiInstrument (see add)
+        :param command: command as string f. e. 'SYS_IDN'
+        :param params: (optional) as  string ( seperated by ',' if necessary)
+        :return: BsiManagedFuture (concurrent.futures.Future), result is the complete answer as string
+        (BsiProcessingError if the BSI answers with error, BsiConnectionError if the connection failed)
+        """
+        future = BsiManagedFuture(self)
+        with self.lock:
+            connection = self.connections.get(instrument)
+            connected = connection is not None and not connection.closed
+            if connected:
+                connection.queued.append((command, params, future))
+        if not connected:
+            future.set_exception(BsiConnectionError('instrument not connected ' + instrument.last_address))
+            return future
+        self._wakeup()
+        return future
+
+    def submit_all(self, command, params=''):
+        """
+        queues command for all instruments (see submit)
+        :param command: command as string
+        :param params: (optional) as  string
+        :return: dict BsiInstrument -> concurrent.futures.Future
+        """
+        return {instrument: self.submit(instrument, command, params) for instrument in self.instruments()}
+
+    def close(self):
+        """
+        closes all connections and stops the event loop thread
+        :return: None
+        """
+        for instrument in self.instruments():
+            self.remove(instrument)
+        self.running = False
+        self._wakeup()
+        self.completions.put(None)
+        for thread in (self.thread, self.completion_thread):
+            if thread is not threading.current_thread():  # close may be called by a future callback
+                thread.join()
+        self.selector.close()
+        self.wakeup_receiver.close()
+        self.wakeup_sender.close()
+
+    def _wakeup(self):
+        """
+        wakes up the event loop thread (f.e. to send queued commands)
+        :return: None
+        """
+        try:
+            self.wakeup_sender.send(b'\0')
+        except BlockingIOError:
+            pass  # wake up pending anyway
+
+    def _complete(self, future, answer=None, ex=None):
+        """
+        queues future to be resolved in the completion thread, never resolved with lock held
+        (callbacks of the future may submit and wait for other commands)
+        :param future: concurrent.futures.Future
+        :param answer: answer as string (if ex is None)
+        :param ex: (optional) exception of the future
+        :return: None
+        """
+        self.completions.put((future, answer, ex))
+
+    def _completion_loop(self):
+        """
+        completion thread: resolves the futures in order of the answers
+        :return: None
+        """
+        while True:
+            completion = self.completions.get()
+            if completion is None:
+                return
+            self._resolve(*completion)
+
+    @staticmethod
+    def _resolve(future, answer, ex):
+        """
+        sets result or exception of future (runs its callbacks)
+        """
+        if ex is None:
+            future.set_result(answer)
+        else:
+            future.set_exception(ex)
+
+    def _resolve_until_done(self, future, timeout):
+        """
+        called in the completion thread (by a callback waiting for an other future):
+        resolves completions until future is done, else nothing to do
+        :param future: BsiManagedFuture
+        :param timeout: max time in sec, None = no limit
+        :return: None
+        """
+        if threading.current_thread() is not self.completion_thread:
+            return
+        end = None if timeout is None else time.monotonic() + timeout
+        while not future.done():
+            try:
+                completion = self.completions.get(timeout=None if end is None else max(0.0, end - time.monotonic()))
+            except queue.Empty:
+                return
+            if completion is None:
+                self.completions.put(None)  # stop after callback returned
+                return
+            self._resolve(*completion)
+
+    @staticmethod
+    def _set_id(instrument, future):
+        if future.exception() is None:
+            instrument.bsi_id = instrument._parse_answer(future.result(), 2)
+
+    @staticmethod
+    def _set_card_serials(instrument, future):
+        if future.exception() is None:
+            res = [x for x in instrument._parse_answer(future.result(), 2) if x]  # remove empty list entries
+            instrument.bsi_card_serials = [str(int(serial, 16)) for serial in res]
+            instrument.bsi_nr_cards = len(res)
+            instrument.connected = True
+
+    def _event_loop(self):
+        """
+        event loop thread: sends queued commands, reads answers, checks timeouts
+        :return: None
+        """
+        while self.running:
+            for key, mask in self.selector.select(self._select_timeout()):
+                if key.data is None:
+                    try:
+                        self.wakeup_receiver.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                with self.lock:
+                    connection = key.data
+                    if connection.closed:
+                        continue
+                    try:
+                        if mask & selectors.EVENT_WRITE:
+                            self._write(connection)
+                        if mask & selectors.EVENT_READ:
+                            self._read(connection)
+                    except (OSError, BsiConnectionError) as ex:
+                        self._close(connection, BsiConnectionError(str(ex)))
+            with self.lock:
+                now = time.monotonic()
+                for connection in self.connections.values():
+                    if connection.closed:
+                        continue
+                    if len(connection.pending) > 0 and now - connection.pending[0][3] > self.timeout:
+                        self._close(connection, BsiConnectionError('timeout ' + connection.instrument.last_address))
+                        continue
+                    try:
+                        self._send_queued(connection)
+                    except OSError as ex:
+                        self._close(connection, BsiConnectionError(str(ex)))
+
+    def _select_timeout(self):
+        """
+        returns time until the next answer timeout
+        :return: time in sec, None if nothing is pending
+        """
+        with self.lock:
+            oldest = [connection.pending[0][3] for connection in self.connections.values()
+                      if not connection.closed and len(connection.pending) > 0]
+        if len(oldest) == 0:
+            return None
+        return max(0.0, min(oldest) + self.timeout - time.monotonic())
+
+    def _send_queued(self, connection):
+        """
+        builds frames of queued commands (up to pipeline_depth in flight) and sends them (call with lock)
+        :param connection: BsiManagedConnection
+        :return: None
+        """
+        if connection.connecting:
+            return
+        instrument = connection.instrument
+        frames = list()
+        while len(connection.queued) > 0 and len(connection.pending) < self.pipeline_depth:
+            command, params, future = connection.queued.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            instrument.bsi_cmd_counter += 1
+            if instrument.bsi_cmd_counter >= 1000:
+                instrument.bsi_cmd_counter = 1
+            counter = instrument.bsi_counters[instrument.bsi_cmd_counter]
+            head, tail, mnemonic = instrument._frame_template(command, params)
+            frames.append(head + counter + tail)
+            connection.pending.append([counter, mnemonic, future, time.monotonic()])
+            if instrument.bsi_stats_enabled:
+                with instrument.bsi_stats_lock:
+                    stats = instrument._command_stats(mnemonic)
+                    stats.count += 1
+                    stats.bytes_sent += len(frames[-1])
+        if len(frames) > 0:
+            connection.tx_buffer += b''.join(frames)
+            self._write(connection)
+
+    def _write(self, connection):
+        """
+        sends as much of the transmit buffer as possible, finishes connecting (call with lock)
+        :param connection: BsiManagedConnection
+        :return: None
+        """
+        if connection.connecting:
+            error = connection.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error != 0:
+                raise BsiConnectionError('connect ' + connection.instrument.last_address + ': ' + os.strerror(error))
+            connection.connecting = False
+            connection.pending.popleft()  # connect timeout
+            self._send_queued(connection)
+        if len(connection.tx_buffer) > 0:
+            try:
+                sent = connection.socket.send(connection.tx_buffer)
+                del connection.tx_buffer[:sent]
+            except BlockingIOError:
+                pass
+        events = selectors.EVENT_READ
+        if len(connection.tx_buffer) > 0:
+            events |= selectors.EVENT_WRITE
+        if events != connection.events:
+            connection.events = events
+            self.selector.modify(connection.socket, events, connection)
+
+    def _read(self, connection):
+        """
+        reads received data and sets the answers as future results (call with lock),
+        answers with an other command counter than expected are discarded (see BsiInstrument._receive)
+        :param connection: BsiManagedConnection
+        :return: None
+        """
+        try:
+            data = connection.socket.recv(65536)
+        except BlockingIOError:
+            return
+        if not data:
+            raise BsiConnectionError('connection closed by BSI ' + connection.instrument.last_address)
+        connection.rx_buffer += data
+        instrument = connection.instrument
+        end = connection.rx_buffer.find(b'\n')
+        while end >= 0:
+            frame = bytes(connection.rx_buffer[:end + 1])
+            del connection.rx_buffer[:end + 1]
+            end = connection.rx_buffer.find(b'\n')
+            if len(connection.pending) == 0:
+                continue  # late answer
+            fields = frame.split(b',', 2)
+            counter, mnemonic, future, send_time = connection.pending[0]
+            if len(fields) >= 2 and fields[1].isdigit() and fields[1] != counter:
+                continue  # answer of an other command
+            connection.pending.popleft()
+            if instrument.bsi_stats_enabled:
+                with instrument.bsi_stats_lock:
+                    stats = instrument._command_stats(mnemonic)
+                    stats.bytes_received += len(frame)
+                    stats.add_time('wait', time.monotonic() - send_time)
+                    if frame.startswith(b'E'):
+                        stats.errors += 1
+                    instrument.bsi_stats_answers[counter] = mnemonic
+            answer = str(frame, encoding='utf-8')
+            if answer.startswith('E'):
+                self._complete(future, ex=BsiProcessingError(answer))
+            else:
+                self._complete(future, answer)
+
+    def _close(self, connection, ex):
+        """
+        closes connection, commands not answered fail with ex (call with lock)
+        :param connection: BsiManagedConnection
+        :param ex: BsiConnectionError
+        :return: None
+        """
+        if connection.closed:
+            return
+        connection.closed = True
+        connection.instrument.connected = False
+        try:
+            self.selector.unregister(connection.socket)
+        except (KeyError, ValueError):
+            pass
+        connection.socket.close()
+        futures = [entry[2] for entry in connection.pending if entry[2] is not None]
+        futures += [future for command, params, future in connection.queued if future.set_running_or_notify_cancel()]
+        connection.pending.clear()
+        connection.queued.clear()
+        for future in futures:
+            self._complete(future, ex=ex)
+
+
+# end of class BsiInstrumentManager
+
+
 class BsiI2c(I2cInterface):
     """
     Class for BSI I2c use as I2cInterface class
@@ -1732,25 +4378,19 @@ class BsiI2c(I2cInterface):
         self._channel = channel_select
 
     def write(self, i2c_addr: int, data: bytearray) -> Union[bool, None]:
-        return self._bsi.i2c_write_frame(i2c_addr, list(data), self._card, self._channel)
+        return self._bsi.i2c_write_frame(i2c_addr, data, self._card, self._channel)
 
     def read(self, i2c_addr: int, read_len: int) -> Union[bytearray, None]:
-        dat = self._bsi.i2c_read_frame(i2c_addr, read_len, self._card, self._channel)
+        dat = self._bsi.i2c_read_frame(i2c_addr, read_len, self._card, self._channel, as_buffer=True)
         if dat != '':
-            if type(dat) is list:
-                return bytearray(dat)
-            if type(dat) is int:
-                return dat.to_bytes(read_len, 'big')
+            return dat
         else:
             return None
 
     def write_read(self, i2c_addr: int, data: bytearray, read_len: int) -> Union[bytearray, None]:
-        dat = self._bsi.i2c_write_read_frame(i2c_addr, list(data), read_len, self._card, self._channel)
+        dat = self._bsi.i2c_write_read_frame(i2c_addr, data, read_len, self._card, self._channel, as_buffer=True)
         if dat != '':
-            if type(dat) is list:
-                return bytearray(dat)
-            if type(dat) is int:
-                return dat.to_bytes(read_len, 'big')
+            return dat
         else:
             return None
 
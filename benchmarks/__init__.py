@@ -0,0 +1,4 @@
+"""
+@package python_test_library.benchmarks
+benchmarks of the BSI driver hot paths against a local protocol stand-in (see __main__.py)
+"""
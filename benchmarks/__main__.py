@@ -0,0 +1,173 @@
+"""
+@package python_test_library.benchmarks
+runs the benchmark scenarios against the local BSI stand-in
+
+usage (from repository root):
+    python -m benchmarks                          run all scenarios, print report
+    python -m benchmarks --save                   ... and store results as local baseline of this machine
+    python -m benchmarks --save-reference         ... and store counts as versioned reference
+    python -m benchmarks --compare                ... and compare (exit code 1 on regression)
+    python -m benchmarks -k i2c --latency 0.002   only scenarios containing 'i2c', 2 ms per command
+    python -m benchmarks -x gui                   all scenarios except those containing 'gui'
+
+a regression is a scenario with more round trips, commands or bytes than the reference (baseline.json,
+versioned, no wall times) or a median wall time above local baseline * (1 + tolerance)
+(baseline.local.json, not versioned, compared only if it exists)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from SpektraBsi import BsiInstrument
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.stand_in import BsiStandIn
+
+DEFAULT_REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.local.json')
+# results which do not depend on the machine (stored in the reference)
+COUNTS = ('round_trips', 'commands', 'bytes_sent', 'bytes_received')
+# results of this machine (stored in the local baseline)
+WALL_TIMES = ('wall_time_median', 'wall_time_min', 'rounds')
+
+
+def run_scenario(scenario, stand_in):
+    """
+    runs all rounds of scenario, each round with freshly opened instrument
+    :param scenario: Scenario
+    :param stand_in: running BsiStandIn
+    :return: result as dict (wall times in sec, round trips, commands and bytes of one round)
+    """
+    times = list()
+    profile = None
+    for i in range(scenario.rounds):
+        with contextlib.redirect_stdout(io.StringIO()):  # driver, sensors and measurement print a lot
+            bsi = BsiInstrument()
+            if not bsi.open_bsi(stand_in.address, stand_in.port):
+                raise RuntimeError('stand-in not reachable')
+            try:
+                with bsi.profile(scenario.name) as profile:
+                    scenario.function(bsi)
+            finally:
+                bsi.disconnect()
+        times.append(profile.time)
+    return {'wall_time_median': statistics.median(times), 'wall_time_min': min(times),
+            'rounds': scenario.rounds, 'round_trips': profile.round_trips, 'commands': profile.commands,
+            'bytes_sent': profile.bytes_sent, 'bytes_received': profile.bytes_received}
+
+
+def compare(results, baseline, tolerance):
+    """
+    compares results with baseline, counts of a reference or wall times of a local baseline
+    :param results: dict name -> result (see run_scenario)
+    :param baseline: dict name -> result
+    :param tolerance: allowed relative increase of median wall time f.e. 0.2
+    :return: list of regression messages (empty if none)
+    """
+    regressions = list()
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in COUNTS:
+            if key in base and result[key] > base[key]:
+                regressions.append('{}: {} {} > {}'.format(name, key.replace('_', ' '), result[key], base[key]))
+        if 'wall_time_median' in base \
+                and result['wall_time_median'] > base['wall_time_median'] * (1.0 + tolerance):
+            regressions.append('{}: wall time {:.2f} ms > {:.2f} ms'.format(
+                name, result['wall_time_median'] * 1000.0, base['wall_time_median'] * 1000.0))
+    return regressions
+
+
+def save(path, results, keys, args, info=None):
+    """
+    stores results as baseline, scenarios not run (see -k / -x) are kept from the existing file
+    :param path: json file
+    :param results: dict name -> result
+    :param keys: result entries stored (COUNTS or WALL_TIMES)
+    :param args: parsed arguments (latency, cards, select, exclude)
+    :param info: (optional) dict of additional entries (f.e. machine)
+    :return: None
+    """
+    baseline = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'latency': args.latency, 'cards': args.cards}
+    baseline.update(info or dict())
+    scenarios = dict()
+    if os.path.exists(path) and (args.select or args.exclude):
+        with open(path) as file:
+            scenarios = json.load(file)['scenarios']
+    scenarios.update(results)
+    baseline['scenarios'] = {name: {key: result[key] for key in keys if key in result}
+                             for name, result in scenarios.items()}
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2)
+    print('baseline saved to ' + path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='BSI driver benchmarks')
+    parser.add_argument('-k', dest='select', default='', help='run only scenarios containing this string')
+    parser.add_argument('-x', dest='exclude', default=None, help='skip scenarios containing this string')
+    parser.add_argument('--latency', type=float, default=0.0005, help='stand-in latency per command in sec')
+    parser.add_argument('--cards', type=int, default=2, help='number of cards of the stand-in')
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE, help='versioned reference json file (counts)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='local baseline json file (wall times)')
+    parser.add_argument('--save', action='store_true', help='store results as local baseline')
+    parser.add_argument('--save-reference', action='store_true', help='store counts of results as reference')
+    parser.add_argument('--compare', action='store_true', help='compare results with reference and local baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative wall time increase')
+    args = parser.parse_args(argv)
+
+    stand_in = BsiStandIn(args.cards, args.latency)
+    results = dict()
+    print('{:<32} {:>10} {:>10} {:>6} {:>6} {:>10} {:>10}'.format(
+        'scenario', 'median ms', 'min ms', 'rt', 'cmd', 'B sent', 'B rec'))
+    try:
+        for name, scenario in SCENARIOS.items():
+            if args.select not in name or (args.exclude and args.exclude in name):
+                continue
+            result = run_scenario(scenario, stand_in)
+            results[name] = result
+            print('{:<32} {:>10.2f} {:>10.2f} {:>6} {:>6} {:>10} {:>10}'.format(
+                name, result['wall_time_median'] * 1000.0, result['wall_time_min'] * 1000.0, result['round_trips'],
+                result['commands'], result['bytes_sent'], result['bytes_received']))
+    finally:
+        stand_in.close()
+
+    exit_code = 0
+    if args.compare:
+        if not os.path.exists(args.reference):
+            print('ERROR: no reference ' + args.reference)
+            return 2
+        regressions = list()
+        for path in (args.reference, args.baseline):
+            if not os.path.exists(path):
+                continue  # no local baseline, wall times are not compared
+            with open(path) as file:
+                baseline = json.load(file)
+            if baseline['latency'] != args.latency or baseline['cards'] != args.cards:
+                print('WARNING: {} recorded with latency {} s and {} cards'.format(
+                    path, baseline['latency'], baseline['cards']))
+            regressions += compare(results, baseline['scenarios'], args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if len(regressions) > 0:
+            exit_code = 1
+        else:
+            print('no regression against ' + ' and '.join(
+                path for path in (args.reference, args.baseline) if os.path.exists(path)))
+    if args.save:
+        save(args.baseline, results, WALL_TIMES, args,
+             {'python': platform.python_version(), 'machine': platform.node()})
+    if args.save_reference:
+        save(args.reference, results, COUNTS, args)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+@package python_test_library.benchmarks.scenarios
+Repeatable benchmark scenarios of the driver hot paths
+
+Every scenario gets a freshly opened BsiInstrument (connected to the stand-in)
+per round, so caches of one round (autorange, configuration) do not falsify the next.
+"""
+
+import configparser
+import os
+import tempfile
+
+from SpektraBsi import BsiI2c, bsi_meas_by_ini
+
+
+class Scenario:
+    """
+    benchmark scenario: function(bsi) which is measured, repeated rounds times
+    """
+
+    def __init__(self, name, function, rounds, description):
+        """
+        constructor
+        :param name: name of scenario (key of baseline)
+        :param function: function(bsi), bsi is connected BsiInstrument
+        :param rounds: number of measured rounds
+        :param description: short description for report
+        """
+        self.name = name
+        self.function = function
+        self.rounds = rounds
+        self.description = description
+
+
+SCENARIOS = dict()  # name -> Scenario (in order of registration)
+
+
+def scenario(name, rounds=5, description=''):
+    """
+    decorator, registers function(bsi) as benchmark scenario
+    :param name: name of scenario
+    :param rounds: number of measured rounds
+    :param description: short description for report
+    :return: decorator
+    """
+    def register(function):
+        SCENARIOS[name] = Scenario(name, function, rounds, description or function.__doc__.strip())
+        return function
+    return register
+
+
+# pin assignment of the eval board (see run_gui.py)
+BMA280_PINS = {
+    'I2C_SDA': 5, 'I2C_SCL': 7,
+    'SPI_SDI': 5, 'SPI_SDO': 6, 'SPI_SCK': 7, 'SPI_CSB': 9,
+    'PS': 8,
+    'INT1': 4, 'INT2': 3
+}
+
+
+def _bma280(bsi):
+    """
+    creates BMA280 sensor on bsi (imported here, sensors needs PySide6)
+    """
+    import sensors
+    return sensors.BMA280(bsi, [3, 4], BMA280_PINS, 'I2C')
+
+
+# ****************************************************************************
+# parsing and command creation (no round trips)
+# ****************************************************************************
+
+_LARGE_HEX_ANSWER = 'O,001,' + ','.join(['A5' * 4096] * 16) + '\n'
+
+
+@scenario('parse_answer_hex_4096', rounds=5)
+def parse_answer_hex_4096(bsi):
+    """_parse_answer of 16 cards x 4096 byte hex frames, 10 answers"""
+    for i in range(10):
+        bsi._parse_answer(_LARGE_HEX_ANSWER, 2, hex, 0, 2)
+
+
+@scenario('create_param_list_string', rounds=5)
+def create_param_list_string(bsi):
+    """_create_param_list_string all cards / single card, dec and hex, 10000 lists"""
+    for i in range(2500):
+        bsi._create_param_list_string(1, 0, 0, False)
+        bsi._create_param_list_string(1, 0, 3, False)
+        bsi._create_param_list_string(1023, 0, 0, True)
+        bsi._create_param_list_string(1023, 0, 3, True)
+
+
+# ****************************************************************************
+# I2C
+# ****************************************************************************
+
+def _i2c_read_frame(read_framelen):
+    def function(bsi):
+        for i in range(10):
+            bsi.i2c_read_frame(0x18, read_framelen, 1, 1)
+    function.__doc__ = 'i2c_read_frame of {} byte, 10 frames'.format(read_framelen)
+    return function
+
+
+for _framelen in (1, 64, 4096):
+    scenario('i2c_read_frame_{}'.format(_framelen), rounds=5)(_i2c_read_frame(_framelen))
+
+
+@scenario('i2c_read_buffer_4096', rounds=5)
+def i2c_read_buffer_4096(bsi):
+    """BsiI2c.read of 4096 byte (buffer path), 10 frames"""
+    i2c = BsiI2c(bsi, 1, 1)
+    for i in range(10):
+        i2c.read(0x18, 4096)
+
+
+@scenario('i2c_memory_dump_65536', rounds=3)
+def i2c_memory_dump_65536(bsi):
+    """BsiI2c.write_read of 64 kB (memory dump, chunked), 1 dump"""
+    bsi.bsi_i2c_chunk_size = 4096  # chunks are opt-in
+    BsiI2c(bsi, 1, 1).write_read(0x50, bytearray(2), 65536)
+
+
+# ****************************************************************************
+# sensors
+# ****************************************************************************
+
+def _get_acceleration(axis):
+    def function(bsi):
+        bma280 = _bma280(bsi)
+        for i in range(5):
+            bma280.getAcceleration(axis)
+    function.__doc__ = 'BMA280.getAcceleration(\'{}\'), 5 readings'.format(axis)
+    return function
+
+
+for _axis in ('x', 'xy', 'xyz'):
+    scenario('bma280_get_acceleration_{}'.format(_axis), rounds=3)(_get_acceleration(_axis))
+
+
+@scenario('bma280_configure', rounds=3)
+def bma280_configure(bsi):
+    """BMA280.configure on unconfigured instrument"""
+    _bma280(bsi).configure()
+
+
+# ****************************************************************************
+# measurement plan
+# ****************************************************************************
+
+def _write_meas_plan(filepath, steps):
+    """
+    writes ini file with section [plan] of steps BSI_UR measurements
+    """
+    parser = configparser.ConfigParser(allow_no_value=True, delimiters='=')
+    parser.optionxform = str
+    parser.add_section('plan')
+    for step in range(steps):
+        pin = (step % 16) + 1
+        parser.set('plan', 'U{:03d},BSI_UR,0,MEAS_V_MIO{:02d}_Low1_Sense,1,1.0,3.3,3.0,3.6'.format(step, pin))
+    with open(filepath, 'w') as file:
+        parser.write(file)
+
+
+@scenario('bsi_meas_by_ini_100', rounds=3)
+def bsi_meas_by_ini_100(bsi):
+    """bsi_meas_by_ini of plan with 100 BSI_UR steps"""
+    handle, filepath = tempfile.mkstemp(suffix='.ini')
+    os.close(handle)
+    try:
+        _write_meas_plan(filepath, 100)
+        bsi_meas_by_ini(bsi, filepath, 'plan')
+    finally:
+        os.remove(filepath)
+
+
+# ****************************************************************************
+# GUI
+# ****************************************************************************
+
+_app = None
+
+
+@scenario('gui_plot_1000_points', rounds=3)
+def gui_plot_1000_points(bsi):
+    """BMA280Widget.addPointToPlot of 1000 points with event processing (1 s at 1 kHz)"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+    from gui import BMA280Widget
+    global _app
+    app = QApplication.instance()
+    if app is None:
+        _app = app = QApplication([])  # keep reference, a QApplication must exist only once
+    widget = BMA280Widget(_bma280(bsi))
+    widget.show()
+    for count in range(1000):
+        widget.addPointToPlot({'count': count, 'x': 0.001 * count, 'y': -0.001 * count, 'z': 1.0})
+        app.processEvents()
+    widget.close()
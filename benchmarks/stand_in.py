@@ -0,0 +1,124 @@
+"""
+@package python_test_library.benchmarks.stand_in
+Local stand-in for the SPEKTRA BSI (S-Test) protocol
+
+Answers the commands used by the benchmark scenarios with plausible values
+after an injected latency per command (instrument processing + network),
+so driver changes can be measured without instrument.
+"""
+
+import socket
+import threading
+import time
+
+
+class BsiStandIn:
+    """
+    TCP server on localhost speaking the BSI line protocol\n
+    * request: CMD,NNN[,params]\\n
+    * answer: O,NNN,value card1,...,value card16\\n
+    """
+
+    def __init__(self, nr_cards=2, latency=0.0005, voltage=3.3):
+        """
+        constructor, starts server thread
+        :param nr_cards: number of cards answering (1..16)
+        :param latency: time in sec before each answer is sent
+        :param voltage: value of all voltage measurements
+        """
+        self.nr_cards = nr_cards
+        self.latency = latency
+        self.voltage = voltage
+        self.meas_range = 1
+        self.read_framelen = dict()  # I2C channel -> read frame length in bytes
+        self.nr_commands = 0
+        self.server = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(4)
+        self.address, self.port = self.server.getsockname()
+        threading.Thread(target=self._accept, name='BsiStandIn', daemon=True).start()
+
+    def close(self):
+        """
+        stops accepting connections
+        :return: None
+        """
+        self.server.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                return  # closed
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        buffer = b''
+        while True:
+            try:
+                data = connection.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            answers = list()
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                fields = str(line, 'utf-8').split(',', 2)
+                params = fields[2].split(',') if len(fields) > 2 else []
+                if self.latency > 0:
+                    time.sleep(self.latency)
+                answers.append(self.answer(fields[0], fields[1], params))
+                self.nr_commands += 1
+            try:
+                connection.sendall(bytes(''.join(answers), 'utf-8'))
+            except OSError:
+                return
+
+    def _values(self, value):
+        """
+        answer values for all 16 cards ('' for not existing cards)
+        """
+        return ','.join([str(value)] * self.nr_cards + [''] * (16 - self.nr_cards))
+
+    def answer(self, command, counter, params):
+        """
+        creates answer of one command
+        :param command: command as string
+        :param counter: command counter as string
+        :param params: list of parameters
+        :return: answer line as string
+        """
+        if command == 'SYS_IDN':
+            values = 'BSI STAND-IN,V1.0'
+        elif command == 'SYS_GetBSISnr':
+            values = ','.join(['{:04X}'.format(0x100 + card) for card in range(self.nr_cards)]
+                              + [''] * (16 - self.nr_cards))
+        elif command == 'MEAS_CFG_SetRange':
+            self.meas_range = int(params[0])
+            values = self._values('O')
+        elif command == 'MEAS_CFG_GetRange':
+            values = self._values(self.meas_range)
+        elif command.startswith('MEAS_V_'):
+            values = self._values(self.voltage if self.meas_range == 1 or self.voltage < 8.0 else 8.2)
+        elif command.startswith('MEAS_I_'):
+            values = self._values(1.25)
+        elif command == 'DIG_GetMIOState':
+            values = self._values('0005')
+        elif command.endswith('_CFG_SetReadFrameLength'):
+            self.read_framelen[command.split('_CFG_')[0]] = int(next((par for par in params if par != ''), '1'), 16)  # hex
+            values = self._values('O')
+        elif command.endswith('_Read') or command.endswith('_WriteRead'):
+            channel = command.rsplit('_', 1)[0]
+            values = self._values('A5' * self.read_framelen.get(channel, 1))
+        elif command == 'DIG_CFG_GetActivateMIOSetup':
+            values = ','.join(['00000001' + '00000000' * 22] * self.nr_cards)
+        elif '_Get' in command:
+            values = self._values('0')
+        else:
+            values = self._values('O')
+        return 'O,' + counter + ',' + values + '\n'
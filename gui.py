@@ -7,10 +7,10 @@ from PySide6.QtWidgets import (QApplication, QWidget, QTabWidget, QListWidget,
                                QPushButton, QTextEdit, QLineEdit, QLabel, QListWidgetItem, QAbstractItemView, QSpinBox,
                                QFrame, QSizePolicy, QScrollArea, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem,
                                QComboBox, QDoubleSpinBox, QCheckBox, QSlider)
-from PySide6.QtCore import Qt, QPoint
+from PySide6.QtCore import Qt, QObject, QThreadPool, Signal
 import pyqtgraph
 
-from SpektraBsi import BsiInstrument, TMUMeasurementQuantity
+from SpektraBsi import BsiInstrument, BsiPriority, TMUMeasurementQuantity
 
 
 #used to draw the colored circles
@@ -24,6 +24,75 @@ def get_traffic_light_pixmap(color=QColorConstants.Gray, radius=8):
     p.end()
     return px
 
+#runs an instrument call in the background, the GUI never waits for the instrument
+class BackgroundCall(QObject):
+    finished = Signal(object)  # result of the call, None on exception
+    failed = Signal(str)  # message of the exception (emitted before finished)
+    pool = None  # one thread, calls are executed one after the other in order of start
+    running = set()  # keeps started calls alive until finished
+    error_handler = None  # default slot for failed, f.e. the console of the main window
+
+    def __init__(self, utb: BsiInstrument, function, *args, priority=BsiPriority.Interactive):
+        """
+        :param utb: instance of BsiInstrument (for the priority of the requests)
+        :param function: function to call in background thread
+        :param args: arguments of function
+        :param priority: BsiPriority of the instrument requests
+        """
+        super().__init__()
+        self.utb = utb
+        self.function = function
+        self.args = args
+        self.priority = priority
+        # python callables (f.e. lambdas) called by the slots below, so they run in the GUI thread
+        self.on_finished = None
+        self.on_failed = None
+        self.finished.connect(self._done)
+        self.failed.connect(self._failed)
+
+    def start(self):
+        if BackgroundCall.pool is None:
+            BackgroundCall.pool = QThreadPool()
+            BackgroundCall.pool.setMaxThreadCount(1)
+        BackgroundCall.running.add(self)
+        BackgroundCall.pool.start(self._run)
+        return self
+
+    def _run(self):
+        res = None
+        try:
+            with self.utb.priority(self.priority):
+                res = self.function(*self.args)
+        except Exception as ex:
+            print(str(ex))
+            self.failed.emit(type(ex).__name__ + ': ' + str(ex))
+        self.finished.emit(res)
+
+    def _done(self, res):
+        BackgroundCall.running.discard(self)
+        if self.on_finished is not None:
+            self.on_finished(res)
+
+    def _failed(self, text):
+        if self.on_failed is not None:
+            self.on_failed(text)
+
+
+def run_in_background(utb: BsiInstrument, function, *args, finished=None, failed=None):
+    """
+    calls function(*args) in the background thread
+    :param utb: instance of BsiInstrument
+    :param function: function to call
+    :param finished: (optional) slot called in the GUI thread with the result
+    :param failed: (optional) slot called in the GUI thread with the exception message,
+    default BackgroundCall.error_handler
+    :return: BackgroundCall
+    """
+    call = BackgroundCall(utb, function, *args)
+    call.on_finished = finished
+    call.on_failed = failed or BackgroundCall.error_handler
+    return call.start()
+
 #class to create the GUI window
 class GUI_WINDOW(QWidget):
     def __init__(self, utb: BsiInstrument, bma280):
@@ -71,16 +140,17 @@ class GUI_WINDOW(QWidget):
         for idx in range(self.tabWidget.count()):
             self.tabWidget.widget(idx).device.output.connect(self.output_ListWidgetItem)
         self.clearConsoleBtn.clicked.connect(self.consoleListWidget.clear)
+        BackgroundCall.error_handler = self.output_error
 
         self.tabWidget.setCurrentIndex(2)
 
     
     #connect to the S-Test. Do not change
     def utb_connect(self):
+        self.connectBtn.setEnabled(False)  # until connect / disconnect is finished
         if not self.utb.connected:
-            self.consoleListWidget.addItem("Connecting to UTB @ " + self.IPLineEdit.text())
-            self.consoleListWidget.update(self.consoleListWidget.indexAt(QPoint(0, 0)))
-            self.repaint()
+            item = QListWidgetItem("Connecting to UTB @ " + self.IPLineEdit.text())
+            self.consoleListWidget.addItem(item)
             # cut off leading zeros from IP
             ip = self.IPLineEdit.text()
             ps = ip.split(sep='.')
@@ -89,30 +159,37 @@ class GUI_WINDOW(QWidget):
                 pi.append(int(e))
             ip = '.'.join(str(e) for e in pi)
             # connect
-            res = self.utb.open_bsi(ip)
-            if res:
-                self.connectBtn.setText("Disconnect")
-                self.bmaWidget.setEnabled(True)
-                self.consoleListWidget.item(self.consoleListWidget.count() - 1).setIcon(
-                    get_traffic_light_pixmap(QColorConstants.Green))
-            else:
-                self.consoleListWidget.item(self.consoleListWidget.count() - 1).setIcon(
-                    get_traffic_light_pixmap(QColorConstants.Red))
+            # the console item of this call is marked, other items may be added meanwhile
+            run_in_background(self.utb, self.utb.open_bsi, ip, finished=lambda res: self.utb_connected(res, item))
         else:  # disconnect
-            self.consoleListWidget.addItem("Disconnecting")
-            self.consoleListWidget.update(self.consoleListWidget.indexAt(QPoint(0, 0)))
-            self.repaint()
-
-            res = self.utb.disconnect()
-            if res:
-                self.connectBtn.setText("Connect")
-                self.bmaWidget.setEnabled(False)
-
-                self.consoleListWidget.item(self.consoleListWidget.count() - 1).setIcon(
-                    get_traffic_light_pixmap(QColorConstants.Green))
-            else:
-                self.consoleListWidget.item(self.consoleListWidget.count() - 1).setIcon(
-                    get_traffic_light_pixmap(QColorConstants.Red))
+            item = QListWidgetItem("Disconnecting")
+            self.consoleListWidget.addItem(item)
+            run_in_background(self.utb, self.utb.disconnect, finished=lambda res: self.utb_disconnected(res, item))
+
+    def utb_connected(self, res, item):
+        if res:
+            self.connectBtn.setText("Disconnect")
+            self.bmaWidget.setEnabled(True)
+        self.set_item_result(item, res)
+        self.connectBtn.setEnabled(True)
+
+    def utb_disconnected(self, res, item):
+        if res:
+            self.connectBtn.setText("Connect")
+            self.bmaWidget.setEnabled(False)
+        self.set_item_result(item, res)
+        self.connectBtn.setEnabled(True)
+
+    @staticmethod
+    def set_item_result(item, result):
+        try:
+            item.setIcon(get_traffic_light_pixmap(QColorConstants.Green) if result else
+                         get_traffic_light_pixmap(QColorConstants.Red))
+        except RuntimeError:
+            pass  # console was cleared meanwhile
+
+    def output_error(self, text):
+        self.output_ListWidgetItem(False, text)
 
     def output_ListWidgetItem(self, result, text):
         item = QListWidgetItem(text)
@@ -197,16 +274,23 @@ class DeviceWidget(QWidget):
         # connect signals
         self.buttonPowerOn.clicked.connect(self.powerOn)
         self.buttonPowerOff.clicked.connect(self.powerOff)
-        self.buttonConfig.clicked.connect(self.device.configure)
+        self.buttonConfig.clicked.connect(self.configure)
+
+    def configure(self):
+        run_in_background(self.device.utb, self.device.configure)
 
     def powerOn(self):
-        res = self.device.power_on()
+        run_in_background(self.device.utb, self.device.power_on, finished=self.poweredOn)
+
+    def poweredOn(self, res):
         self.labelPowerStatus.setPixmap(get_traffic_light_pixmap(QColorConstants.Green) if res else
                                         get_traffic_light_pixmap(QColorConstants.Red))
         self.buttonConfig.setEnabled(False)
 
     def powerOff(self):
-        res = self.device.power_off()
+        run_in_background(self.device.utb, self.device.power_off, finished=self.poweredOff)
+
+    def poweredOff(self, res):
         self.labelPowerStatus.setPixmap(get_traffic_light_pixmap(QColorConstants.Red) if res else
                                         get_traffic_light_pixmap(QColorConstants.Green))
         self.buttonConfig.setEnabled(True)
@@ -324,13 +408,13 @@ class BMA280Widget(DeviceWidget):
         self.device.measure_thread.newValue.connect(self.addPointToPlot)
         self.buttonRead.clicked.connect(self.readRegister)
         self.buttonWrite.clicked.connect(self.writeRegister)
-        self.buttonResetInt.clicked.connect(self.device.resetInterrupt)
-        self.buttonCfgDTab.clicked.connect(self.device.configureDTap)
+        self.buttonResetInt.clicked.connect(self.resetInterrupt)
+        self.buttonCfgDTab.clicked.connect(self.configureDTap)
 
     def readRegister(self):
         addr = bytearray()
         addr.insert(0, int(self.ReadAddrLineEdit.text(), 16))
-        self.device.read(addr, self.ReadNumBytesSpinBox.value())
+        run_in_background(self.device.utb, self.device.read, addr, self.ReadNumBytesSpinBox.value())
 
     def writeRegister(self):
         addr = int(self.WriteAddrLineEdit.text(), 16)
@@ -339,10 +423,18 @@ class BMA280Widget(DeviceWidget):
         for e in data_str:
             if len(e) == 2:
                 data.append(int(e, 16))
-        self.device.write(addr, data)
+        run_in_background(self.device.utb, self.device.write, addr, data)
+
+    def resetInterrupt(self):
+        run_in_background(self.device.utb, self.device.resetInterrupt)
+
+    def configureDTap(self):
+        run_in_background(self.device.utb, self.device.configureDTap)
 
     def getTemperature(self):
-        temp = self.device.getTemperature()
+        run_in_background(self.device.utb, self.device.getTemperature, finished=self.showTemperature)
+
+    def showTemperature(self, temp):
         if temp is not None:
             self.labelTemp.setText("{:.1f}°C".format(temp))
 
@@ -351,7 +443,9 @@ class BMA280Widget(DeviceWidget):
                                              ('y', self.checkBoxY.isChecked()),
                                              ('z', self.checkBoxZ.isChecked())] if state])
 
-        acc = self.device.getAcceleration(axis)
+        run_in_background(self.device.utb, self.device.getAcceleration, axis, finished=self.showAcceleration)
+
+    def showAcceleration(self, acc):
         self.labelAcc.setText(str(acc))
 
     def setPlotRefreshRate(self, mdt):
@@ -3,8 +3,9 @@ import abc
 from typing import Union, Optional
 
 from PySide6.QtGui import QColorConstants, QIcon
-from SpektraBsi import BsiInstrument, BsiI2c, TMUMeasurementQuantity
+from SpektraBsi import BsiInstrument, BsiI2c, BsiConfig, BsiPriority, TMUMeasurementQuantity
 import time
+import numpy as np
 from PySide6.QtCore import QThread, QMutex
 
 from PySide6.QtCore import Signal, QObject
@@ -32,6 +33,7 @@ class Sensor(QObject):
     device_type = None  # i.e. "EEPROM"
     part_number = None  # optional
     pwr_sources = list()  # the power source the device is connected to (1..4) as int or list of int
+    relay_settle_ms = 10  # wait after closing the power relais / after power off before opening it
     
 
     output = Signal(bool, str)
@@ -57,29 +59,25 @@ class Sensor(QObject):
     #turn power off
     @utb_connected
     def power_off(self):
-        ans = True
-        for e in self.pwr_sources:
-            res = self.utb.pwr_set_onoff(e, 0, 0)
-            self.checklog("Turning Power Off", res)
-            ans &= res
-            res = self.utb.pwr_set_openrelais(e, 0)
-            self.checklog("Opening Power Relais", res)
-            ans &= res
+        if not self.pwr_sources:
+            return True
+        steps = [(e, 'off', 0) for e in self.pwr_sources]
+        steps[-1] = (steps[-1][0], 'off', self.relay_settle_ms)  # no load on opening relais
+        steps += [(e, 'open', 0) for e in self.pwr_sources]
+        ans = self.utb.pwr_sequence(steps, 0)
+        self.checklog("Turning Power Off and Opening Power Relais", ans)
         return ans
 
     #turn power on
     @utb_connected
     def power_on(self):
-        ans = True
-        for e in self.pwr_sources:
-            # close power relais
-            res = self.utb.pwr_set_closerelais(e, 0)
-            self.checklog("Closing Power Relais", res)
-            ans &= res
-            # power on
-            res = self.utb.pwr_set_onoff(e, 0, 1)
-            self.checklog("Turning Power On", res)
-            ans &= res
+        if not self.pwr_sources:
+            return True
+        steps = [(e, 'close', 0) for e in self.pwr_sources]
+        steps[-1] = (steps[-1][0], 'close', self.relay_settle_ms)  # relais contacts settled before power on
+        steps += [(e, 'on', 0) for e in self.pwr_sources]
+        ans = self.utb.pwr_sequence(steps, 0)
+        self.checklog("Closing Power Relais and Turning Power On", ans)
         return ans
 
     @abc.abstractmethod
@@ -108,25 +106,24 @@ class EEPROM24XX02(Sensor):
         super().__init__(utb)
         self.utb_i2c = BsiI2c(self.utb, 1, 1)  
 
+    def desired_config(self) -> BsiConfig:
+        config = BsiConfig()
+        # pin output and input levels
+        config.bank_levels(1, 0, 5, .4, 3.5)
+        # i2c MIOs
+        config.mio_setup(1, [0x00802005, 0x00802004, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
+        # eeprom addr
+        config.i2c_master_address(0x57, 1)
+        # power
+        config.voltage_source(self.pwr_sources[0], 5.0, -0.1, 50, False)
+        return config
+
     @utb_connected
     def configure(self):
         self.power_off()
-        # configure pin output and input levels
-        res = self.utb.mio_set_high_level_out(1, 5, 0)
-        res = res and self.utb.mio_set_low_level_out(1, 0, 0)
-        res = res and self.utb.mio_set_high_level_in(1, 3.5, 0)
-        res = res and self.utb.mio_set_low_level_in(1, .4, 0)
-        self.checklog("Setting Pin I/O Voltage Levels", res)
-        # configure i2c MIOs
-        res = self.utb.mio_load_config(1, [0x00802005, 0x00802004, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
-        res = res and self.utb.mio_activate_config(1, 0)
-        self.checklog("Configuring I2C MIO Pins", res)
-        # set eeprom addr
-        res = self.utb.i2c_set_master_address(0x57, 0, 1)
-        self.checklog("Setting I2C Address", res)
-        # config power
-        res = self.utb.pwr_config_voltage_source(self.pwr_sources[0], 0, 5.0, -0.1, 50, False)
-        self.checklog("Configuring Voltage Source", res)
+        # only settings differing from the current UTB configuration are sent
+        res = self.utb.apply(self.desired_config())
+        self.checklog("Configuring Pin I/O Voltage Levels, I2C MIO Pins, I2C Address and Voltage Source", res)
 
     @utb_connected
     def write(self, addr: Union[int, bytearray], data: bytearray):
@@ -243,39 +240,32 @@ class BMA280(Sensor):
         self.utb_i2c = BsiI2c(self.utb, 1, 1)  
         self.measure_thread = BMA280AccelerationMeasurementThread(self, 'xyz', 1)
 
-    #configure the Sensor
-    @utb_connected
-    def configure(self):
-        res = True
+    def desired_config(self) -> BsiConfig:
+        config = BsiConfig()
+        # VDD and VDDIO to 2.4V
         for src in self.pwr_sources:
-            res = res and self.utb.pwr_set_supply_voltagemode(src, 0)
-            res = res and self.utb.pwr_config_voltage_source(src, 0, 2.4, -0.1, 2, True)
-        self.checklog("config VDD and VDDIO to 2.4V", res)
-
-        # i2c
-        res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO{:02d}_On'.format(self.pins['PS']), 0)
-        self.checklog("use I2C as protocol", res)
+            config.voltage_source(src, 2.4, -0.1, 2, True)
+        # i2c and interrupt pins
         mio_config = [0x00] * 16
         mio_config[self.pins['I2C_SCL'] - 1] = 0x00802005
         mio_config[self.pins['I2C_SDA'] - 1] = 0x00802004
         mio_config[self.pins['SPI_SDO'] - 1] = 0x00000040  # SDO to GND to set slave addr to 0x18
         mio_config[self.pins['INT1'] - 1] = 0x00004000  # as input with pull down
         mio_config[self.pins['INT2'] - 1] = 0x00004000  # as input with pull down
-        res = self.utb.mio_load_config(1, mio_config)
-        res = res and self.utb.mio_activate_config(1, 0)
-        self.checklog("configure I2C and interrupt pins", res)
-
+        config.mio_setup(1, mio_config)
         # bank voltages
-        res = self.utb.mio_set_low_level_out(1, 0, 0)
-        res = res and self.utb.mio_set_low_level_in(1, 0.2 * 2.4, 0)
-        res = res and self.utb.mio_set_high_level_in(1, 0.8 * 2.4, 0)
-        res = res and self.utb.mio_set_high_level_out(1, 2.4, 0)
-        res = res and self.utb.mio_set_low_level_out(2, 0, 0)
-        res = res and self.utb.mio_set_low_level_in(2, 0.2 * 2.4, 0)
-        res = res and self.utb.mio_set_high_level_in(2, 0.8 * 2.4, 0)
-        res = res and self.utb.mio_set_high_level_out(2, 2.4, 0)
+        for bank in (1, 2):
+            config.bank_levels(bank, 0, 2.4, 0.2 * 2.4, 0.8 * 2.4)
+        return config
 
-        self.checklog("Setting Pin I/O Voltage Levels", res)
+    #configure the Sensor
+    @utb_connected
+    def configure(self):
+        # only settings differing from the current UTB configuration are sent
+        res = self.utb.apply(self.desired_config())
+        self.checklog("config VDD and VDDIO to 2.4V, I2C and interrupt pins, Pin I/O Voltage Levels", res)
+        res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO{:02d}_On'.format(self.pins['PS']), 0)
+        self.checklog("use I2C as protocol", res)
 
     @utb_connected
     def read(self, addr: bytearray, num_bytes: int = 1) -> Union[bytearray, bool]:
@@ -435,48 +425,34 @@ class ADXL343(Sensor):
         self.utb_i2c = BsiI2c(self.utb, 1, 1)  
         self.measure_thread = ADXL343AccelerationMeasurementThread(self, 'xyz', 1)
 
-    #configure the Sensor
-    
-    
-    @utb_connected
-    def configure(self):
-        res = True
+    def desired_config(self) -> BsiConfig:
+        config = BsiConfig()
+        # VDD and VDDIO to 3.3V
         for src in self.pwr_sources:
-            res = res and self.utb.pwr_set_supply_voltagemode(src, 0)
-            res = res and self.utb.pwr_config_voltage_source(src, 0, 3.3, -0.1, 2, True)
-        self.checklog("config VDD and VDDIO to 3.3V", res)
-
-        # i2c
-        res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO{:02d}_On'.format(self.pins['PS']), 0)
-        #res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO08_On', 0)
-
-        
-
-        self.checklog("use I2C as protocol", res)
+            config.voltage_source(src, 3.3, -0.1, 2, True)
+        # i2c pins
         mio_config = [0x00] * 16
         mio_config[self.pins['I2C_SCL'] - 1] = 0x00802005
         mio_config[self.pins['I2C_SDA'] - 1] = 0x00802004
         #mio_config[self.pins['GND'] - 1] = 0x00000040  # CSB to GND to set slave addr to 0x53
         #mio_config[self.pins['INT1'] - 1] = 0x00004000  # as input with pull down
         #mio_config[self.pins['INT2'] - 1] = 0x00004000  # as input with pull down
-        res = self.utb.mio_load_config(1, mio_config)
-        self.checklog("configure I2C and interrupt pins", res)
-        res = res and self.utb.mio_activate_config(1, 0)
-        res = self.utb.i2c_set_master_address(self.i2c_addr, 0, 1)
-        self.checklog("Setting I2C Address", res)
-        
-        
+        config.mio_setup(1, mio_config)
+        config.i2c_master_address(self.i2c_addr, 1)
         # bank voltages
-        res = self.utb.mio_set_low_level_out(1, 0, 0)
-        res = res and self.utb.mio_set_low_level_in(1, 0.2 * 3.3, 0)
-        res = res and self.utb.mio_set_high_level_in(1, 0.8 * 3.3, 0)
-        res = res and self.utb.mio_set_high_level_out(1, 3.3, 0)
-        res = res and self.utb.mio_set_low_level_out(2, 0, 0)
-        res = res and self.utb.mio_set_low_level_in(2, 0.2 * 3.3, 0)
-        res = res and self.utb.mio_set_high_level_in(2, 0.8 * 3.3, 0)
-        res = res and self.utb.mio_set_high_level_out(2, 3.3, 0)
-
-        self.checklog("Setting Pin I/O Voltage Levels", res)
+        for bank in (1, 2):
+            config.bank_levels(bank, 0, 3.3, 0.2 * 3.3, 0.8 * 3.3)
+        return config
+
+    #configure the Sensor
+    @utb_connected
+    def configure(self):
+        # only settings differing from the current UTB configuration are sent
+        res = self.utb.apply(self.desired_config())
+        self.checklog("config VDD and VDDIO to 3.3V, I2C pins and address, Pin I/O Voltage Levels", res)
+        res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO{:02d}_On'.format(self.pins['PS']), 0)
+        #res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO08_On', 0)
+        self.checklog("use I2C as protocol", res)
         
 
     @utb_connected
@@ -610,47 +586,37 @@ class LPS22(Sensor):
         self.utb_i2c = BsiI2c(self.utb, 1, 1)  
 
 
-    #configure the Sensor
-    @utb_connected
-    def configure(self):
-        res = True
+    def desired_config(self) -> BsiConfig:
+        config = BsiConfig()
         voltage = 3.3
+        # VDD and VDDIO to 3.3V
         for src in self.pwr_sources:
-            res = res and self.utb.pwr_set_supply_voltagemode(src, 0)
-            res = res and self.utb.pwr_config_voltage_source(src, 0, voltage, -0.1, 2, True)
-        self.checklog("config VDD and VDDIO to 3.3V", res)
-
-        # i2c
-        #res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO{:02d}_On'.format(self.pins['PS']), 0)
-        # res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO08_On', 0)
-
-        self.checklog("use I2C as protocol", res)
+            config.voltage_source(src, voltage, -0.1, 2, True)
+        # i2c and interrupt pins
         mio_config = [0x00] * 16
         mio_config[self.pins['I2C_SCL'] - 1] = 0x00802005
         mio_config[self.pins['I2C_SDA'] - 1] = 0x00802004
         mio_config[self.pins['GND'] - 1] = 0x00000040  # CSB to GND to set slave addr to 0x53
         mio_config[self.pins['INT1'] - 1] = 0x00004000  # as input with pull down
         mio_config[self.pins['INT2'] - 1] = 0x00004000  # as input with pull down
-        res = self.utb.mio_load_config(1, mio_config)
-        self.checklog("configure I2C and interrupt pins", res)
-        res = res and self.utb.mio_activate_config(1, 0)
-        res = res and self.utb.mio_activate_config(3, 0)
-        res = self.utb.i2c_set_master_address(self.i2c_addr, 0, 1)
-        self.checklog("Setting I2C Address", res)
+        config.mio_setup(1, mio_config, activate=False)
+        config.set('mio_active', None, 3)
+        config.i2c_master_address(self.i2c_addr, 1)
+        # bank voltages
+        for bank in (1, 2):
+            config.bank_levels(bank, 0, voltage, 0.2 * voltage, 0.8 * voltage)
+        return config
 
-        
+    #configure the Sensor
+    @utb_connected
+    def configure(self):
+        # i2c
+        #res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO{:02d}_On'.format(self.pins['PS']), 0)
+        # res = self.utb.send_cmd_parse_answer('PWR_CFG_S4_MIO08_On', 0)
 
-        # bank voltages
-        res = self.utb.mio_set_low_level_out(1, 0, 0)
-        res = res and self.utb.mio_set_low_level_in(1, 0.2 * voltage, 0)
-        res = res and self.utb.mio_set_high_level_in(1, 0.8 * voltage, 0)
-        res = res and self.utb.mio_set_high_level_out(1, voltage, 0)
-        res = res and self.utb.mio_set_low_level_out(2, 0, 0)
-        res = res and self.utb.mio_set_low_level_in(2, 0.2 * voltage, 0)
-        res = res and self.utb.mio_set_high_level_in(2, 0.8 * voltage, 0)
-        res = res and self.utb.mio_set_high_level_out(2, voltage, 0)
-
-        self.checklog("Setting Pin I/O Voltage Levels", res)
+        # only settings differing from the current UTB configuration are sent
+        res = self.utb.apply(self.desired_config())
+        self.checklog("config VDD and VDDIO to 3.3V, I2C and interrupt pins, Pin I/O Voltage Levels", res)
         
 
     @utb_connected
@@ -749,13 +715,14 @@ class BMA280AccelerationMeasurementThread(QThread):
     def run(self):
         try:
             assert self.parent().utb.connected
-            while True:
-                acc = self.parent().getAcceleration(self.axis)
-                self.count += 1
-                acc['count'] = self.count
-                self.newValue.emit(acc)
-                print(str(self.count), end=' ', flush=True)
-                time.sleep(self.dt)
+            with self.parent().utb.priority(BsiPriority.Bulk):  # GUI actions first
+                while True:
+                    acc = self.parent().getAcceleration(self.axis)
+                    self.count += 1
+                    acc['count'] = self.count
+                    self.newValue.emit(acc)
+                    print(str(self.count), end=' ', flush=True)
+                    time.sleep(self.dt)
         except AssertionError as e:
             self.parent().checklog("UTB not connected", False)
 
@@ -783,13 +750,14 @@ class ADXL343AccelerationMeasurementThread(QThread):
     def run(self):
         try:
             assert self.parent().utb.connected
-            while True:
-                acc = self.parent().getAcceleration(self.axis)
-                self.count += 1
-                acc['count'] = self.count
-                self.newValue.emit(acc)
-                print(str(self.count), end=' ', flush=True)
-                time.sleep(self.dt)
+            with self.parent().utb.priority(BsiPriority.Bulk):  # GUI actions first
+                while True:
+                    acc = self.parent().getAcceleration(self.axis)
+                    self.count += 1
+                    acc['count'] = self.count
+                    self.newValue.emit(acc)
+                    print(str(self.count), end=' ', flush=True)
+                    time.sleep(self.dt)
         except AssertionError as e:
             self.parent().checklog("UTB not connected", False)
 
@@ -801,6 +769,7 @@ class ADXL343AccelerationMeasurementThread(QThread):
 class NTC(Sensor):
     device_type = "NTC"
     pwr_sources = 4
+    meas_step = "NTC"  # name of the ADC acquisition settings stored in the UTB
 
     def __init__(self, utb: BsiInstrument):
         
@@ -821,12 +790,17 @@ class NTC(Sensor):
         # config ADC
         res = self.utb.set_meas_range(0)
         self.checklog("set measurement range 0: 0 to 8V", res)
-        res = self.utb.set_wait_time(100)
-        self.checklog("set wait time after multiplexer set to 100ms", res)
-        res = self.utb.set_sample_count(1000)
-        self.checklog("set sample count to 1000", res)
-        res = self.utb.set_sample_frequency(1000)
-        self.checklog("set sample frequency to 1kHz", res)
+        if self.meas_step in self.utb.bsi_meas_steps:
+            # use averaging found by tune_averaging
+            res = self.utb.apply_meas_step(self.meas_step)
+            self.checklog("set tuned ADC acquisition " + str(self.utb.bsi_meas_steps[self.meas_step]), res)
+        else:
+            res = self.utb.set_wait_time(100)
+            self.checklog("set wait time after multiplexer set to 100ms", res)
+            res = self.utb.set_sample_count(1000)
+            self.checklog("set sample count to 1000", res)
+            res = self.utb.set_sample_frequency(1000)
+            self.checklog("set sample frequency to 1kHz", res)
         # config power source 3 as heater for 100 Ohm resistor
         res = self.utb.pwr_config_voltage_source(3, 0, 5, -2, 50, True)
         self.checklog(
@@ -835,14 +809,12 @@ class NTC(Sensor):
 
     @utb_connected
     def heater_on(self):
-        res = self.utb.pwr_set_closerelais(3, 0)
-        res = res and self.utb.pwr_set_onoff(3, 0, 1)
+        res = self.utb.pwr_sequence([(3, 'close', self.relay_settle_ms), (3, 'on', 0)], 0)
         self.checklog("turn heater on", res)
 
     @utb_connected
     def heater_off(self):
-        res = self.utb.pwr_set_onoff(3, 0, 0)
-        res = res and self.utb.pwr_set_openrelais(3, 0)
+        res = self.utb.pwr_sequence([(3, 'off', self.relay_settle_ms), (3, 'open', 0)], 0)
         self.checklog("turn heater off", res)
 
     @utb_connected
@@ -850,6 +822,19 @@ class NTC(Sensor):
         ans = self.utb.get_voltage('MIO12', 'MIO13')
         self.checklog("voltage at NTC in V = " + str(ans), bool(ans))
 
+    @utb_connected
+    def tune_averaging(self, target_std=0.001):
+        """
+        find the smallest sample count for the NTC voltage with a standard deviation <= target_std,
+        used by configure from now on
+        :param target_std: maximum standard deviation in V
+        :return: chosen sample count
+        """
+        ans, noise = self.utb.tune_sample_count('MIO12', 'MIO13', target_std, self.meas_step)
+        self.checklog("tuned sample count to " + str(ans) + " (noise in V: " + str(noise) + ")",
+                      ans is not None)
+        return ans
+
 
 class ZenerDiode(Sensor):
     device_type = "Zener"
@@ -877,5 +862,19 @@ class ZenerDiode(Sensor):
         res = self.utb.pwr_set_supply_voltage(self.pwr_sources[0], voltage, 0)
         self.checklog("set V=" + str(voltage) + "V", res)
 
+    @utb_connected
+    def sweep(self, voltages, settle_ms=0, cards=None):
+        """
+        measure IV curve of the diode
+        :param voltages: list of voltages to set
+        :param settle_ms: wait time in ms between setting voltage and measuring current
+        :param cards: list of cards to measure, None = all cards
+        :return: voltages as numpy array, currents in mA as numpy array (rows=voltages, columns=cards)
+        """
+        v, i = self.utb.pwr_sweep_voltage(self.pwr_sources[0], voltages, settle_ms, cards)
+        self.checklog("IV sweep with {} points from {}V to {}V".format(len(v), v[0], v[-1]) if len(v) else
+                      "IV sweep without points", len(v) > 0 and not np.isnan(i).all())
+        return v, i
+
 
 
@@ -0,0 +1,83 @@
+"""
+common fixtures: a local BSI stand-in (see benchmarks/stand_in.py) and an instrument connected to it
+"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SpektraBsi import BsiInstrument  # noqa: E402
+from benchmarks.stand_in import BsiStandIn  # noqa: E402
+
+
+class ScriptedStandIn(BsiStandIn):
+    """
+    stand-in with scripted answers and connection drops\n
+    * log: commands received in order
+    * script: command -> function(counter, params) returning the answer line (None = default answer)
+    * drop: commands closing the connection (once each) instead of answering
+    """
+
+    def __init__(self, nr_cards=2, latency=0.0):
+        self.log = list()
+        self.script = dict()
+        self.drop = set()
+        self.connections = list()
+        super().__init__(nr_cards, latency)
+
+    def _serve(self, connection):
+        self.connections.append(connection)
+        super()._serve(connection)
+
+    def answer(self, command, counter, params):
+        self.log.append(command)
+        if command in self.drop:
+            self.drop.discard(command)
+            # connections open now (a fast reconnect may connect while they are closed)
+            for connection in list(self.connections):
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            return ''
+        function = self.script.get(command)
+        if function is not None:
+            answer = function(counter, params)
+            if answer is not None:
+                return answer
+        return super().answer(command, counter, params)
+
+    def commands(self, prefix=''):
+        """
+        commands received starting with prefix
+        """
+        return [command for command in self.log if command.startswith(prefix)]
+
+
+def values(nr_cards, value):
+    """
+    answer values of nr_cards cards
+    """
+    return ','.join([str(value)] * nr_cards + [''] * (16 - nr_cards))
+
+
+@pytest.fixture
+def stand_in():
+    server = ScriptedStandIn()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def bsi(stand_in):
+    instrument = BsiInstrument()
+    instrument.bsi_timeout = 2.0
+    assert instrument.open_bsi(stand_in.address, stand_in.port)
+    stand_in.log.clear()
+    yield instrument
+    if instrument.connected:
+        instrument.disconnect()
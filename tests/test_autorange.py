@@ -0,0 +1,58 @@
+"""
+autorange measurements with remembered measuring range per net
+"""
+
+import pytest
+
+from SpektraBsi import BsiInstrument
+
+
+@pytest.mark.parametrize('value, meas_range', [
+    (3.3, 0), (7.2, 0), (7.9, 1), (12.0, 1), (-1.0, 0), (-1.9, 1), ([1.0, '', 7.5], 1), ([], None)])
+def test_fitting_meas_range_headroom(value, meas_range):
+    assert BsiInstrument._fitting_meas_range(value) == meas_range
+
+
+def test_unknown_net_measured_in_both_ranges(bsi, stand_in):
+    assert bsi.get_voltage_autorange('MIO01', 'Low1', 1) == 3.3
+    assert stand_in.log == ['MEAS_CFG_SetRange', 'MEAS_V_MIO01_Low1', 'MEAS_CFG_SetRange', 'MEAS_V_MIO01_Low1']
+    assert bsi.bsi_meas_range_memory[('MEAS_V_MIO01_Low1', '')] == 0
+
+
+def test_remembered_range_measures_once(bsi, stand_in):
+    bsi.get_voltage_autorange('MIO01', 'Low1', 1)
+    stand_in.log.clear()
+    assert bsi.get_voltage_autorange('MIO01', 'Low1', 0) == [3.3, 3.3] + [''] * 14
+    assert stand_in.log == ['MEAS_V_MIO01_Low1']
+    # other net remembered in the high range switches back
+    bsi.bsi_meas_range_memory[('MEAS_V_MIO02_Low1', '')] = 1
+    stand_in.voltage = 12.0
+    stand_in.log.clear()
+    assert bsi.get_voltage_autorange('MIO02', 'Low1', 1) == 12.0
+    assert stand_in.log == ['MEAS_CFG_SetRange', 'MEAS_V_MIO02_Low1']
+
+
+def test_remembered_range_out_of_band_measures_again(bsi, stand_in):
+    bsi.get_voltage_autorange('MIO01', 'Low1', 1)
+    stand_in.voltage = 12.0  # clipped to 8.2 V in the low range
+    stand_in.log.clear()
+    assert bsi.get_voltage_autorange('MIO01', 'Low1', 1) == 12.0
+    assert stand_in.log == ['MEAS_V_MIO01_Low1', 'MEAS_CFG_SetRange', 'MEAS_V_MIO01_Low1']
+    assert bsi.bsi_meas_range_memory[('MEAS_V_MIO01_Low1', '')] == 1
+    assert bsi.bsi_meas_range == 1
+
+
+def test_range_not_set(bsi, stand_in):
+    stand_in.script['MEAS_CFG_SetRange'] = lambda counter, params: 'O,' + counter + ',E,E' + ',' * 14 + '\n'
+    assert bsi.get_voltage_autorange('MIO01', 'Low1', 1) is None
+    assert stand_in.commands('MEAS_V_') == []
+    assert bsi.bsi_meas_range is None
+    assert bsi.bsi_meas_range_memory == dict()
+
+
+def test_clear_meas_range_memory(bsi, stand_in):
+    bsi.get_voltage_autorange_by_cmd('MEAS_V_MIO01_Low1', '', 1)
+    bsi.clear_meas_range_memory()
+    stand_in.log.clear()
+    bsi.get_voltage_autorange('MIO01', 'Low1', 1)
+    assert stand_in.commands('MEAS_V_') == ['MEAS_V_MIO01_Low1'] * 2  # high range first again
@@ -0,0 +1,45 @@
+"""
+benchmark comparison: counts against the versioned reference, wall times against a local baseline
+"""
+
+import json
+
+from benchmarks.__main__ import compare, main, DEFAULT_REFERENCE
+
+RESULT = {'wall_time_median': 0.010, 'wall_time_min': 0.009, 'rounds': 5,
+          'round_trips': 3, 'commands': 19, 'bytes_sent': 952, 'bytes_received': 262568}
+
+
+def test_reference_counts_only():
+    reference = {'dump': {'round_trips': 3, 'commands': 19, 'bytes_sent': 952, 'bytes_received': 262568}}
+    assert compare({'dump': dict(RESULT, wall_time_median=100.0)}, reference, 0.2) == []
+    regressions = compare({'dump': dict(RESULT, round_trips=4, bytes_received=262569)}, reference, 0.2)
+    assert regressions == ['dump: round trips 4 > 3', 'dump: bytes received 262569 > 262568']
+    assert compare({'other': RESULT}, reference, 0.2) == []
+
+
+def test_local_wall_times():
+    local = {'dump': {'wall_time_median': 0.010, 'wall_time_min': 0.009, 'rounds': 5}}
+    assert compare({'dump': dict(RESULT, wall_time_median=0.0119, round_trips=30)}, local, 0.2) == []
+    regressions = compare({'dump': dict(RESULT, wall_time_median=0.0121)}, local, 0.2)
+    assert regressions == ['dump: wall time 12.10 ms > 10.00 ms']
+
+
+def test_reference_has_no_wall_times():
+    with open(DEFAULT_REFERENCE) as file:
+        reference = json.load(file)
+    assert 'machine' not in reference
+    for result in reference['scenarios'].values():
+        assert set(result) == {'round_trips', 'commands', 'bytes_sent', 'bytes_received'}
+
+
+def test_save_and_compare(tmp_path, capsys):
+    reference, local = str(tmp_path / 'reference.json'), str(tmp_path / 'local.json')
+    args = ['-k', 'param_list', '--reference', reference, '--baseline', local]
+    assert main(args + ['--compare']) == 2  # no reference
+    assert main(args + ['--save-reference', '--save']) == 0
+    with open(local) as file:
+        assert set(json.load(file)['scenarios']['create_param_list_string']) == {'wall_time_median', 'wall_time_min',
+                                                                                 'rounds'}
+    assert main(args + ['--compare', '--tolerance', '100']) == 0
+    assert 'no regression against ' + reference + ' and ' + local in capsys.readouterr().out
@@ -0,0 +1,69 @@
+"""
+self calibration cached per card serial
+"""
+
+import json
+
+import pytest
+
+from conftest import values
+
+
+@pytest.fixture
+def calibrating(bsi, stand_in, tmp_path):
+    stand_in.script['CAL_ADCOffset'] = lambda counter, params: 'O,' + counter + ',' + values(2, 0.01) + '\n'
+    stand_in.script['CAL_ADCRef'] = lambda counter, params: 'O,' + counter + ',' + values(2, 2.5) + '\n'
+    bsi.bsi_calibration_cache_file = str(tmp_path / 'calibration.json')
+    return bsi
+
+
+EXPECTED = [[0.01, 0.01] + [''] * 14, [2.5, 2.5] + [''] * 14]
+
+
+def test_calibration_cached_in_session(calibrating, stand_in):
+    assert calibrating.bsi_calibrate(temperature=25.0) == EXPECTED
+    assert stand_in.log == ['CAL_ADCOffset', 'CAL_ADCRef']
+    with open(calibrating.bsi_calibration_cache_file) as file:
+        cache = json.load(file)
+    assert set(cache) == set(calibrating.bsi_card_serials)
+    stand_in.log.clear()
+    assert calibrating.bsi_calibrate(temperature=27.0) == EXPECTED
+    assert stand_in.log == []
+
+
+def test_calibrated_again_after_open(calibrating, stand_in):
+    calibrating.bsi_calibrate()
+    # power cycled BSI has the same serial numbers, cache is valid but not the calibration of the BSI
+    assert calibrating.open_bsi(stand_in.address, stand_in.port)
+    stand_in.log.clear()
+    calibrating.bsi_calibrate()
+    assert stand_in.log == ['CAL_ADCOffset', 'CAL_ADCRef']
+    assert calibrating.reconnect(fast=True)
+    stand_in.log.clear()
+    calibrating.bsi_calibrate()
+    assert stand_in.commands('CAL_') == ['CAL_ADCOffset', 'CAL_ADCRef']
+
+
+@pytest.mark.parametrize('change, calibrated', [
+    (dict(), False), (dict(max_age=0.0), True), (dict(temperature=40.0), True), (dict(force=True), True)])
+def test_stale_calibration(calibrating, stand_in, change, calibrated):
+    calibrating.bsi_calibrate(temperature=25.0)
+    stand_in.log.clear()
+    calibrating.bsi_calibrate(**dict(dict(temperature=25.0), **change))
+    assert (stand_in.log != []) == calibrated
+
+
+@pytest.mark.parametrize('content', [
+    '{broken', '[1, 2]', json.dumps({'256': {'offset': 0.01, 'ref': 2.5}, '257': {'offset': 0.01, 'ref': 2.5}}),
+    json.dumps({'256': {'time': 'now', 'temperature': 25.0, 'offset': 0.01, 'ref': 2.5}}), json.dumps({'256': 1.0}),
+    json.dumps({'256': {'time': 1e12, 'temperature': 'warm', 'offset': 0.01, 'ref': 2.5}}),
+])
+def test_malformed_cache_is_a_miss(calibrating, stand_in, content):
+    calibrating.bsi_calibrated = True  # only the cache decides
+    with open(calibrating.bsi_calibration_cache_file, 'w') as file:
+        file.write(content)
+    assert calibrating.bsi_calibrate(temperature=25.0) == EXPECTED
+    assert stand_in.log == ['CAL_ADCOffset', 'CAL_ADCRef']
+    with open(calibrating.bsi_calibration_cache_file) as file:
+        cache = json.load(file)
+    assert cache['256']['offset'] == 0.01 and cache['257']['ref'] == 2.5
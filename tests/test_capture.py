@@ -0,0 +1,57 @@
+"""
+logic analyzer capture of MIO input states
+"""
+
+import numpy as np
+
+from SpektraBsi import BsiMioCapture
+
+
+def test_capture_edges(bsi, stand_in):
+    samples = list()
+
+    def toggle(counter, params):
+        samples.append(counter)
+        state = '0003' if len(samples) % 4 in (1, 2) else '0002'  # MIO1 toggles every 2 samples, MIO2 high
+        return 'O,' + counter + ',' + state + ',0000' + ',' * 14 + '\n'
+
+    stand_in.script['DIG_GetMIOState'] = toggle
+    capture = bsi.mio_capture(10.0, card_select=1, max_samples=40, depth=8)
+    assert len(capture) == 40 and len(samples) == 40  # stops at max_samples, not duration
+    assert (np.diff(capture.timestamps) >= 0).all() and capture.timestamps[0] >= 0
+    assert capture.pin(1).tolist() == [1, 1, 0, 0] * 10
+    assert (capture.pin(2) == 1).all()
+    edges = capture.edges(1)
+    assert [level for timestamp, level in edges] == [0, 1] * 9 + [0]
+    assert capture.edges(2) == []
+
+
+def test_capture_duration(bsi, stand_in):
+    stand_in.latency = 0.001
+    capture = bsi.mio_capture(0.05, card_select=2, max_samples=100000, depth=4)
+    assert 0 < len(capture) < 100000
+    assert capture.timestamps[-1] < 0.5
+    assert (capture.states == 0x0005).all()
+
+
+def test_capture_card_without_values(bsi):
+    assert len(bsi.mio_capture(1.0, card_select=3, max_samples=10)) == 0
+
+
+def test_capture_stops_on_error_answer(bsi, stand_in):
+    samples = list()
+
+    def fail(counter, params):
+        samples.append(counter)
+        return 'E,' + counter + ',error\n' if len(samples) == 5 else None
+
+    stand_in.script['DIG_GetMIOState'] = fail
+    capture = bsi.mio_capture(10.0, card_select=1, max_samples=1000, depth=4)
+    assert len(capture) < 10 and len(samples) < 10
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']  # stream in sync after the stop
+
+
+def test_capture_result():
+    capture = BsiMioCapture(np.array([0.0, 0.1, 0.2]), np.array([0x8000, 0, 0x8000], dtype=np.uint16))
+    assert capture.pin(16).tolist() == [1, 0, 1]
+    assert capture.edges(16) == [(0.1, 0), (0.2, 1)]
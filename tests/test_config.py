@@ -0,0 +1,117 @@
+"""
+configuration snapshot, diff and minimal apply, MIO outputs
+"""
+
+import pytest
+
+from SpektraBsi import BsiConfig, BsiProcessingError
+from conftest import values
+
+
+def test_apply_sends_only_differences(bsi, stand_in):
+    config = BsiConfig().voltage_source(1, 3.3, -1, 10, True)
+    assert bsi.apply(config)
+    assert len(stand_in.log) == 5
+    assert bsi.diff(config) == dict()
+    stand_in.log.clear()
+    assert bsi.apply(config)
+    assert stand_in.log == []
+    assert bsi.apply(BsiConfig().voltage_source(1, 2.5, -1, 10, True))
+    assert stand_in.log == ['PWR_CFG_SetV1']
+
+
+def test_apply_stops_dependent_settings_of_failed_card(bsi, stand_in):
+    # voltage mode fails on card 2
+    stand_in.script['PWR_CFG_VoltageMode3'] = lambda counter, params: 'O,' + counter + ',O,E' + ',' * 14 + '\n'
+    assert not bsi.apply(BsiConfig().voltage_source(3, 3.3, -1, 10, True))
+    # the others are sent for card 1 only
+    assert stand_in.commands('PWR_CFG_SetV3') == ['PWR_CFG_SetV3']
+    assert bsi.bsi_config_state[('pwr_voltage', 3, 1)] == 3.3
+    assert ('pwr_voltage', 3, 2) not in bsi.bsi_config_state
+    assert ('pwr_mode', 3, 2) not in bsi.bsi_config_state
+
+
+def test_apply_error_answer_tracked_then_raised(bsi, stand_in):
+    stand_in.script['PWR_CFG_VoltageMode4'] = lambda counter, params: 'E,' + counter + ',failed\n'
+    with pytest.raises(BsiProcessingError):
+        bsi.apply(BsiConfig().voltage_source(4, 3.3, -1, 10, True).bank_levels(1, 0, 3.3, 0.5, 2.5))
+    # voltage is not set after the mode failed, independent settings are sent and tracked
+    assert stand_in.commands('PWR_CFG_Set') == []
+    assert stand_in.commands('PWR_CFG_IM') == []
+    assert bsi.bsi_config_state[('pwr_sense', 4, 1)] is True
+    assert ('pwr_mode', 4, 1) not in bsi.bsi_config_state
+    assert bsi.bsi_config_state[('level_out_high', 1, 2)] == 3.3
+
+
+def test_apply_does_not_activate_failed_mio_setup(bsi, stand_in):
+    stand_in.script['DIG_CFG_LoadMIOSetup2'] = lambda counter, params: 'O,' + counter + ',E' + ',' * 15 + '\n'
+    assert not bsi.apply(BsiConfig().mio_setup(2, [0x40] * 16))
+    assert stand_in.commands('DIG_CFG_Activate') == []
+
+
+def test_snapshot_and_diff(bsi):
+    config = BsiConfig().voltage_source(1, 3.3, -1, 10, True, card_select=2)
+    changes = bsi.diff(config)
+    assert changes[('pwr_voltage', 1, 2)] == (None, 3.3) and len(changes) == 5
+    assert bsi.apply(config)
+    snapshot = bsi.snapshot()
+    assert snapshot.settings[('pwr_mode', 1, 2)] == 'voltage'
+    assert ('pwr_mode', 1, 1) not in snapshot.settings
+    assert bsi.diff(snapshot) == dict()
+    with pytest.raises(ValueError):
+        BsiConfig().set('unknown', 1, 0)
+
+
+def test_mio_write_outputs_needs_known_set(bsi, stand_in):
+    # all MIOs outputs (version + spare, 16 MIOs)
+    stand_in.script['DIG_CFG_GetActivateMIOSetup'] = lambda counter, params: 'O,' + counter + ',' + values(
+        2, '00000001' + '00000000' * 6 + '00000040' * 16) + '\n'
+    with pytest.raises(BsiProcessingError):
+        bsi.mio_write_outputs(1, 1, 0)
+    assert stand_in.log == []
+    assert bsi.mio_write_outputs(1, 1, 1, config_number=5)
+    assert stand_in.commands('DIG_CFG_LoadMIOSetup') == ['DIG_CFG_LoadMIOSetup5']
+
+
+def test_mio_write_outputs_one_load_per_set(bsi, stand_in):
+    assert bsi.apply(BsiConfig().mio_setup(3, [0x40] * 16))
+    stand_in.log.clear()
+    assert bsi.mio_write_outputs(0x3, 0x1, 0)
+    assert stand_in.log == ['DIG_CFG_LoadMIOSetup3', 'DIG_CFG_ActivateMIOSetup3']
+    assert bsi.bsi_mio_configs[2] == (3, [0x41] + [0x40] * 15)
+    stand_in.log.clear()
+    assert bsi.mio_write_outputs(0x3, 0x1, 0)  # nothing changed
+    assert stand_in.log == []
+
+
+def test_mio_write_outputs_rejects_different_outputs_in_one_set(bsi, stand_in):
+    assert bsi.apply(BsiConfig().mio_setup(3, [0x40] * 16))
+    assert bsi.mio_write_outputs(0x1, 0x1, 1)
+    stand_in.log.clear()
+    # card 1 has MIO1 high, card 2 not: both in set 3, setting MIO2 needs two different sets
+    assert not bsi.mio_write_outputs(0x2, 0x2, 0)
+    assert stand_in.log == []
+
+
+def test_mio_set_output_never_uses_card_as_set(bsi, stand_in):
+    stand_in.script['DIG_CFG_GetActivateMIOSetup'] = lambda counter, params: 'O,' + counter + ',' + values(
+        2, '00000001' + '00000000' * 6 + '00000040' * 16) + '\n'
+    with pytest.raises(BsiProcessingError):
+        bsi.mio_set_output_high(1, 2)
+    assert stand_in.log == []
+    assert bsi.mio_set_output_high(1, 2, config_number=7)
+    assert stand_in.commands('DIG_CFG_') == ['DIG_CFG_GetActivateMIOSetup', 'DIG_CFG_LoadMIOSetup7',
+                                             'DIG_CFG_ActivateMIOSetup7']
+    # active set is known now
+    stand_in.log.clear()
+    assert bsi.mio_set_output_low(1, 2)
+    assert stand_in.log == ['DIG_CFG_LoadMIOSetup7', 'DIG_CFG_ActivateMIOSetup7']
+    assert bsi.bsi_mio_configs[2] == (7, [0x40] * 16)
+
+
+def test_mio_set_output_uses_applied_set(bsi, stand_in):
+    assert bsi.apply(BsiConfig().mio_setup(4, [0x40] * 16))
+    stand_in.log.clear()
+    assert bsi.mio_set_output_high(16, 1)
+    assert stand_in.log == ['DIG_CFG_LoadMIOSetup4', 'DIG_CFG_ActivateMIOSetup4']
+    assert bsi.bsi_mio_configs[1] == (4, [0x40] * 15 + [0x41])
@@ -0,0 +1,89 @@
+"""
+answer decoders, parameter list and frame template caches, hex payloads
+"""
+
+import numpy as np
+import pytest
+
+from SpektraBsi import BsiInstrument
+
+
+@pytest.fixture
+def instrument():
+    bsi = BsiInstrument()
+    bsi.bsi_nr_cards = 2
+    return bsi
+
+
+@pytest.mark.parametrize('answer, convert_to_type, card_select, nibbles, expected', [
+    ('O,001,1,2,,,,,,,,,,,,,,\n', int, 0, 2, [1, 2] + [''] * 14),
+    ('O,001,1.5,-2.25,,,,,,,,,,,,,,\n', float, 2, 2, -2.25),
+    ('O,001,O,E,,,,,,,,,,,,,,\n', bool, 0, 2, [True, False] + [''] * 14),
+    ('O,001,O,O,,,,,,,,,,,,,,\n', 'andbool', 0, 2, True),
+    ('O,001,O,E,,,,,,,,,,,,,,\n', 'andbool', 0, 2, False),
+    ('O,001,0A,0B0C,,,,,,,,,,,,,,\n', hex, 0, 2, [10, [11, 12]] + [''] * 14),
+    ('O,001,0005,,,,,,,,,,,,,,,\n', hex, 1, 4, 5),
+    ('O,001,00010002,,,,,,,,,,,,,,,\n', hex, 1, 4, [1, 2]),
+    ('O,001,0102FF,,,,,,,,,,,,,,,\n', bytearray, 1, 2, bytearray(b'\x01\x02\xff')),
+    ('O,001,,,,,,,,,,,,,,,,\n', float, 1, 2, ''),
+])
+def test_parse_answer(instrument, answer, convert_to_type, card_select, nibbles, expected):
+    assert instrument._parse_answer(answer, 2, convert_to_type, card_select, nibbles) == expected
+
+
+def test_decode_hex_buffer():
+    assert BsiInstrument._decode_hex_buffer('0A0B0', 2) == bytearray(b'\x0a\x0b')  # incomplete value ignored
+    words = BsiInstrument._decode_hex_buffer('FFFF0001', 4)
+    assert isinstance(words, np.ndarray) and words.tolist() == [0xFFFF, 1]
+    assert BsiInstrument._decode_hex_buffer('ABCDEF', 3) == [0xABC, 0xDEF]
+
+
+def test_hex_decoder_returns_python_int(instrument):
+    # numpy scalars would leak into the results of the callers
+    res = instrument._parse_answer('O,001,00010002,,,,,,,,,,,,,,,\n', 2, hex, 1, 4)
+    assert all(type(elem) is int for elem in res)
+
+
+def test_unknown_decoder(instrument):
+    assert instrument._parse_answer('O,001,1,,,,,,,,,,,,,,,\n', 2, 'unknown', 1) is None
+
+
+def test_param_list_cache():
+    first = BsiInstrument._create_param_list_string(1023, 0, 3, True)
+    assert first == '0,0,03ff,' + ','.join(['0'] * 13)
+    assert BsiInstrument._create_param_list_string(1023, 0, 3, True) is first
+    # value 1 and True are equal keys for dict, but create different lists
+    assert BsiInstrument._create_param_list_string(1, 0, 0, False) == ','.join(['1'] * 16)
+    assert BsiInstrument._create_param_list_string(True, 0, 0, False) == ','.join(['True'] * 16)
+    # lists are not hashable, but allowed as value
+    assert BsiInstrument._create_param_list_string([1], 0, 1, False).startswith('[1],0')
+
+
+def test_param_list_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(BsiInstrument, 'bsi_param_lists', dict())
+    monkeypatch.setattr(BsiInstrument, 'bsi_template_cache_size', 8)
+    for value in range(20):
+        BsiInstrument._create_param_list_string(value, 0, 1, False)
+    assert len(BsiInstrument.bsi_param_lists) <= 8
+    long_value = 'A5' * 1000
+    BsiInstrument._create_param_list_string(long_value, '', 1, False)
+    assert all(key[1] != long_value for key in BsiInstrument.bsi_param_lists)
+
+
+def test_frame_template(instrument, monkeypatch):
+    monkeypatch.setattr(BsiInstrument, 'bsi_frame_templates', dict())
+    instrument.bsi_cmd_counter = 998
+    assert instrument._build_frame('SYS_IDN') == b'SYS_IDN,999\n'
+    assert instrument._build_frame('MEAS_I_1', '1,0') == b'MEAS_I_1,001,1,0\n'  # counter wraps to 1
+    assert ('MEAS_I_1', '1,0') in BsiInstrument.bsi_frame_templates
+    data = 'A5' * 1000
+    assert instrument._build_frame('DIG_I2C1_Write', data) == b'DIG_I2C1_Write,002,' + bytes(data, 'utf-8') + b'\n'
+    assert ('DIG_I2C1_Write', data) not in BsiInstrument.bsi_frame_templates
+
+
+@pytest.mark.parametrize('data, expected', [
+    ([0x01, 0xAB], '01ab'), (bytearray(b'\x00\xff'), '00ff'), (memoryview(b'\x10'), '10'),
+    (['A', 0x42], '4142'), ([0x123], '123'),
+])
+def test_list_to_hex_string(data, expected):
+    assert BsiInstrument._list_to_hex_string(data) == expected
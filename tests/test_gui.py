@@ -0,0 +1,69 @@
+"""
+instrument calls of the GUI in the background thread (gui.py)
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from SpektraBsi import BsiPriority, BsiProcessingError  # noqa: E402
+from gui import BackgroundCall, run_in_background  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def wait_for(app, condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        app.processEvents()
+        time.sleep(0.001)
+    return condition()
+
+
+def test_result_in_gui_thread(app, bsi):
+    results = list()
+    threads = list()
+
+    def call():
+        threads.append(threading.current_thread())
+        return bsi._current_priority(), bsi.get_id()
+
+    run_in_background(bsi, call, finished=lambda res: results.append((threading.current_thread(), res)))
+    assert wait_for(app, lambda: results)
+    assert threads[0] is not threading.main_thread()
+    assert results == [(threading.main_thread(), (BsiPriority.Interactive, ['BSI STAND-IN', 'V1.0']))]
+    assert not BackgroundCall.running
+
+
+def test_calls_in_order_of_start(app, bsi):
+    results = list()
+    for value in range(10):
+        run_in_background(bsi, lambda value=value: value, finished=results.append)
+    assert wait_for(app, lambda: len(results) == 10)
+    assert results == list(range(10))
+
+
+def test_error_reported(app, bsi, monkeypatch):
+    def fail():
+        raise BsiProcessingError('E,001,failed')
+
+    events = list()
+    run_in_background(bsi, fail, finished=lambda res: events.append(('finished', res)),
+                      failed=lambda text: events.append(('failed', text)))
+    assert wait_for(app, lambda: len(events) == 2)
+    assert events == [('failed', 'BsiProcessingError: E,001,failed'), ('finished', None)]
+    # default: error handler of the main window
+    errors = list()
+    monkeypatch.setattr(BackgroundCall, 'error_handler', errors.append)
+    run_in_background(bsi, fail)
+    assert wait_for(app, lambda: errors)
+    assert errors == ['BsiProcessingError: E,001,failed']
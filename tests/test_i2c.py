@@ -0,0 +1,103 @@
+"""
+I2C frames: buffer path, chunked reads (opt-in), transfer timeouts
+"""
+
+import pytest
+
+from SpektraBsi import BsiI2c, BsiProcessingError
+
+
+def test_read_frame_as_list_and_buffer(bsi):
+    assert bsi.i2c_read_frame(0x18, 4, 1, 1) == [0xA5] * 4
+    assert bsi.i2c_read_frame(0x18, 4, 1, 1, as_buffer=True) == bytearray(b'\xa5' * 4)
+    frames = bsi.i2c_read_frame(0x18, 2, 0, 1, as_buffer=True)
+    assert frames[:2] == [bytearray(b'\xa5\xa5')] * 2 and frames[2:] == [''] * 14
+
+
+def test_bsi_i2c_returns_buffer(bsi):
+    i2c = BsiI2c(bsi, 1, 1)
+    assert i2c.read(0x18, 3) == bytearray(b'\xa5' * 3)
+    assert i2c.write_read(0x50, bytearray(2), 3) == bytearray(b'\xa5' * 3)
+
+
+def test_write_frame_from_buffer(bsi, stand_in):
+    params = list()
+    stand_in.script['DIG_I2C1_Write'] = lambda counter, params_: params.append(params_) or None
+    assert bsi.i2c_write_frame(0x50, bytearray(b'\x00\x10\xff'), 1, 1)
+    assert '0010ff' in ','.join(params[0]).lower()
+
+
+def test_no_chunks_by_default(bsi, stand_in):
+    assert bsi.bsi_i2c_chunk_size == 0
+    assert len(bsi.i2c_read_frame(0x50, 10000, 1, 1, as_buffer=True)) == 10000
+    assert stand_in.commands('DIG_I2C1_Read') == ['DIG_I2C1_Read']
+
+
+def test_chunked_write_read(bsi, stand_in):
+    res = bsi.i2c_write_read_frame(0x50, [0, 0], 10000, 1, 1, as_buffer=True, chunk_size=4096)
+    assert res == bytearray(b'\xa5' * 10000)
+    # address is written once, the following chunks continue reading
+    assert stand_in.commands('DIG_I2C1_WriteRead') == ['DIG_I2C1_WriteRead']
+    assert stand_in.commands('DIG_I2C1_Read') == ['DIG_I2C1_Read'] * 2
+    assert stand_in.commands('DIG_I2C1_CFG_SetReadFrameLength') == ['DIG_I2C1_CFG_SetReadFrameLength'] * 2
+
+
+def test_chunked_read_all_cards(bsi):
+    bsi.bsi_i2c_chunk_size = 1000
+    res = bsi.i2c_read_frame(0x50, 2500, 0, 1)
+    assert res[0] == [0xA5] * 2500 and res[1] == [0xA5] * 2500 and res[2] == ''
+
+
+def test_chunk_error_answer_stops_sequence(bsi, stand_in):
+    reads = list()
+
+    def fail_second(counter, params):
+        reads.append(counter)
+        return 'E,' + counter + ',nack\n' if len(reads) == 2 else None
+
+    stand_in.script['DIG_I2C1_Read'] = fail_second
+    with pytest.raises(BsiProcessingError):
+        bsi.i2c_read_frame(0x50, 10 * 100, 1, 1, chunk_size=100)
+    assert len(reads) < 10  # remaining chunks are not sent
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']
+
+
+def test_throughput_moving_average(bsi):
+    bsi.bsi_i2c_throughput = 1e12  # far off, one transfer must not replace it
+    bsi.i2c_read_frame(0x50, 2000, 1, 1, chunk_size=1000)
+    assert 0.85e12 < bsi.bsi_i2c_throughput < 0.95e12
+
+
+def test_transfer_timeout_restored(bsi):
+    bsi.bsi_i2c_throughput = 1000.0
+    with bsi._transfer_timeout(10000):
+        assert bsi.get_timeout() == pytest.approx(bsi.bsi_timeout + bsi.bsi_transfer_safety * 10.0)
+    assert bsi.get_timeout() == bsi.bsi_timeout
+
+
+def test_throughput_measured_without_chunks(bsi, stand_in):
+    assert bsi.bsi_i2c_chunk_size == 0
+    bsi.bsi_i2c_throughput = 1e12
+    bsi.i2c_read_frame(0x50, 4096, 1, 1, as_buffer=True)
+    assert bsi.bsi_i2c_throughput < 0.95e12
+    throughput = bsi.bsi_i2c_throughput
+    bsi.i2c_write_read_frame(0x50, [0, 0], 2048, 1, 1)
+    assert bsi.bsi_i2c_throughput < throughput
+    assert stand_in.commands('DIG_I2C1_Read') == ['DIG_I2C1_Read']  # one read each, no chunks
+
+
+def test_small_reads_not_measured(bsi):
+    bsi.bsi_i2c_throughput = 1e12
+    bsi.i2c_read_frame(0x50, 16, 1, 1)
+    bsi.i2c_write_read_frame(0x50, [0], 16, 1, 1)
+    assert bsi.bsi_i2c_throughput == 1e12
+
+
+def test_timeout_follows_measured_throughput(bsi, stand_in):
+    stand_in.latency = 0.05  # slow instrument: 4096 bytes in >= 50 ms
+    bsi.bsi_i2c_throughput_weight = 1.0
+    bsi.i2c_read_frame(0x50, 4096, 1, 1)
+    assert bsi.bsi_i2c_throughput < 4096 / 0.05
+    with bsi._transfer_timeout(100000):
+        assert bsi.get_timeout() > bsi.bsi_timeout + bsi.bsi_transfer_safety * 100000 * 0.05 / 4096 * 0.99
+
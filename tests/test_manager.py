@@ -0,0 +1,128 @@
+"""
+BsiInstrumentManager: many instruments in one event loop thread
+"""
+
+import pytest
+
+from SpektraBsi import BsiInstrumentManager, BsiConfig, BsiProcessingError, BsiConnectionError
+from conftest import ScriptedStandIn
+
+
+@pytest.fixture
+def manager():
+    manager = BsiInstrumentManager(timeout=1.0)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def racks(manager):
+    stand_ins = [ScriptedStandIn() for ind in range(3)]
+    instruments = [manager.add(stand_in.address, stand_in.port) for stand_in in stand_ins]
+    # commands are answered in order, the serialnumbers are known after the first answer
+    for instrument in instruments:
+        manager.submit(instrument, 'SYS_IDN').result()
+    yield list(zip(instruments, stand_ins))
+    for stand_in in stand_ins:
+        stand_in.close()
+
+
+def test_instruments_connected(manager, racks):
+    for instrument, stand_in in racks:
+        assert instrument.connected
+        assert instrument.bsi_nr_cards == 2
+        assert instrument.get_id() == ['BSI STAND-IN', 'V1.0']
+    assert set(manager.instruments()) == {instrument for instrument, stand_in in racks}
+
+
+def test_submit_all(manager, racks):
+    futures = manager.submit_all('MEAS_I_1')
+    assert len(futures) == 3
+    assert all(future.result().startswith('O,') for future in futures.values())
+
+
+def test_pipelined_answers_in_order(manager, racks):
+    instrument, stand_in = racks[0]
+    futures = [manager.submit(instrument, 'MEAS_V_MIO{:02d}_Low1_Sense'.format(pin)) for pin in range(1, 17)]
+    counters = [int(future.result().split(',')[1]) for future in futures]
+    assert counters == sorted(counters)
+
+
+def test_error_answer(manager, racks):
+    instrument, stand_in = racks[0]
+    stand_in.script['BAD'] = lambda counter, params: 'E,' + counter + ',unknown\n'
+    with pytest.raises(BsiProcessingError):
+        manager.submit(instrument, 'BAD').result()
+    assert instrument.get_id() == ['BSI STAND-IN', 'V1.0']
+
+
+def test_timeout_closes_connection(manager, racks):
+    instrument, stand_in = racks[1]
+    stand_in.latency = 2 * manager.timeout
+    with pytest.raises(BsiConnectionError):
+        manager.submit(instrument, 'SYS_IDN').result(5.0)
+    # instrument is not reconnected, the others are not affected
+    with pytest.raises(BsiConnectionError):
+        manager.submit(instrument, 'SYS_IDN').result(1.0)
+    assert racks[0][0].get_id() == ['BSI STAND-IN', 'V1.0']
+
+
+def test_callback_waits_for_other_command(manager, racks):
+    instrument, stand_in = racks[0]
+    results = list()
+
+    def next_query(future):
+        results.append(manager.submit(instrument, 'SYS_GetBSISnr').result(2.0))
+
+    first = manager.submit(instrument, 'SYS_IDN')
+    first.add_done_callback(next_query)
+    first.result()
+    manager.submit(racks[1][0], 'SYS_IDN').result(3.0)  # completion thread is not blocked
+    assert len(results) == 1 and results[0].startswith('O,')
+
+
+def test_managed_instrument_methods(manager, racks):
+    instrument, stand_in = racks[2]
+    assert instrument.i2c_read_frame(0x50, 16, 1, 1) == [0xA5] * 16
+    assert instrument.get_timeout() == manager.timeout
+    with pytest.raises(BsiProcessingError):
+        instrument.set_timeout(10.0)
+    with pytest.raises(BsiProcessingError):
+        instrument._query_pipelined([('SYS_IDN', ''), ('SYS_IDN', '')])
+    with pytest.raises(BsiProcessingError):
+        instrument.apply(BsiConfig().voltage_source(1, 3.3, -1, 10, True))  # pipelined
+
+
+def test_managed_transfer_exceeding_timeout(manager, racks):
+    instrument, stand_in = racks[2]
+    instrument.bsi_i2c_throughput = 1000.0
+    with pytest.raises(BsiProcessingError):
+        instrument.i2c_read_frame(0x50, 10000, 1, 1)
+    assert stand_in.commands('DIG_I2C1_Read') == []
+
+
+def test_remove(manager, racks):
+    instrument, stand_in = racks[0]
+    manager.remove(instrument)
+    assert instrument not in manager.instruments()
+    with pytest.raises(BsiConnectionError):
+        manager.submit(instrument, 'SYS_IDN').result()
+
+
+def test_close():
+    stand_in = ScriptedStandIn(latency=0.5)
+    manager = BsiInstrumentManager(timeout=5.0)
+    instrument = manager.add(stand_in.address, stand_in.port)
+    future = manager.submit(instrument, 'SYS_IDN')
+    manager.close()
+    with pytest.raises(BsiConnectionError):
+        future.result(1.0)  # not answered yet
+    assert not manager.thread.is_alive() and not manager.completion_thread.is_alive()
+    stand_in.close()
+
+
+def test_managed_instrument_deleted(manager, racks):
+    instrument, stand_in = racks[0]
+    assert instrument.connected and instrument.bsi_socket is None
+    instrument.__del__()  # no AttributeError on garbage collection / shutdown
+    assert instrument.connected
@@ -0,0 +1,74 @@
+"""
+ADC acquisition settings: sample count tuning and measurement steps
+"""
+
+import pytest
+
+from conftest import values
+
+
+@pytest.fixture
+def noisy(stand_in):
+    """
+    voltage noise decreasing with the sample count, returns the sample counts set
+    """
+    counts = list()
+    measures = list()
+
+    def set_count(counter, params):
+        counts.append(int(params[0]))
+        return None
+
+    def measure(counter, params):
+        measures.append(counter)
+        sign = 1 if len(measures) % 2 else -1
+        return 'O,' + counter + ',' + values(2, 3.3 + sign / (counts[-1] if counts else 1000)) + '\n'
+
+    stand_in.script['MEAS_CFG_SetSampleCnt'] = set_count
+    stand_in.script['MEAS_V_MIO01_Low1'] = measure
+    return counts
+
+
+def test_smallest_count_meeting_target(bsi, noisy):
+    chosen, noise = bsi.tune_sample_count('MIO01', 'Low1', 0.03, step='fast')
+    assert chosen == 50
+    assert list(noise) == [10, 20, 50] and noise[50] <= 0.03 < noise[20]
+    assert noisy == [10, 20, 50]
+    assert bsi.bsi_meas_steps['fast']['sample_count'] == 50
+    assert bsi.bsi_meas_settings['sample_count'] == 50
+
+
+def test_target_not_reached(bsi, noisy):
+    chosen, noise = bsi.tune_sample_count('MIO01', 'Low1', 1e-6, sample_counts=(20, 10))
+    assert chosen == 20 and noisy == [10, 20]
+
+
+def test_count_restored_after_missing_values(bsi, stand_in, noisy):
+    measure = stand_in.script['MEAS_V_MIO01_Low1']
+    stand_in.script['MEAS_V_MIO01_Low1'] = lambda counter, params: measure(counter, params) if not noisy or noisy[-1] < 20 \
+        else 'O,' + counter + ',' + values(0, '') + '\n'
+    chosen, noise = bsi.tune_sample_count('MIO01', 'Low1', 0.03)
+    assert chosen == 10 and list(noise) == [10]
+    assert noisy == [10, 20, 10]  # instrument measures with the returned count
+    assert bsi.bsi_meas_settings['sample_count'] == 10
+
+
+def test_count_restored_after_failed_set(bsi, stand_in, noisy):
+    set_count = stand_in.script['MEAS_CFG_SetSampleCnt']
+    stand_in.script['MEAS_CFG_SetSampleCnt'] = lambda counter, params: set_count(counter, params) or (
+        'O,' + counter + ',' + values(2, 'E') + '\n' if params[0] == '20' else None)
+    chosen, noise = bsi.tune_sample_count('MIO01', 'Low1', 0.03, step='fast')
+    assert chosen == 10 and noisy == [10, 20, 10]
+    assert bsi.bsi_meas_steps['fast']['sample_count'] == 10
+
+
+def test_apply_meas_step_sends_differences(bsi, stand_in, noisy):
+    bsi.tune_sample_count('MIO01', 'Low1', 0.03, step='fast')
+    bsi.tune_sample_count('MIO01', 'Low1', 1.0, step='slow')
+    stand_in.log.clear()
+    assert bsi.apply_meas_step('fast')
+    assert stand_in.log == ['MEAS_CFG_SetSampleCnt'] and noisy[-1] == 50
+    stand_in.log.clear()
+    assert bsi.apply_meas_step('fast')
+    assert stand_in.log == []
+    assert not bsi.apply_meas_step('unknown')
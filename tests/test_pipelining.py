@@ -0,0 +1,193 @@
+"""
+pipelined queries, command counter validation, retries after reconnect, worker thread
+"""
+
+import gc
+import threading
+import time
+import weakref
+
+import pytest
+
+from SpektraBsi import BsiInstrument, BsiProcessingError, BsiConnectionError, BsiPriority
+
+
+def test_pipelined_answers_in_order(bsi, stand_in):
+    commands = [('MEAS_V_MIO{:02d}_Low1_Sense'.format(pin), '') for pin in range(1, 17)] + [('SYS_IDN', '')]
+    with bsi.profile('pipelined') as profile:
+        answers = bsi._query_pipelined(commands)
+    assert len(answers) == len(commands)
+    assert answers[-1].split(',')[2] == 'BSI STAND-IN'
+    assert profile.round_trips == 1
+    assert stand_in.commands() == [command for command, params in commands]
+
+
+def test_pipelined_error_answer_raises_after_all_answers(bsi, stand_in):
+    stand_in.script['BAD'] = lambda counter, params: 'E,' + counter + ',unknown\n'
+    with pytest.raises(BsiProcessingError):
+        bsi._query_pipelined([('BAD', ''), ('SYS_IDN', '')])
+    # stream stays in order, the next query gets its own answer
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']
+    answers = bsi._query_pipelined([('BAD', ''), ('SYS_IDN', '')], False)
+    assert answers[0].startswith('E') and answers[1].startswith('O')
+
+
+def test_warm_start_reads_card_serials_only(bsi, stand_in):
+    other = BsiInstrument()
+    assert other.open_bsi(stand_in.address, stand_in.port, use_cache=True)
+    assert stand_in.log == ['SYS_GetBSISnr']
+    assert other.get_id() == ['BSI STAND-IN', 'V1.0'] and other.bsi_nr_cards == 2
+    other.disconnect()
+
+
+def test_fast_reconnect_forgets_state(bsi):
+    bsi.pwr_sweep_voltage(3, [1.0], 0, [1])
+    assert bsi.bsi_config_state
+    assert bsi.reconnect(fast=True)
+    assert bsi.bsi_config_state == dict()
+    assert bsi.bsi_meas_range is None
+    assert bsi.bsi_mio_configs == dict()
+
+
+def test_idempotent_command_repeated_after_reconnect(bsi, stand_in):
+    stand_in.drop.add('MEAS_I_1')
+    assert bsi._query('MEAS_I_1').startswith('O')
+    assert stand_in.commands('MEAS_I_1') == ['MEAS_I_1', 'MEAS_I_1']
+    assert stand_in.commands('SYS_GetBSISnr') == ['SYS_GetBSISnr']  # fast reconnect, one round trip
+
+
+@pytest.mark.parametrize('command', ['PWR_On1', 'SYS_I2CExt_Read', 'DIG_I2C1_Read', 'DIG_I2C2_WriteRead'])
+def test_destructive_command_not_repeated(bsi, stand_in, command):
+    stand_in.drop.add(command)
+    with pytest.raises(BsiConnectionError):
+        bsi.submit(command, '').result()
+    assert stand_in.commands(command) == [command]
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']  # reconnected
+
+
+def test_is_idempotent():
+    bsi = BsiInstrument()
+    assert bsi._is_idempotent('MEAS_V_MIO01_Low1_Sense')
+    assert bsi._is_idempotent('DIG_I2C1_CFG_SetMasterAdr')
+    assert bsi._is_idempotent('SYS_I2CExt_CFG_GetReadFrameLength')
+    assert not bsi._is_idempotent('SYS_I2CExt_Read')
+    assert not bsi._is_idempotent('DIG_SPI1')
+    assert not bsi._is_idempotent('PWR_CFG_RelClose1')
+
+
+def test_no_repeat_without_auto_reconnect(bsi, stand_in):
+    bsi.bsi_auto_reconnect = False
+    stand_in.drop.add('MEAS_I_1')
+    with pytest.raises(BsiConnectionError):
+        bsi._query('MEAS_I_1')
+    assert stand_in.commands('MEAS_I_1') == ['MEAS_I_1']
+    assert stand_in.commands('SYS_') == []
+
+
+def test_answer_with_other_counter_is_discarded(bsi, stand_in):
+    # late answer of an earlier command arrives before the expected one
+    stand_in.script['SYS_IDN'] = lambda counter, params: 'O,{:03d},LATE\nO,{},BSI STAND-IN,V1.0\n'.format(
+        (int(counter) + 500) % 1000, counter)
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']
+    assert bsi.bsi_rx_buffer == bytearray()
+
+
+def test_flush_receive_does_not_wait(bsi, stand_in):
+    stand_in.script['SYS_IDN'] = lambda counter, params: 'O,' + counter + ',BSI STAND-IN,V1.0\nO,999,STALE\n'
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']
+    del stand_in.script['SYS_IDN']
+    start = time.monotonic()
+    bsi.flush_receive()
+    assert time.monotonic() - start < 0.5 * bsi.bsi_timeout
+    assert bsi.bsi_rx_buffer == bytearray()
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']
+
+
+def test_queued_queries_of_threads(bsi):
+    futures = [bsi.submit('MEAS_I_1', '') for ind in range(100)]
+    assert all(future.result().startswith('O,') for future in futures)
+
+
+def test_unused_instrument_is_garbage_collected(stand_in):
+    bsi = BsiInstrument()
+    assert bsi.open_bsi(stand_in.address, stand_in.port)
+    worker = bsi.bsi_worker
+    instance = weakref.ref(bsi)
+    del bsi
+    gc.collect()
+    assert instance() is None
+    worker.join(2.0)
+    assert not worker.is_alive()
+
+
+def test_stop_request_with_queued_requests(bsi):
+    worker = bsi.bsi_worker
+    bsi._stop_worker()
+    futures = [bsi.submit('SYS_IDN', '') for ind in range(10)]
+    assert all(future.result().startswith('O') for future in futures)
+    worker.join(2.0)
+    assert not worker.is_alive()  # stop request handled after the queries
+    assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']  # new worker started
+
+
+def test_stop_request_queued_again_if_requests_arrived():
+    bsi = BsiInstrument()
+    stop = (len(BsiPriority), next(bsi.bsi_request_sequence), None, None, None)
+    bsi.bsi_requests.put((BsiPriority.Interactive, next(bsi.bsi_request_sequence), object(), None, ('SYS_IDN', '')))
+    assert bsi._handle_request(stop) == (False, None)
+    assert bsi.bsi_requests.qsize() == 2
+    bsi.bsi_requests.get()
+    assert bsi._handle_request(bsi.bsi_requests.get()) == (True, None)
+
+
+def test_queries_of_many_threads(bsi):
+    results = list()
+
+    def worker():
+        results.extend(bsi.get_voltage('MIO01', 'Low1', 1) for ind in range(20))
+
+    threads = [threading.Thread(target=worker) for ind in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [3.3] * 160
+
+
+def test_interactive_query_during_bulk_stream(bsi):
+    done = threading.Event()
+
+    def stream():
+        bsi._query_stream('MEAS_I_1', '', lambda timestamp, answer: None, 0.3, 100000, 4)
+        done.set()
+
+    thread = threading.Thread(target=stream)  # stream has BsiPriority.Bulk
+    thread.start()
+    time.sleep(0.05)
+    with bsi.priority(BsiPriority.Interactive):
+        start = time.monotonic()
+        assert bsi.get_id() == ['BSI STAND-IN', 'V1.0']
+        assert time.monotonic() - start < 0.2
+    thread.join()
+    assert done.is_set()
+
+
+def test_priority_context(bsi):
+    assert bsi._current_priority() == BsiPriority.Control
+    with bsi.priority(BsiPriority.Bulk):
+        assert bsi._current_priority() == BsiPriority.Bulk
+        with bsi.priority(BsiPriority.Interactive):
+            assert bsi._current_priority() == BsiPriority.Interactive
+        assert bsi._current_priority() == BsiPriority.Bulk
+    assert bsi._current_priority() == BsiPriority.Control
+
+
+def test_queued_requests_served_by_priority(bsi, stand_in):
+    release = threading.Event()
+    busy = bsi._submit(release.wait, (2.0,))  # worker waits, requests are queued meanwhile
+    futures = [bsi.submit('MEAS_I_3', '', BsiPriority.Bulk), bsi.submit('MEAS_I_2', '', BsiPriority.Control),
+               bsi.submit('MEAS_I_1', '', BsiPriority.Interactive)]
+    release.set()
+    busy.result()
+    assert all(future.result().startswith('O') for future in futures)
+    assert stand_in.log == ['MEAS_I_1', 'MEAS_I_2', 'MEAS_I_3']
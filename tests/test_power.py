@@ -0,0 +1,118 @@
+"""
+power sources: IV sweeps, power sequences, inrush captures
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from conftest import values
+
+
+def test_sweep_one_round_trip(bsi, stand_in):
+    with bsi.profile('sweep') as profile:
+        voltages, currents = bsi.pwr_sweep_voltage(1, [0.5, 1.0, 1.5, 2.0])
+    assert voltages.tolist() == [0.5, 1.0, 1.5, 2.0]
+    assert currents.shape == (4, 2) and (currents == 1.25).all()
+    assert profile.round_trips == 1
+    assert stand_in.log == ['PWR_CFG_SetV1', 'MEAS_I_1'] * 4
+    assert bsi.bsi_config_state[('pwr_voltage', 1, 1)] == 2.0
+
+
+def test_sweep_failed_set_not_measured(bsi, stand_in):
+    stand_in.script['PWR_CFG_SetV1'] = lambda counter, params: 'O,' + counter + ',O,E' + ',' * 14 + '\n'
+    voltages, currents = bsi.pwr_sweep_voltage(1, [1.0, 2.0])
+    assert (currents[:, 0] == 1.25).all() and np.isnan(currents[:, 1]).all()
+    assert bsi.bsi_config_state[('pwr_voltage', 1, 1)] == 2.0
+    assert ('pwr_voltage', 1, 2) not in bsi.bsi_config_state
+
+
+def test_sweep_settles_after_set_answer(bsi, stand_in):
+    times = dict()
+
+    def log_time(counter, params, command):
+        times.setdefault(command, list()).append(time.monotonic())
+        return None
+
+    stand_in.script['PWR_CFG_SetV3'] = lambda counter, params: log_time(counter, params, 'set')
+    stand_in.script['MEAS_I_3'] = lambda counter, params: log_time(counter, params, 'meas')
+    voltages, currents = bsi.pwr_sweep_voltage(3, [1.0, 2.0, 3.0], 30, [2])
+    assert currents.shape == (3, 1) and not np.isnan(currents).any()
+    for set_time, meas_time in zip(times['set'], times['meas']):
+        assert meas_time - set_time >= 0.028
+    # only the swept card is tracked
+    assert bsi.bsi_config_state[('pwr_voltage', 3, 2)] == 3.0
+    assert ('pwr_voltage', 3, 1) not in bsi.bsi_config_state
+
+
+def test_power_sequence_batches(bsi, stand_in):
+    steps = [(3, 'close', 0), (3, 'on', 10), (4, 'close', 0), (4, 'on', 0)]
+    with bsi.profile('sequence') as profile:
+        assert bsi.pwr_sequence(steps)
+    assert stand_in.log == ['PWR_CFG_RelClose3', 'PWR_On3', 'PWR_CFG_RelClose4', 'PWR_On4']
+    assert profile.round_trips == 2
+    assert profile.time >= 0.01
+
+
+def test_power_sequence_checks_all_cards(bsi, stand_in):
+    stand_in.script['PWR_Off1'] = lambda counter, params: 'O,' + counter + ',O,E' + ',' * 14 + '\n'
+    assert not bsi.pwr_sequence([(1, 'off', 0), (1, 'open', 0)])
+    assert stand_in.log == ['PWR_Off1', 'PWR_CFG_RelOpen1']  # sequence is not stopped
+    assert bsi.pwr_sequence([(1, 'off', 0)], card_select=1)
+    assert bsi.pwr_sequence([])
+
+
+def test_power_sequence_unknown_action(bsi, stand_in):
+    with pytest.raises(ValueError):
+        bsi.pwr_sequence([(1, 'toggle', 0), (1, 'on', 0)])
+    assert stand_in.log == []
+
+
+def test_inrush_capture_settles_relais(bsi, stand_in):
+    times = dict()
+
+    def log_time(counter, params, command):
+        times.setdefault(command, time.monotonic())
+        return None
+
+    stand_in.script['PWR_CFG_RelClose2'] = lambda counter, params: log_time(counter, params, 'close')
+    stand_in.script['PWR_On2'] = lambda counter, params: log_time(counter, params, 'on')
+    stand_in.script['MEAS_I_2'] = lambda counter, params: log_time(counter, params, 'meas')
+    with bsi.profile('inrush') as profile:
+        capture = bsi.pwr_capture_inrush(2, 0.01, 1, max_samples=8, depth=4, relay_settle_ms=20)
+    assert len(capture.currents) == 8 and (capture.currents == 1.25).all()
+    assert stand_in.log[:3] == ['PWR_CFG_RelClose2', 'PWR_On2', 'MEAS_I_2']
+    assert times['on'] - times['close'] >= 0.02
+    assert profile.round_trips == 2  # relais, switch on + capture
+
+
+def test_inrush_timestamps_from_switch_on(bsi, stand_in):
+    stand_in.script['PWR_On2'] = lambda counter, params: time.sleep(0.05)  # slow switch on
+    capture = bsi.pwr_capture_inrush(2, 0.01, 1, max_samples=8, depth=4)
+    assert 0.0 <= capture.timestamps[0] < 0.05
+    assert (np.diff(capture.timestamps) >= 0).all()
+
+
+def test_inrush_capture_relais_failed(bsi, stand_in):
+    stand_in.script['PWR_CFG_RelClose2'] = lambda counter, params: 'O,' + counter + ',' + values(2, 'E') + '\n'
+    assert bsi.pwr_capture_inrush(2, 0.01, 1, max_samples=8, depth=4) is None
+    assert stand_in.log == ['PWR_CFG_RelClose2', 'PWR_CFG_RelOpen2']
+    stand_in.log.clear()
+    stand_in.script['PWR_CFG_RelClose2'] = lambda counter, params: 'E,' + counter + ',relais\n'
+    assert bsi.pwr_capture_inrush(2, 0.01, 1, max_samples=8, depth=4) is None
+    assert stand_in.log == ['PWR_CFG_RelClose2', 'PWR_CFG_RelOpen2']
+
+
+def test_inrush_capture_switch_on_failed(bsi, stand_in):
+    stand_in.script['PWR_On2'] = lambda counter, params: 'O,' + counter + ',' + values(2, 'E') + '\n'
+    assert bsi.pwr_capture_inrush(2, 1.0, 1, max_samples=8, depth=4) is None
+    assert stand_in.commands('PWR_') == ['PWR_CFG_RelClose2', 'PWR_On2', 'PWR_Off2', 'PWR_CFG_RelOpen2']
+
+
+def test_inrush_capture_switch_on_error_answer(bsi, stand_in):
+    stand_in.script['PWR_On2'] = lambda counter, params: 'E,' + counter + ',failed\n'
+    stand_in.script['PWR_Off2'] = lambda counter, params: 'E,' + counter + ',failed\n'
+    assert bsi.pwr_capture_inrush(2, 1.0, 1, max_samples=1000, depth=4) is None
+    assert len(stand_in.commands('MEAS_I_2')) == 4  # only the commands sent with the switch on
+    assert stand_in.commands('PWR_') == ['PWR_CFG_RelClose2', 'PWR_On2', 'PWR_Off2', 'PWR_CFG_RelOpen2']
@@ -0,0 +1,64 @@
+"""
+trace recording and replay without instrument (BsiReplaySocket)
+"""
+
+import pytest
+
+from SpektraBsi import BsiInstrument, BsiTraceRecorder, BsiProcessingError
+
+
+def script(bsi):
+    return [bsi.get_id(), bsi._query('MEAS_I_1'), bsi.i2c_read_frame(0x18, 8, 1, 1),
+            bsi._query_pipelined([('MEAS_I_2', ''), ('SYS_IDN', '')])]
+
+
+@pytest.fixture
+def trace(stand_in, tmp_path):
+    trace_file = tmp_path / 'script.bsitrace'
+    bsi = BsiInstrument()
+    bsi.start_trace(trace_file)
+    assert bsi.open_bsi(stand_in.address, stand_in.port)
+    results = script(bsi)
+    bsi.stop_trace()
+    bsi.disconnect()
+    return trace_file, results
+
+
+def test_trace_file(trace):
+    trace_file, results = trace
+    records = BsiTraceRecorder.read(trace_file)
+    assert records[0][0] == BsiTraceRecorder.Sent and records[0][2].startswith(b'SYS_IDN,')
+    assert any(direction == BsiTraceRecorder.Received for direction, timestamp, data in records)
+
+
+def test_not_a_trace_file(tmp_path):
+    other = tmp_path / 'other'
+    other.write_bytes(b'no trace')
+    with pytest.raises(BsiProcessingError):
+        BsiTraceRecorder.read(other)
+
+
+def test_replay_same_results(trace):
+    trace_file, results = trace
+    bsi = BsiInstrument()
+    assert bsi.open_replay(trace_file, verify=True)
+    assert bsi.bsi_nr_cards == 2
+    assert script(bsi) == results
+
+
+def test_replay_verify_other_command(trace):
+    trace_file, results = trace
+    bsi = BsiInstrument()
+    assert bsi.open_replay(trace_file, verify=True)
+    bsi.get_id()
+    with pytest.raises(BsiProcessingError):
+        bsi._query('MEAS_I_2')
+
+
+def test_replay_answer_not_sent_yet(trace):
+    trace_file, results = trace
+    bsi = BsiInstrument()
+    assert bsi.open_replay(trace_file)
+    # next answer was recorded after a frame not sent yet, like a socket timeout
+    with pytest.raises(OSError):
+        bsi.bsi_socket.recv(4096)
@@ -0,0 +1,48 @@
+"""
+pipelined multi-net voltage scan
+"""
+
+import numpy as np
+
+from conftest import values
+
+
+PAIRS = [('MIO01', 'Low1'), ('MIO02', 'Low1')]
+
+
+def test_unknown_nets_measured_per_range(bsi, stand_in):
+    result = bsi.scan_voltages(PAIRS)
+    assert result.shape == (2, 2) and (result == 3.3).all()
+    assert stand_in.log == ['MEAS_CFG_SetRange', 'MEAS_V_MIO01_Low1', 'MEAS_V_MIO02_Low1'] * 2
+    assert bsi.bsi_meas_range == 0
+
+
+def test_remembered_ranges_one_round_trip(bsi, stand_in):
+    bsi.scan_voltages(PAIRS)
+    stand_in.log.clear()
+    with bsi.profile('scan') as profile:
+        result = bsi.scan_voltages(PAIRS)
+    assert (result == 3.3).all()
+    assert stand_in.log == ['MEAS_V_MIO01_Low1', 'MEAS_V_MIO02_Low1']
+    assert profile.round_trips == 1
+
+
+def test_out_of_band_measured_again(bsi, stand_in):
+    bsi.scan_voltages(PAIRS)
+    stand_in.voltage = 12.0
+    stand_in.log.clear()
+    assert (bsi.scan_voltages(PAIRS) == 12.0).all()
+    assert stand_in.log == ['MEAS_V_MIO01_Low1', 'MEAS_V_MIO02_Low1', 'MEAS_CFG_SetRange',
+                            'MEAS_V_MIO01_Low1', 'MEAS_V_MIO02_Low1']
+
+
+def test_card_columns(bsi, stand_in):
+    stand_in.script['MEAS_V_MIO01_Low1'] = lambda counter, params: 'O,' + counter + ',' + values(1, 1.0) + '\n'
+    result = bsi.scan_voltages(PAIRS[:1], cards=[2, 1])
+    assert np.isnan(result[0, 0]) and result[0, 1] == 1.0
+
+
+def test_range_not_set(bsi, stand_in):
+    stand_in.script['MEAS_CFG_SetRange'] = lambda counter, params: 'O,' + counter + ',E,E' + ',' * 14 + '\n'
+    assert bsi.scan_voltages(PAIRS) is None
+    assert stand_in.commands('MEAS_V_') == []
@@ -0,0 +1,49 @@
+"""
+sensor power sequences (sensors.py)
+"""
+
+import time
+
+from sensors import Sensor
+
+
+class TwoSources(Sensor):
+    device_type = 'TEST'
+    pwr_sources = [1, 2]
+
+    def configure(self):
+        pass
+
+
+class NoSource(Sensor):
+    device_type = 'TEST'
+    pwr_sources = []
+
+    def configure(self):
+        pass
+
+
+def test_power_on_settles_relais(bsi, stand_in):
+    times = dict()
+
+    def log_time(counter, params, command):
+        times[command] = time.monotonic()
+        return None
+
+    stand_in.script['PWR_CFG_RelClose2'] = lambda counter, params: log_time(counter, params, 'close')
+    stand_in.script['PWR_On1'] = lambda counter, params: log_time(counter, params, 'on')
+    assert TwoSources(bsi).power_on()
+    assert stand_in.log == ['PWR_CFG_RelClose1', 'PWR_CFG_RelClose2', 'PWR_On1', 'PWR_On2']
+    assert times['on'] - times['close'] >= Sensor.relay_settle_ms / 1000.0
+
+
+def test_power_off(bsi, stand_in):
+    assert TwoSources(bsi).power_off()
+    assert stand_in.log == ['PWR_Off1', 'PWR_Off2', 'PWR_CFG_RelOpen1', 'PWR_CFG_RelOpen2']
+
+
+def test_no_power_sources(bsi, stand_in):
+    sensor = NoSource(bsi)
+    assert sensor.power_on() is True
+    assert sensor.power_off() is True
+    assert stand_in.log == []
@@ -0,0 +1,80 @@
+"""
+per command statistics and round trip profiles
+"""
+
+import threading
+
+import pytest
+
+from SpektraBsi import BsiCommandStats, BsiProcessingError
+
+
+def test_stats_per_mnemonic(bsi, stand_in):
+    bsi.reset_stats()
+    for pin in range(1, 4):
+        bsi.get_voltage('MIO{:02d}'.format(pin), 'Low1', 1)
+    bsi.pwr_set_closerelais(2, 1)
+    stats = bsi.stats()
+    assert set(stats) == {'MEAS_V_*', 'PWR_CFG_RelClose*'}
+    meas = stats['MEAS_V_*']
+    assert meas['count'] == 3 and meas['errors'] == 0
+    assert meas['bytes_sent'] == 3 * len(b'MEAS_V_MIO01_Low1,001\n')
+    assert meas['bytes_received'] > 0
+    for phase in BsiCommandStats.phases:
+        assert meas[phase]['count'] == 3 and sum(meas[phase]['histogram']) == 3
+        assert 0.0 <= meas[phase]['mean'] <= meas[phase]['max']
+
+
+def test_stats_count_errors(bsi, stand_in):
+    bsi.reset_stats()
+    stand_in.script['PWR_On1'] = lambda counter, params: 'E,' + counter + ',failed\n'
+    with pytest.raises(BsiProcessingError):
+        bsi._query('PWR_On1')
+    assert bsi.stats()['PWR_On*']['errors'] == 1
+
+
+def test_stats_snapshot_and_reset(bsi):
+    bsi.get_id()
+    snapshot = bsi.stats()
+    bsi.get_id()
+    assert bsi.stats()['SYS_IDN']['count'] == snapshot['SYS_IDN']['count'] + 1
+    bsi.reset_stats()
+    assert bsi.stats() == dict()
+
+
+@pytest.mark.parametrize('command, mnemonic', [
+    ('MEAS_V_MIO01_Low1_Sense', 'MEAS_V_*'), ('MEAS_I_3', 'MEAS_I_*'), ('PWR_On4', 'PWR_On*'),
+    ('DIG_I2C2_Read', 'DIG_I2C*_Read'), ('DIG_CFG_LoadMIOSetup12', 'DIG_CFG_LoadMIOSetup*'), ('SYS_IDN', 'SYS_IDN')])
+def test_mnemonic(bsi, command, mnemonic):
+    assert bsi._mnemonic(command) == mnemonic
+
+
+def test_histogram_bins():
+    stats = BsiCommandStats('SYS_IDN')
+    stats.add_time('wait', 30e-6)
+    stats.add_time('wait', 10.0)
+    histogram = stats.as_dict()['wait']['histogram']
+    assert histogram[1] == 1 and histogram[-1] == 1
+    assert stats.as_dict()['wait']['max'] == 10.0
+    assert stats.as_dict()['send']['mean'] is None
+
+
+def test_profile_nested(bsi, stand_in):
+    with bsi.profile('outer') as outer:
+        bsi.get_id()
+        with bsi.profile('inner') as inner:
+            bsi._query_pipelined([('MEAS_I_1', ''), ('MEAS_I_2', '')])
+    assert (inner.round_trips, inner.commands) == (1, 2)
+    assert (outer.round_trips, outer.commands) == (2, 3)
+    assert outer.bytes_sent == len(b'SYS_IDN,001\n') + 2 * len(b'MEAS_I_1,001\n')
+    assert outer.time >= outer.wait_time > 0
+    assert 'SYS_IDN' in str(outer)
+    assert outer.as_dict()['commands'] == 3
+
+
+def test_profile_other_threads_not_counted(bsi):
+    with bsi.profile('block') as profile:
+        thread = threading.Thread(target=bsi.get_id)
+        thread.start()
+        thread.join()
+    assert profile.round_trips == 0 and profile.commands == 0